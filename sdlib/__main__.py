@@ -18,13 +18,18 @@ import sys
 
 from sdlib.auth.auth_service import AuthFactory
 from sdlib.cmd.helper import CMDHelper
+from sdlib.cmd.serve.client import DaemonClient
 from sdlib.shared.config import Config
+from sdlib.shared.dataset_cache import DatasetCache
+from sdlib.shared.profiler import Profiler
+from sdlib.shared.tracer import Tracer, TracedCalls
 
 # Ensure it is executed with python3
 if sys.version_info[0] < 3:
     raise Exception("\nThe utility must be executedusing Python 3")
 
 def main():
+    trace_file = None
     try:
 
         if len(sys.argv) < 2:
@@ -37,6 +42,24 @@ def main():
         if cmd_name not in CMDHelper.getCmdNames():
             raise Exception(CMDHelper.main_help()[:-1])
 
+        # served by the running daemon, if any, without loading the configuration nor the credentials
+        if DaemonClient.forwardable(cmd_name, keyword_args):
+            response = DaemonClient().forward(args)
+            if response is not None:
+                output, error = response
+                sys.stdout.write(output)
+                if error is not None:
+                    raise Exception(error)
+                print('')
+                return 0
+
+        if keyword_args.no_cache:
+            DatasetCache.bypass = True
+
+        if keyword_args.trace:
+            trace_file = Tracer.DEFAULT_FILE if keyword_args.trace is True else keyword_args.trace
+            Tracer.start()
+
         Config.load()
 
         if cmd_name != "config":
@@ -47,16 +70,62 @@ def main():
 
         Config.set_data_partition_id(keyword_args.data_partition_id)
         auth_provider = AuthFactory.build(Config.get_auth_provider(), keyword_args.idtoken)
-        cmd(auth_provider).execute(positional_args, keyword_args)
+        command = cmd(TracedCalls.wrap(auth_provider, 'auth'))
+        if keyword_args.profile:
+            profile(command, positional_args, keyword_args)
+        else:
+            command.execute(positional_args, keyword_args)
 
     except Exception as ex:  # pylint: disable=W0703
         print(str(ex) + '\n')
         return 1
 
+    finally:
+        if trace_file is not None:
+            save_trace(trace_file)
+
     print('')
     return 0
 
 
+def profile(command, positional_args, keyword_args):
+    filename = Profiler.DEFAULT_FILE if keyword_args.profile is True else keyword_args.profile
+    top = Profiler.DEFAULT_TOP
+    if keyword_args.profile_top is not None:
+        try:
+            top = 0 if keyword_args.profile_top is True else int(keyword_args.profile_top)
+        except ValueError:
+            top = 0
+        if top <= 0:
+            raise Exception(
+                '\n' + 'Wrong Command: '
+                       'The profile-top argument must be an integer value greater than zero'
+                       '\n               For more information type "python sdutil"'
+                       ' to open the command help menu.')
+    profiler = Profiler()
+    try:
+        with profiler:
+            command.execute(positional_args, keyword_args)
+    finally:
+        # the profile of a failed command is reported as well
+        print('')
+        try:
+            profiler.report(filename, top)
+        except Exception as ex:  # pylint: disable=W0703
+            print('unable to save the profile to ' + filename + ': ' + str(ex))
+
+
+def save_trace(filename):
+    # the timeline of a failed command is saved as well, it tells where it failed
+    try:
+        Tracer.save(filename)
+        print('trace saved to ' + filename)
+    except Exception as ex:  # pylint: disable=W0703
+        print('unable to save the trace to ' + filename + ': ' + str(ex))
+    finally:
+        Tracer.stop()
+
+
 def import_from(module, name):
     module = __import__(module, fromlist=[name])
     return getattr(module, name)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sdlib.shared.utils import Utils
+
+
+class _Listing(object):
+    """ A folder being listed: its pages are queued in order as they are fetched """
+
+    def __init__(self, sdpath):
+        self.sdpath = sdpath
+        self.pages = queue.Queue()
+
+
+class LsWalker(object):
+    """ Breadth-first seismic store listing engine.
+
+        Folder listings (and their "nextPageCursor" pages) are fetched by a
+        bounded pool of workers: as soon as a page is received, the listing of
+        its sub-folders and the fetch of the next page are queued, so the whole
+        tree is explored concurrently.
+
+        walk() yields (sdpath, item, folder) tuples, where sdpath is the listed
+        folder path, item the listed name and folder the sub-folder name (sans
+        trailing slash) if the item is a folder, None otherwise.
+        In ordered mode the entries are buffered per folder and yielded in
+        depth-first order, sorted as the sequential listing does; the end of a
+        sub-folder tree is notified with a (sdpath, None, folder) tuple.
+        Otherwise the entries are yielded page by page as they arrive.
+    """
+
+    AZURE_PAGE_LIMIT = 10000
+    DEFAULT_WORKERS = 8
+
+    def __init__(self, seismic_store_service, provider, workers=DEFAULT_WORKERS):
+        if workers < 1:
+            raise Exception('The number of listing workers must be greater than zero')
+        self._svc = seismic_store_service
+        self._provider = provider
+        self._workers = workers
+        self._lock = threading.Lock()
+
+    def walk(self, sdpath, recursive=False, ordered=True):
+        self._recursive = recursive
+        self._ordered = ordered
+        self._stopped = threading.Event()
+        self._error = None
+        self._pending = 0
+        self._stream = queue.Queue()
+
+        self._executor = ThreadPoolExecutor(max_workers=self._workers)
+        try:
+            root = _Listing(sdpath)
+            self._submit(root, None)
+            if ordered:
+                for entry in self._walk_ordered(root):
+                    yield entry
+            else:
+                for entry in self._walk_stream():
+                    yield entry
+        finally:
+            # stop the traversal if the consumer gives up or fails
+            self._stopped.set()
+            self._executor.shutdown(wait=True)
+
+    def list_page(self, sdpath, cursor=None, first=True):
+        """ Fetch a single listing page, return the sorted items and the next page cursor """
+
+        if self._provider == 'azure':
+            res = self._svc.ls(sdpath, limit=self.AZURE_PAGE_LIMIT, next_page_cursor=cursor,
+                               working_mode='all' if first else 'datasets')
+
+            if sdpath == 'sd://' or Utils.isTenant(sdpath):
+                return res, None
+
+            # folders returned with the first call, after only pagination calls for datasets
+            items = res['datasets']
+            next_cursor = res.get('nextPageCursor')
+        else:
+            # for these providers pagination of the ls method should be checked/reviewed
+            items = self._svc.ls(sdpath)
+            next_cursor = None
+
+        # The backend returns all the sub-folders before the datasets.
+        # Keep this behavior for backwards compatibility.
+        # Apart from that the items are returned in an arbitrarily
+        # scrambled order. I want them sorted to improve usability.
+        dirs = sorted([e for e in items if e and e[-1] == '/'])
+        datasets = sorted([e for e in items if e and e[-1] != '/'])
+        return dirs + datasets, next_cursor
+
+    def folder(self, sdpath, item):
+        """ Return the folder name if the listed item is a folder or a subproject, None otherwise """
+
+        if self._provider == 'azure' and (sdpath == 'sd://' or Utils.isTenant(sdpath)):
+            return None
+        if "/" not in sdpath[5:]:
+            return item
+        if item[-1] == '/':
+            return item[:-1]
+        return None
+
+    def _submit(self, listing, cursor):
+        with self._lock:
+            self._pending += 1
+        self._executor.submit(self._fetch, listing, cursor)
+
+    def _fetch(self, listing, cursor):
+        try:
+            if self._stopped.is_set():
+                # the traversal has been aborted: release whoever waits for this folder
+                self._emit(listing, self._error or Exception('The listing has been interrupted'))
+                return
+            items, next_cursor = self.list_page(listing.sdpath, cursor, first=cursor is None)
+
+            page = []
+            for item in items:
+                folder = self.folder(listing.sdpath, item)
+                child = None
+                if self._recursive and folder:
+                    child = _Listing(listing.sdpath + '/' + folder)
+                    self._submit(child, None)
+                page.append((item, folder, child))
+
+            # the page is queued before the next one is requested, to preserve the order
+            self._emit(listing, page)
+            if next_cursor:
+                self._submit(listing, next_cursor)
+            else:
+                self._emit(listing, None)
+        except Exception as ex:
+            self._error = self._error or ex
+            self._stopped.set()
+            self._emit(listing, ex)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                if self._pending == 0:
+                    self._stream.put(None)
+
+    def _emit(self, listing, page):
+        if self._ordered:
+            listing.pages.put(page)
+        elif page is not None:
+            self._stream.put((listing, page))
+
+    def _walk_ordered(self, listing):
+        while True:
+            page = listing.pages.get()
+            if page is None:
+                return
+            if isinstance(page, Exception):
+                raise page
+            for item, folder, child in page:
+                yield listing.sdpath, item, folder
+                if child is not None:
+                    for entry in self._walk_ordered(child):
+                        yield entry
+                    yield listing.sdpath, None, folder
+
+    def _walk_stream(self):
+        while True:
+            res = self._stream.get()
+            if res is None:
+                return
+            listing, page = res
+            if isinstance(page, Exception):
+                raise page
+            for item, folder, _ in page:
+                yield listing.sdpath, item, folder
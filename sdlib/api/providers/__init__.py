@@ -14,9 +14,11 @@
 # limitations under the License.
 
 
-import importlib
 import os
 
+from sdlib.api.storage_service import StorageFactory
+
+# register the provider names only: implementations (and their cloud SDKs) are imported on build
 for f in os.listdir(os.path.dirname(os.path.abspath(__file__))):
     if not f.startswith('.') and not f.startswith('__'):
-        importlib.import_module('.' + f, package=__name__)
+        StorageFactory.register_module(f, __name__ + '.' + f)
@@ -14,7 +14,6 @@
 
 from __future__ import print_function
 
-import math
 import os
 import sys
 import time
@@ -26,6 +25,7 @@ from botocore.client import Config
 from sdlib.api.dataset import Dataset
 from sdlib.api.seismic_store_service import SeismicStoreService
 from sdlib.api.storage_service import StorageFactory, StorageService
+from sdlib.api.transfer import BandwidthLimiter, ParallelRangeDownloader, ResumableMultipartUploader, printer, read_into
 
 
 @StorageFactory.register(provider="aws")
@@ -41,6 +41,7 @@ class AwsStorageService(StorageService):
         self._seistore_svc = SeismicStoreService(auth=auth)
         self.aws_bucketname_string_separator = '$$'
         self._chunkSize = 20 * 1048576
+        self._max_workers = 4
         self._region = os.getenv("AWS_REGION", "us-east-1")
 
     def upload(self, file_name: str, dataset: Dataset, object_name=None, **kwargs):
@@ -50,14 +51,22 @@ class AwsStorageService(StorageService):
             file_name (str): the path to the local file
             dataset (str): the dataset where this file should be uploaded
             object_name (str, optional): S3 object key. Default is None.
+            journal (TransferJournal, optional): resumable upload journal, the file is sent as a
+                multipart upload recorded part by part
+            workers (int, optional): number of parts sent concurrently by a resumable or tuned upload
+            tuner (TransferTuner, optional): adapts the part size and the workers (--auto-tune), the file is
+                then sent as a multipart upload
+            size (int, optional): the size of the local file, when already known
 
         Returns:
             bool: did the upload succeed?
         """
+        quiet = kwargs.get('quiet', False)
+        log = printer(quiet)
 
         # for now AWS's gcsurl is "bucket_name$$subproject_folder/dataset_folder"
         bucket_name, s3_folder_name = dataset.gcsurl.split(self.aws_bucketname_string_separator)
-        print(dataset.gcsurl)
+        log(dataset.gcsurl)
 
         # If S3 object_name was not specified, use "0"
         if object_name is None:
@@ -72,18 +81,36 @@ class AwsStorageService(StorageService):
         bar_format = '- Uploading Data [ {percentage:3.0f}%  |{bar}|  {n_fmt}/{total_fmt}  -  {elapsed}|{remaining}  -  {rate_fmt}{postfix} ]'
 
         # Upload the file
-        with tqdm.tqdm(total=os.path.getsize(file_name), bar_format=bar_format, unit='B', unit_scale=True, unit_divisor=1024) as pbar:
-            transfer.upload_file(file_name, bucket_name, object_name, callback=AwsStorageService._progress_hook(pbar))
-        print("File [" + file_name + "] uploaded successfully")
+        journal = kwargs.get('journal')
+        tuner = kwargs.get('tuner')
+        size = kwargs.get('size')
+        if size is None:
+            size = os.path.getsize(file_name)
+        with tqdm.tqdm(total=size, bar_format=bar_format, unit='B', unit_scale=True, unit_divisor=1024, disable=quiet) as pbar:
+            # the boto3 transfer manager would bypass the bandwidth limit
+            if journal is not None or tuner is not None or BandwidthLimiter.shared() is not None:
+                workers, part_size = int(kwargs.get('workers') or self._max_workers), self._chunkSize
+                if tuner is not None:
+                    workers, part_size = tuner.start(workers, part_size, ResumableMultipartUploader.MIN_PART_SIZE)
+                ResumableMultipartUploader(workers, part_size, tuner=tuner).run(
+                    self._s3_client, bucket_name, object_name, file_name, journal=journal, on_progress=pbar.update,
+                    size=size)
+            else:
+                transfer.upload_file(file_name, bucket_name, object_name, callback=AwsStorageService._progress_hook(pbar))
+        log("File [" + file_name + "] uploaded successfully")
 
         return {"num_of_objects": 1}
 
-    def download(self, local_filename: str, dataset: Dataset):
+    def download(self, local_filename: str, dataset: Dataset, **kwargs):
         """download object from S3
 
         Args:
             local_filename (str): what to name the downloaded file, including type (.ext)
             dataset (str): the dataset URL
+            workers (int, optional): number of ranges downloaded concurrently
+            quiet (bool, optional): do not print progress information
+            resume (bool, optional): resume an interrupted download, keeping the verified ranges
+            tuner (TransferTuner, optional): adapts the workers (--auto-tune)
 
         Raises:
             e: ClientError
@@ -95,67 +122,41 @@ class AwsStorageService(StorageService):
         bucket_name, s3_folder_name = dataset.gcsurl.split(self.aws_bucketname_string_separator)
         start_time = time.time()
 
-        # download partial objects
-        cursize = 0
-        with open(local_filename, 'wb') as localFile:
-            nobjects = dataset.filemetadata['nobjects']
-            for obj in range(0, nobjects):
-                object_name = f"{s3_folder_name}/" + str(obj)
-                print(f"{object_name!r}")
-                cursize_incr = self.downloadObject(localFile, bucket_name, object_name, dataset, cursize)
-                cursize += cursize_incr
-            ctime = time.time() - start_time + sys.float_info.epsilon
-            speed = str(round(((dataset.filemetadata['size'] / 1048576.0) / ctime), 3))
-            print('- Transfer completed: ' + speed + ' [MB/s]')
-
-        return True
+        if self._s3_client is None:
+            self._s3_client = self.get_s3_client(self, dataset)
 
-    def downloadObject(self, local_file, bucket, obj, dataset, cursize):
-        """download an object from s3 ( one of many )
+        nobjects = dataset.filemetadata['nobjects']
+        object_names = [f"{s3_folder_name}/" + str(obj) for obj in range(0, nobjects)]
+        workers = int(kwargs.get('workers') or self._max_workers)
+        tuner = kwargs.get('tuner')
+        if tuner is not None:
+            workers, _ = tuner.start(workers)
+        quiet = kwargs.get('quiet', False)
+        log = printer(quiet)
+        engine = ParallelRangeDownloader(workers, self._chunkSize, tuner=tuner, log=log)
 
-        Args:
-            localFile (FileIO): a local file object
-            bucket (str): the s3 bucket name
-            obj (int): a number representing this objects index out of all the objects
-            dataset (Dataset): a Dataset object, from sdlib.api.dataset
-            cursize (int): the current size of the most recent object ( or the size of a stray dog... get it? )
+        def probe(obj):
+            return int(self._s3_client.head_object(Bucket=bucket_name, Key=object_names[obj])['ContentLength'])
 
-        Returns:
-            objsize: the size of the object
-        """
+        def fetch_into(obj, start_byte, length, buffer):
+            resp = self._s3_client.get_object(Bucket=bucket_name, Key=object_names[obj],
+                                              Range='bytes={}-{}'.format(start_byte, start_byte + length - 1))
+            return read_into(resp['Body'], buffer)
 
-        if self._s3_client is None:
-            self._s3_client = self.get_s3_client(self, dataset)
+        # download partial objects
+        bar = '- Downloading Data [ {percentage:3.0f}%  |{bar}|  {n_fmt}/{total_fmt}  -  {elapsed}|{remaining}  -  {rate_fmt}{postfix} ]'
+        with tqdm.tqdm(total=dataset.filemetadata['size'], bar_format=bar, unit='B', unit_scale=True, unit_divisor=1024,
+                       disable=quiet) as pbar:
+            engine.run(local_filename, dataset.filemetadata['size'], engine.probe(probe, nobjects), None,
+                       fetch_into=fetch_into, on_progress=pbar.update,
+                       progress_file=local_filename + engine.PROGRESS_SUFFIX,
+                       resume=kwargs.get('resume', False),
+                       source=dataset.gcsurl)
+        ctime = time.time() - start_time + sys.float_info.epsilon
+        speed = str(round(((dataset.filemetadata['size'] / 1048576.0) / ctime), 3))
+        log('- Transfer completed: ' + speed + ' [MB/s]')
 
-        objsize = int(self._s3_resource.Object(bucket, obj).content_length)
-        num_transfers = int(math.floor(objsize / self._chunkSize))
-        remaining_transfer_size = objsize - num_transfers * self._chunkSize
-
-        bar = '- Downloading Data in Chunks [ {percentage:3.0f}%  |{bar}|  {n_fmt}/{total_fmt}  -  {elapsed}|{remaining}  -  {rate_fmt}{postfix} ]'
-        # with tqdm.tqdm(total=dataset.filemetadata['size'], bar_format=bar, unit='B', unit_scale=True) as pbar:
-        # TODO: provide progress bar based on bytes for download
-
-        # With the upload, we provide a progress bar based on bytes.
-        # With the download we provide a progress bar based on for loop iterations
-        for ii in tqdm.tqdm(range(0, num_transfers), bar_format=bar, unit_scale=True):
-            start_byte = self._chunkSize * ii
-            stop_byte = self._chunkSize * (ii + 1) - 1
-            # download next chunk of the object
-            resp = self._s3_client.get_object(Bucket=bucket, Key=obj, Range='bytes={}-{}'.format(start_byte, stop_byte))
-            for i in resp['Body']:
-                local_file.write(i)
-
-            cursize = cursize + self._chunkSize
-
-        if remaining_transfer_size != 0:
-            start_byte = self._chunkSize * num_transfers
-            stop_byte = self._chunkSize * num_transfers + remaining_transfer_size - 1
-            # download any remainder of the object smaller than standard chunksize
-            resp = self._s3_client.get_object(Bucket=bucket, Key=obj, Range='bytes={}-{}'.format(start_byte, stop_byte))
-            for i in resp['Body']:
-                local_file.write(i)
-
-        return objsize
+        return True
 
     @staticmethod
     def _progress_hook(tqdm_instance):
@@ -23,11 +23,13 @@ import os
 import re
 import sys
 import uuid
-import time
 
 from alive_progress import alive_bar
 from sdlib.api.seismic_store_service import SeismicStoreService
 from sdlib.api.storage_service import StorageFactory, StorageService
+from sdlib.api.transfer import (BufferWriter, ParallelChunkUploader, ParallelRangeDownloader, QuietProgress,
+                                body_stream, open_upload_reader, printer, throttle)
+from azure.core.exceptions import ResourceNotFoundError
 from azure.storage.blob import ContainerClient, ContentSettings
 
 
@@ -40,6 +42,7 @@ class AzureStorageService(StorageService):
         self._max_single_put_size = 64 * 1024 * 1024
         self._max_single_get_size = 32 * 1024 * 1024
         self._max_concurrency = 10
+        self._max_workers = 4
         self._max_download_retries = 20
         self._max_download_retries_total = 50
 
@@ -61,28 +64,41 @@ class AzureStorageService(StorageService):
     def upload(self, filename, dataset, **kwargs):
         '''
             **kwargs: chunk_size is in MiB
+                      workers is the number of chunks staged concurrently
+                      journal is the transfer journal of a resumable upload (multi-object only,
+                      a single object upload is restarted from the beginning)
+                      tuner adapts the chunk size (multi-object only) and the workers (--auto-tune)
+                      size is the size of the local file, when already known
         '''
         chunk_size = int(kwargs.get('chunk_size', 32))
         storage_tier = (kwargs.get('storage_tier'))
+        workers = kwargs.get('workers')
+        quiet = kwargs.get('quiet', False)
         if chunk_size == 0:
-            return self.upload_single_object(filename, dataset, storage_tier)
+            return self.upload_single_object(filename, dataset, storage_tier, quiet, workers,
+                                             tuner=kwargs.get('tuner'), size=kwargs.get('size'))
         else:
-            return self.upload_multi_object(filename, dataset, storage_tier, chunk_size)
+            return self.upload_multi_object(filename, dataset, storage_tier, chunk_size, workers, quiet,
+                                            journal=kwargs.get('journal'), tuner=kwargs.get('tuner'),
+                                            size=kwargs.get('size'))
 
-    def upload_single_object(self, filename, dataset, storage_tier):
-        """ Uploads dataset(blob) to azure storage container"""
-        print('')
+    def upload_single_object(self, filename, dataset, storage_tier, quiet=False, workers=None, tuner=None, size=None):
+        """ Uploads dataset(blob) to azure storage container
+            The file is read once, its md5 is computed on the same buffers that are sent:
+            up to max_single_put_size it is sent with a single request, otherwise staged
+            in blocks (workers blocks concurrently) committed with the md5 of the whole file.
+        """
+        log = printer(quiet)
+        log('')
 
+        workers = int(workers or self._max_workers)
+        if tuner is not None:
+            workers, _ = tuner.start(workers)
         sas_url = self._get_sas_url(dataset, False)
-        # Calculate the md5 checksum first
         file_md5_hash = hashlib.md5()
-        # Calculate the checksum in chunks
-        with open(filename, "rb") as f:
-            for file_chunk in iter(lambda: f.read(32 * 1048576), b""):
-                file_md5_hash.update(file_chunk)
 
-        with open(filename, "rb") as local_file:
-            print('- Initializing transfer session ... ', end='')
+        with open_upload_reader(filename) as local_file:
+            log('- Initializing transfer session ... ', end='')
             sys.stdout.flush()
             with ContainerClient.from_container_url(container_url=sas_url,
                                                     max_block_size=self._max_block_size,
@@ -91,22 +107,47 @@ class AzureStorageService(StorageService):
                                                     max_single_put_size=self._max_single_put_size,
                                                     connection_timeout=100) as container_client:
                 with container_client.get_blob_client("0") as blob_client:
-                    file_size = os.path.getsize(filename)
-                    with alive_bar(file_size, manual=True, title="Uploading") as bar:
-                        def callback(response):
-                            current = response.context['upload_stream_current']
+                    file_size = size if size is not None else os.fstat(local_file.fileno()).st_size
+                    with QuietProgress() if quiet else alive_bar(file_size, manual=True, title="Uploading") as bar:
+                        if file_size <= self._max_single_put_size:
+                            data = local_file.read()
+                            file_md5_hash.update(data)
+                            throttle(len(data))
+                            blob_client.upload_blob(body_stream(data), length=len(data), validate_content=True,
+                                                    content_settings=ContentSettings(
+                                                        content_md5=bytearray(file_md5_hash.digest())
+                                                    ),
+                                                    standard_blob_tier=storage_tier)
+                            bar(1.0)
+                        else:
+                            block_ids = []
+                            uploaded = [0]
+
+                            def on_chunk(index, chunk):
+                                # Continuously update the md5 in chunks, to get md5 of whole file
+                                file_md5_hash.update(chunk)
+                                block_ids.append(base64.b64encode(uuid.uuid4().hex.encode()))
+
+                            def stage(index, chunk):
+                                throttle(len(chunk))
+                                res = blob_client.stage_block(block_ids[index], body_stream(chunk), len(chunk),
+                                                              validate_content=True)
+                                if bytearray(hashlib.md5(chunk).digest()) != res['content_md5']:
+                                    raise Exception('MD5 content mismatch, aborting')
+
+                            def on_progress(nbytes):
+                                uploaded[0] += nbytes
+                                bar(uploaded[0] / file_size)
 
-                            if current is not None:
-                                total = response.context["data_stream_total"]
-                                bar(current / total)
+                            ParallelChunkUploader(workers, self._max_block_size, tuner).run(
+                                local_file, stage, on_chunk=on_chunk, on_progress=on_progress)
+                            blob_client.commit_block_list(block_ids,
+                                                          content_settings=ContentSettings(
+                                                              content_md5=bytearray(file_md5_hash.digest())
+                                                          ),
+                                                          standard_blob_tier=storage_tier)
 
                         file_md5_hash = file_md5_hash.hexdigest()
-                        blob_client.upload_blob(local_file, validate_content=True,
-                                                raw_response_hook=callback,
-                                                content_settings=ContentSettings(
-                                                    content_md5=bytearray.fromhex(file_md5_hash)
-                                                ),
-                                                standard_blob_tier=storage_tier)
                         blob_properties = blob_client.get_blob_properties()
                         # Retrieve blob storage tier from blob properties
                         blob_tier = str(blob_properties.blob_tier)
@@ -116,214 +157,237 @@ class AzureStorageService(StorageService):
                             blob_client.delete_blob()
                             raise Exception('Content md5 does not match for the uploaded blob')
 
-            local_file.close()
-            print('\nTransfer completed\n'
-                  'File Checksum: ' + file_md5_hash + '\n' +
-                  'Checksum matches!!!\n')
+            log('\nTransfer completed\n'
+                'File Checksum: ' + file_md5_hash + '\n' +
+                'Checksum matches!!!\n')
         return {"num_of_objects": 1, "md5_checksum": file_md5_hash, "blob_tier": blob_tier}
 
-    def upload_multi_object(self, filename, dataset, storage_tier, chunk_size):
+    def upload_multi_object(self, filename, dataset, storage_tier, chunk_size, workers=None, quiet=False,
+                            journal=None, tuner=None, size=None):
         """ Uploads dataset(blob) to azure storage container
             param: chunk size is in MiB
+            param: workers is the number of chunks staged concurrently
+            param: journal records every committed object with the md5 of its chunk: the objects
+                   committed by an interrupted upload are verified against it and not sent again
+            param: tuner adapts the chunk size and the workers
+            param: size is the size of the local file, when already known
         """
-
+        log = printer(quiet)
+
+        workers = int(workers or self._max_workers)
+        # an interrupted upload is resumed with its own chunk size
+        resumed_chunk_size = journal.state.get('chunk_size') if journal is not None else None
+        if tuner is not None:
+            workers, tuned_chunk_size = tuner.start(workers, None if resumed_chunk_size else chunk_size * 1048576)
+            chunk_size = tuned_chunk_size // 1048576 if tuned_chunk_size else chunk_size
+        if journal is not None:
+            chunk_size = resumed_chunk_size or chunk_size
+            journal.update(chunk_size=chunk_size)
         sas_url = self._get_sas_url(dataset, False)
-        max_allowed_uncommitted_blocks = 1
-        block_count = 0
         with ContainerClient.from_container_url(container_url=sas_url,
                                                 use_byte_buffer=True,
                                                 max_concurrency=self._max_concurrency,
                                                 connection_timeout=100) as container_client:
-            totalFileSize = os.path.getsize(filename)
-            totalBytesRead = 0
-            md5_final_hash = hashlib.md5()
-            uploaded_blob_properties = None
-            blob_tier = None
-            if totalFileSize > 0:
-                with open(filename, "rb") as local_file:
-                    block_id_lst = list()
-                    with alive_bar(totalFileSize, manual=True, title="Uploading", theme='smooth') as bar:
-                        while True:
-                            with container_client.get_blob_client(str(block_count)) as blob_client:
-                                chunk = local_file.read(chunk_size * 1048576)
-                                totalBytesRead = local_file.tell()
-
-                                if not chunk:
-                                    if len(block_id_lst) > 0:
-                                        blob_client.commit_block_list(block_id_lst, standard_blob_tier=storage_tier)
-                                        bar(totalBytesRead / totalFileSize)
-                                    break
-                                # calculate the md5 for the current chunk
-                                current_chunk_md5 = hashlib.md5()
-                                current_chunk_md5.update(chunk)
-                                md5_ba = bytearray.fromhex(current_chunk_md5.hexdigest())
-
-                                block_id = base64.b64encode(uuid.uuid4().hex.encode())
-                                res = blob_client.stage_block(block_id,
-                                                              chunk,
-                                                              len(chunk),
-                                                              validate_content=True)
-                                # Compare the md5 of this chunk of local file to the one in response of stage block
-                                if md5_ba != res['content_md5']:
-                                    # Cleanup, existing partially created records
-                                    block_count_to_delete = block_count
-                                    while block_count_to_delete >= 0:
-                                        with container_client.get_blob_client(
-                                                str(block_count_to_delete)) as blob_client_for_deletion:
-                                            blob_client_for_deletion.delete_blob()
-                                        block_count_to_delete -= 1
-                                    raise Exception('MD5 content mismatch, aborting')
-
-                                # Continuously update the md5 in chunks, to get md5 of whole file
-                                md5_final_hash.update(chunk)
-                                block_id_lst.append(block_id)
-                                if len(block_id_lst) >= max_allowed_uncommitted_blocks:
-                                    # commit the block and set the md5 in content_settings
-                                    blob_client.commit_block_list(block_id_lst,
-                                                                  content_settings=ContentSettings(
-                                                                      content_md5=bytearray.fromhex(
-                                                                          md5_final_hash.hexdigest()
-                                                                      )),
-                                                                      standard_blob_tier=storage_tier)
-                                    bar(totalBytesRead / totalFileSize)
-                                    block_count += 1
-                                    block_id_lst = []
-
-                                # Retrieve blob properties, for validation that the content-md5 is indeed reflecting
-                                uploaded_blob_properties = blob_client.get_blob_properties()
-
-                                # Retrieve blob storage tier from blob properties
-                                blob_tier = str(uploaded_blob_properties.blob_tier)
-
-                content_md5_of_uploaded_blob = bytearray.hex(
-                    uploaded_blob_properties.content_settings.get('content_md5'))
-                md5_final_hash = md5_final_hash.hexdigest()
-
-                # Although I doubt, this will ever be the case
-                if content_md5_of_uploaded_blob != md5_final_hash:
-                    # Cleanup, existing partially created records
-                    block_count_to_delete = block_count - 1  # block_count is incremented in the end of previous loop
-                    while block_count_to_delete >= 0:
-                        with container_client.get_blob_client(str(block_count_to_delete)) as blob_client:
-                            # delete the partially created record
-                            blob_client.delete_blob()
-                            block_count_to_delete -= 1
-                    raise Exception('Content md5 does not match for the uploaded blob')
-
-                # Printing "checksum matches", since it's the only possible scenario here,
-                # Otherwise we'd end up throwing exception and won't come here
-
-                print('\nTransfer completed\n'
-                      'File Checksum: ' + md5_final_hash + '\n' +
-                      'Checksum matches!!!\n')
-                return {"num_of_objects": block_count, "md5_checksum": md5_final_hash, "blob_tier": blob_tier }
-            else:
+            totalFileSize = size if size is not None else os.path.getsize(filename)
+            if totalFileSize == 0:
                 raise Exception(filename + " is empty ")
 
-    def download(self, local_filename, dataset):
-        """Downloads dataset(blob) from azure storage container"""
+            md5_final_hash = hashlib.md5()
+            # each object is committed with the md5 of the whole file up to (and including) its chunk
+            running_md5 = []
+            block_ids = []
+
+            def on_chunk(index, chunk):
+                # Continuously update the md5 in chunks, to get md5 of whole file
+                md5_final_hash.update(chunk)
+                running_md5.append(md5_final_hash.digest())
+                block_ids.append(base64.b64encode(uuid.uuid4().hex.encode()))
+
+            def stage(index, chunk):
+                # calculate the md5 for the current chunk
+                chunk_md5 = hashlib.md5(chunk)
+                if journal is not None and journal.get('objects', index) == chunk_md5.hexdigest():
+                    # committed by the interrupted upload, from the same content
+                    return
+                md5_ba = bytearray(chunk_md5.digest())
+                throttle(len(chunk))
+                with container_client.get_blob_client(str(index)) as blob_client:
+                    res = blob_client.stage_block(block_ids[index], body_stream(chunk), len(chunk),
+                                                  validate_content=True)
+                    # Compare the md5 of this chunk of local file to the one in response of stage block
+                    if md5_ba != res['content_md5']:
+                        raise Exception('MD5 content mismatch, aborting')
+                    blob_client.commit_block_list([block_ids[index]],
+                                                  content_settings=ContentSettings(
+                                                      content_md5=bytearray(running_md5[index])),
+                                                  standard_blob_tier=storage_tier)
+                if journal is not None:
+                    journal.record('objects', index, chunk_md5.hexdigest())
+
+            with QuietProgress() if quiet else alive_bar(totalFileSize, manual=True, title="Uploading", theme='smooth') as bar:
+                uploaded = [0]
+
+                def on_progress(nbytes):
+                    uploaded[0] += nbytes
+                    bar(uploaded[0] / totalFileSize)
+
+                try:
+                    # every object is committed as soon as its chunk is staged
+                    with open_upload_reader(filename) as local_file:
+                        ParallelChunkUploader(workers, chunk_size * 1048576, tuner).run(
+                            local_file, stage, on_chunk=on_chunk, on_progress=on_progress)
+                except Exception:
+                    # Cleanup, existing partially created records (kept to be resumed if journaled)
+                    if journal is None:
+                        self._delete_objects(container_client, len(block_ids))
+                    raise
+
+            block_count = len(block_ids)
+            md5_final_hash = md5_final_hash.hexdigest()
+
+            # Retrieve the last blob properties, for validation that the content-md5 is indeed reflecting
+            with container_client.get_blob_client(str(block_count - 1)) as blob_client:
+                uploaded_blob_properties = blob_client.get_blob_properties()
+            # Retrieve blob storage tier from blob properties
+            blob_tier = str(uploaded_blob_properties.blob_tier)
+            content_md5_of_uploaded_blob = bytearray.hex(
+                uploaded_blob_properties.content_settings.get('content_md5'))
+
+            # Although I doubt, this will ever be the case
+            if content_md5_of_uploaded_blob != md5_final_hash:
+                self._delete_objects(container_client, block_count)
+                if journal is not None:
+                    journal.update(objects={})
+                raise Exception('Content md5 does not match for the uploaded blob')
+
+            # Printing "checksum matches", since it's the only possible scenario here,
+            # Otherwise we'd end up throwing exception and won't come here
+
+            log('\nTransfer completed\n'
+                'File Checksum: ' + md5_final_hash + '\n' +
+                'Checksum matches!!!\n')
+            return {"num_of_objects": block_count, "md5_checksum": md5_final_hash, "blob_tier": blob_tier }
+
+    @staticmethod
+    def _delete_objects(container_client, count):
+        """ Delete the objects 0..count-1, ignoring the ones never committed """
+        for index in range(count):
+            with container_client.get_blob_client(str(index)) as blob_client:
+                try:
+                    blob_client.delete_blob()
+                except ResourceNotFoundError:
+                    pass
+
+    def download(self, local_filename, dataset, **kwargs):
+        """Downloads dataset(blob) from azure storage container
+            **kwargs: workers is the number of ranges downloaded concurrently,
+                      quiet does not print progress information and raises the transfer errors,
+                      resume resumes an interrupted download, keeping the verified ranges
+                      tuner adapts the workers (--auto-tune)
+        """
 
+        workers = int(kwargs.get('workers') or self._max_workers)
+        tuner = kwargs.get('tuner')
+        if tuner is not None:
+            workers, _ = tuner.start(workers)
+        quiet = kwargs.get('quiet', False)
+        log = printer(quiet)
         dataset_size = dataset.filemetadata["size"]
+        nobjects = dataset.filemetadata["nobjects"]
         sas_url = self._get_sas_url(dataset, True)
-        counter = 0
-        current_size = 0
-        size_array = []
-        md5_array = []
-        total_retries = 0
-        print('')
+        log('')
         try:
-            # md5 checksum for comparison
-            blob_properties_file_checksum = None
-            with alive_bar(dataset_size, manual=True, theme='smooth') as bar:
-                with open(local_filename, 'wb') as local_file:
-                    while current_size < dataset_size:
-                        with ContainerClient.from_container_url(
-                                container_url=sas_url,
-                                use_byte_buffer=True,
-                                max_concurrency=self._max_concurrency,
-                                max_single_get_size=self._max_single_get_size,
-                                connection_timeout=100) as container_client:
-                            with container_client.get_blob_client(str(counter)) as blob_client:
-                                retries = 0
-                                while retries < self._max_download_retries:
-                                    try:
-                                        print('--------------------------------')
-                                        print(f'Downloading Chunk # {counter + 1}, Attempt # {retries + 1}')
-                                        print(f'Total downloaded size {current_size}, total written size: {local_file.tell()} (size-check: {current_size==local_file.tell()})')
-                                        bytes_expected = blob_client.get_blob_properties().size
-                                        bytes_read = blob_client.download_blob(validate_content=True).readinto(local_file)
-                                        current_size = current_size + bytes_read
-                                        size_array.append(bytes_read)
-                                        print(f'Expected to read {bytes_expected}, actually read {bytes_read} (read-check: {bytes_expected == bytes_read})')
-
-                                        counter = counter + 1
-                                        print(f'Downloaded {current_size} of {dataset_size} (bytes)')
-                                        # Get the file checksum
-                                        blob_properties_file_checksum = blob_client.get_blob_properties().content_settings.get(
-                                            "content_md5", None)
-                                        md5_array.append(bytearray.hex(blob_client.get_blob_properties().content_settings.get(
-                                            "content_md5", None)))
-                                        if blob_properties_file_checksum:
-                                            print(f'Chunk checksum {bytearray.hex(blob_properties_file_checksum)}')
-                                        bar(current_size / dataset_size)                                        
-                                        break
-                                    except Exception as ex:
-                                        retries = retries + 1
-                                        total_retries = total_retries + 1
-                                        print(f'Exception {ex} while download chunk #{counter + 1}')
-                                        if total_retries > self._max_download_retries_total:
-                                            raise ex
-                                        else:
-                                            if current_size != local_file.tell():
-                                                print(f'Current size {current_size} does not match the stream size {local_file.tell()}')
-                                                local_file.seek(current_size, os.SEEK_SET)
-                                            print("Pausing before retry ...")
-                                            time.sleep(10 + 5*retries)
-            md5_array = tuple(md5_array)
-            individual_md5 = False
-            corrupted_file = False
-            # determine the blob size
-            blob_size = 32 * 1048576
-            if len(size_array) > 1:
-                blob_size = size_array[0]
-            # only do checksum printing if its present in the source/blob file
-            if blob_properties_file_checksum:
-                # md5 checksum for comparison
+            engine = ParallelRangeDownloader(workers, self._max_single_get_size,
+                                             max_retries=self._max_download_retries,
+                                             max_retries_total=self._max_download_retries_total,
+                                             backoff=lambda retries: 10 + 5 * retries, tuner=tuner, log=log)
+            with ContainerClient.from_container_url(
+                    container_url=sas_url,
+                    use_byte_buffer=True,
+                    max_concurrency=self._max_concurrency,
+                    max_single_get_size=self._max_single_get_size,
+                    connection_timeout=100) as container_client:
+
+                def probe(index):
+                    with container_client.get_blob_client(str(index)) as blob_client:
+                        return blob_client.get_blob_properties()
+
+                def fetch_into(index, offset, length, buffer):
+                    with container_client.get_blob_client(str(index)) as blob_client:
+                        return blob_client.download_blob(offset=offset, length=length,
+                                                         validate_content=True).readinto(BufferWriter(buffer))
+
+                blob_properties = engine.probe(probe, nobjects)
+                size_array = [properties.size for properties in blob_properties]
+                md5_array = [properties.content_settings.get("content_md5") for properties in blob_properties]
+
+                # The objects uploaded by sdutil store the md5 of the file up to (and including) their
+                # content, the ones uploaded by other tools their own md5. When recorded, the dataset md5
+                # (the last object one for the former) tells which, otherwise both are accepted.
+                file_md5 = dataset.filemetadata.get("md5Checksum")
+                whole_file_md5 = None
+                if nobjects == 1:
+                    whole_file_md5 = True
+                elif nobjects > 1 and file_md5 and md5_array[-1]:
+                    whole_file_md5 = bytearray.hex(md5_array[-1]) == file_md5
+
+                # both checksums are computed as the bytes are handed back, the file is never read again
                 local_file_checksum = hashlib.md5()
-                # md5 checksum for to check if content_md5 store individual md5
-                blob_checksum = hashlib.md5()
-                # get the md5 of downloaded file
-                with open(local_filename, "rb") as local_file:
-                    for file_chunk in iter(lambda: local_file.read(blob_size), b""):
-                        local_file_checksum.update(file_chunk)
-                        if local_file_checksum.hexdigest() not in md5_array:
-                            blob_checksum.update(file_chunk)
-                            if blob_checksum.hexdigest() not in md5_array:
-                                # this is individual md5
-                                corrupted_file = True
-                                break
-                            else:
-                                individual_md5 = True
-                                break
-                            # blob_checksum = hashlib.md5()
-                blob_properties_file_checksum = bytearray.hex(blob_properties_file_checksum)
-                local_file_checksum = local_file_checksum.hexdigest()
-
-                if not individual_md5:
-                    print("Source File Checksum: " + blob_properties_file_checksum)
-                if not corrupted_file:
-                    print("Destination File Checksum: " + local_file_checksum)
-
-                if corrupted_file:
-                    print('Checksum mismatch!!!')
-                elif individual_md5:
-                    print("Warning: Checksum comparison was skipped because the MD5 calculation methods differ.")
+                object_checksum = [hashlib.md5()]
+                verified = {'file': 0, 'object': 0}
+
+                def on_data(index, data):
+                    local_file_checksum.update(data)
+                    if whole_file_md5 is not True:
+                        object_checksum[0].update(data)
+
+                def on_object(index):
+                    expected = md5_array[index]
+                    object_digest = object_checksum[0].digest()
+                    object_checksum[0] = hashlib.md5()
+                    if not expected:
+                        return
+                    if whole_file_md5 is not False and bytes(expected) == local_file_checksum.digest():
+                        verified['file'] += 1
+                    elif whole_file_md5 is not True and bytes(expected) == object_digest:
+                        verified['object'] += 1
+                    else:
+                        raise Exception('Checksum mismatch for object ' + str(index) + ' (' + bytearray.hex(expected) +
+                                        ' expected), the local file is corrupted. Please try again')
+
+                with QuietProgress() if quiet else alive_bar(dataset_size, manual=True, theme='smooth') as bar:
+                    current_size = [0]
+
+                    def on_progress(nbytes):
+                        current_size[0] += nbytes
+                        bar(current_size[0] / max(dataset_size, 1))
+
+                    engine.run(local_filename, dataset_size, size_array, None, fetch_into=fetch_into,
+                               on_data=on_data, on_object=on_object, on_progress=on_progress,
+                               progress_file=local_filename + engine.PROGRESS_SUFFIX,
+                       resume=kwargs.get('resume', False),
+                               source=dataset.gcsurl)
+
+            # only do checksum printing if its present in the source/blob file
+            if verified['file'] or verified['object']:
+                if md5_array[-1] and bytes(md5_array[-1]) == local_file_checksum.digest():
+                    log("Source File Checksum: " + bytearray.hex(md5_array[-1]))
+                    log("Destination File Checksum: " + local_file_checksum.hexdigest())
+                    log('Checksum matches!!!')
                 else:
-                    print('Checksum matches!!!')
-                    
-            print('\nTransfer completed')
+                    log("Destination File Checksum: " + local_file_checksum.hexdigest())
+                    log('Checksum matches!!! (' + str(verified['file'] + verified['object']) + ' of ' + str(nobjects) +
+                        ' objects verified against their own md5)')
+                unverified = len([md5 for md5 in md5_array if not md5])
+                if unverified:
+                    log('Warning: ' + str(unverified) + ' of ' + str(nobjects) +
+                        ' objects have no md5, their checksum could not be verified')
+
+            log('\nTransfer completed')
 
         except Exception as e:
+            if quiet:
+                raise
             print("Exception: " + str(e))
 
         return True
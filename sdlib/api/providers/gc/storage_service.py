@@ -18,16 +18,16 @@ from __future__ import print_function
 
 import base64
 import json
-import math
 import os
 import struct
 import sys
 import time
 
 import crc32c
-import requests
 from sdlib.api.seismic_store_service import SeismicStoreService
 from sdlib.api.storage_service import StorageFactory, StorageService
+from sdlib.api.transfer import ParallelRangeDownloader, open_upload_reader, printer, read_into, throttle
+from sdlib.shared.http_session import HttpSession
 from urllib.parse import quote, urljoin
 from tqdm import tqdm
 
@@ -44,6 +44,7 @@ class GcStorageService(StorageService):
         super(GcStorageService, self).__init__(auth=auth)
         self._seistore_svc = SeismicStoreService(auth=auth)
         self._chunkSize = 20 * 1048576
+        self._max_workers = 4
 
     def object_delete(self, objname, dataset):
         split_gcs_url = dataset.gcsurl.split("/")
@@ -59,7 +60,7 @@ class GcStorageService(StorageService):
             'Authorization': 'Bearer ' + token,
         }
 
-        rx = requests.delete(url=url, headers=header)
+        rx = HttpSession.delete(url=url, headers=header)
 
         if rx.status_code != 204:
             raise Exception('[' + str(rx.status_code) + '] ' + rx.text)
@@ -80,7 +81,7 @@ class GcStorageService(StorageService):
             'Authorization': 'Bearer ' + token,
         }
 
-        rx = requests.post(url=url, headers=header)
+        rx = HttpSession.post(url=url, headers=header)
 
         if rx.status_code != 200:
             raise Exception('[' + str(rx.status_code) + '] ' + rx.text)
@@ -96,7 +97,7 @@ class GcStorageService(StorageService):
             'Authorization': 'Bearer ' + token,
         }
 
-        rx = requests.post(url=url, headers=header, data=data)
+        rx = HttpSession.post(url=url, headers=header, data=data)
 
         if rx.status_code != 200:
             raise Exception('[' + str(rx.status_code) + '] ' + rx.text)
@@ -116,7 +117,7 @@ class GcStorageService(StorageService):
             'User-Agent': 'sdutil'
         }
 
-        rx = requests.post(url=url, headers=header)
+        rx = HttpSession.post(url=url, headers=header)
 
         if rx.status_code != 200:
             raise Exception('[' + str(rx.status_code) + '] ' + rx.text)
@@ -134,7 +135,7 @@ class GcStorageService(StorageService):
                               str(esize) + '/' + str(totsize))
         }
 
-        rx = requests.put(url=location, data=bts, headers=header)
+        rx = HttpSession.put(url=location, data=bts, headers=header)
 
         if (rx.status_code != 200
                 and rx.status_code != 308
@@ -152,13 +153,48 @@ class GcStorageService(StorageService):
                 'User-Agent': 'sdutil'
             }
 
-            rx = requests.put(url=location, headers=header)
+            rx = HttpSession.put(url=location, headers=header)
 
             if rx.status_code != 200 and rx.status_code != 308:
                 raise Exception('[' + str(rx.status_code) + '] ' + rx.text)
 
+    def upload_resumable_status(self, location, totsize, tenant, subproject):
+        """ Return the number of bytes persisted by a resumable-transfer location,
+            None if the location is no longer valid (expired or cancelled)
+        """
+        token = self._seistore_svc.get_storage_access_token(tenant,
+                                                            subproject, False)
+        header = {
+            'Authorization': 'Bearer ' + token,
+            'Content-Length': '0',
+            'Content-Range': 'bytes */' + str(totsize),
+            'User-Agent': 'sdutil'
+        }
+
+        rx = HttpSession.put(url=location, headers=header)
+
+        if rx.status_code == 200 or rx.status_code == 201:
+            return totsize
+        if rx.status_code == 308:
+            # "Range: bytes=0-<last persisted byte>", missing if nothing has been persisted
+            persisted = rx.headers.get('Range')
+            return int(persisted.split('-')[1]) + 1 if persisted else 0
+        if rx.status_code == 404 or rx.status_code == 410:
+            return None
+        raise Exception('[' + str(rx.status_code) + '] ' + rx.text)
+
     def object_download(self, bucket, obj, tenant,
                         subproject, bfrom=None, bto=None):
+        return self._object_get(bucket, obj, tenant, subproject, bfrom, bto).content
+
+    def object_download_into(self, buffer, bucket, obj, tenant,
+                             subproject, bfrom=None, bto=None):
+        """ Download an object (range) into a buffer, return the number of bytes received """
+        with self._object_get(bucket, obj, tenant, subproject, bfrom, bto, stream=True) as rx:
+            return read_into(rx.raw, buffer)
+
+    def _object_get(self, bucket, obj, tenant,
+                    subproject, bfrom=None, bto=None, stream=False):
         base_url = f"https://{bucket}.storage.googleapis.com/"
         relative_url = f"{quote(obj, safe='')}?alt=media"
         url = urljoin(base_url, relative_url)
@@ -173,12 +209,12 @@ class GcStorageService(StorageService):
         if bfrom is not None and bto is not None:
             header['Range'] = 'bytes=' + str(bfrom) + '-' + str(bto)
 
-        rx = requests.get(url=url, headers=header)
+        rx = HttpSession.get(url=url, headers=header, stream=stream)
 
         if rx.status_code != 200 and rx.status_code != 206:
             raise Exception('[' + str(rx.status_code) + '] ' + rx.text)
 
-        return rx.content
+        return rx
 
     def object_attribute(self, bucket, objname, attribute, tenant, subproject):
         relative_url = f"{self.__STORAGE_EP}/b/{bucket}/o/{quote(objname, safe='')}?fields={attribute}"
@@ -190,7 +226,7 @@ class GcStorageService(StorageService):
             'Authorization': 'Bearer ' + token,
         }
 
-        rx = requests.get(url=url, headers=header)
+        rx = HttpSession.get(url=url, headers=header)
 
         if rx.status_code != 200:
             raise Exception('[' + str(rx.status_code) + '] ' + rx.text)
@@ -203,89 +239,142 @@ class GcStorageService(StorageService):
 
     # Abstracted from Uploader
     def upload(self, filename, dataset, **kwargs):
-        print('')
-        print('- Initializing transfer session ... ', end='')
-        fsize = os.path.getsize(filename)
-        nread = int(fsize / self._chunkSize)
-        rest = fsize - self._chunkSize * nread
-        print('OK')
+        quiet = kwargs.get('quiet', False)
+        log = printer(quiet)
+        log('')
+        log('- Initializing transfer session ... ', end='')
+        fsize = kwargs.get('size')
+        if fsize is None:
+            fsize = os.path.getsize(filename)
+        log('OK')
         split_gcs_url = dataset.gcsurl.split("/")
         bucket, object_path = split_gcs_url[0], "/".join(split_gcs_url[1:])
         objname = object_path + "/0"
-        print('- Initializing resumable-transfer location ... ', end='')
-        sys.stdout.flush()
-        location = self.upload_resumable_start(bucket, objname, dataset, fsize)
-        print('OK')
+        journal = kwargs.get('journal')
+        tuner = kwargs.get('tuner')
+        # the chunks are sent one after the other: only their size is tuned
+        chunk_size = tuner.start(chunk_size=self._chunkSize)[1] if tuner is not None else self._chunkSize
+        location = journal.state.get('location') if journal is not None else None
+        offset = None
+        if location:
+            log('- Resuming resumable-transfer location ... ', end='')
+            sys.stdout.flush()
+            offset = self.upload_resumable_status(location, fsize, dataset.tenant, dataset.subproject)
+            log('OK' if offset is not None else 'expired')
+        if offset is None:
+            log('- Initializing resumable-transfer location ... ', end='')
+            sys.stdout.flush()
+            location = self.upload_resumable_start(bucket, objname, dataset, fsize)
+            offset = 0
+            if journal is not None:
+                journal.update(location=location, offset=0, crc32c=0)
+            log('OK')
         sys.stdout.flush()
         crc32c_local_digest = 0
         start_time = time.time()
-        with open(filename, "rb") as fx:
-            bts = 0
+        with open_upload_reader(filename) as fx:
+            # the pages of the chunks already sent are released by the memory mapped reader
+            release = getattr(fx, 'release', lambda start, length: None)
+            if offset:
+                # the bytes already persisted are only read, to compute the crc32c of the whole object
+                for ssize in range(0, offset, chunk_size):
+                    bts = fx.read(min(chunk_size, offset - ssize))
+                    crc32c_local_digest = crc32c.crc32(bts, crc32c_local_digest)
+                    release(ssize, len(bts))
+                if journal.state.get('offset') == offset and journal.state.get('crc32c') != crc32c_local_digest:
+                    raise Exception('Transfer failed: the local file does not match the interrupted transfer')
+                log('- Resuming transfer at byte ' + str(offset))
 
             bar = '- Uploading Data [ {percentage:3.0f}%  |{bar}|  {n_fmt}/{total_fmt}  -  {elapsed}|{remaining}  -  {rate_fmt}{postfix} ]'
-            with tqdm(total=fsize, bar_format=bar, unit='B', unit_scale=True, unit_divisor=1024) as pbar:
-                for ii in range(0, nread):
-                    bts = fx.read(self._chunkSize)
+            with tqdm(total=fsize, initial=offset, bar_format=bar, unit='B', unit_scale=True, unit_divisor=1024,
+                      disable=quiet) as pbar:
+                # an empty file is sent as a single empty chunk
+                for ssize in range(offset, fsize, chunk_size) if fsize else [0]:
+                    bts = fx.read(chunk_size)
                     crc32c_local_digest = crc32c.crc32(bts, crc32c_local_digest)
+                    throttle(len(bts))
+                    started = time.time()
                     self.upload_resumable_continue(
-                        location, bts, ii * self._chunkSize,
-                        (ii + 1) * self._chunkSize - 1,
-                        fsize, dataset.tenant,
-                        dataset.subproject)
-                    pbar.update(self._chunkSize)
-
-                bts = fx.read(rest)
-                crc32c_local_digest = crc32c.crc32(bts, crc32c_local_digest)
-                self.upload_resumable_continue(
-                    location, bts, nread *
-                    self._chunkSize,
-                    nread * self._chunkSize + rest - 1,
-                    fsize, dataset.tenant, dataset.subproject)
-                pbar.update(rest)
+                        location, bts, ssize, ssize + len(bts) - 1,
+                        fsize, dataset.tenant, dataset.subproject)
+                    if tuner is not None:
+                        tuner.record(len(bts), time.time() - started)
+                    pbar.update(len(bts))
+                    if journal is not None:
+                        journal.update(offset=ssize + len(bts), crc32c=crc32c_local_digest)
+                    release(ssize, len(bts))
 
             crc32c_local_digest = base64.b64encode(struct.pack(">I", crc32c_local_digest)).decode("utf-8")
             crc32c_remote = self.object_attribute(bucket, objname, 'crc32c', dataset.tenant, dataset.subproject)
             if crc32c_local_digest == crc32c_remote:
                 ctime = time.time() - start_time + sys.float_info.epsilon
-                print('- Transfer completed: ' +
-                      str((fsize / 1048576.0) / ctime) + ' [MB/s]')
+                log('- Transfer completed: ' +
+                    str((fsize / 1048576.0) / ctime) + ' [MB/s]')
                 sys.stdout.flush()
                 return {"num_of_objects": 1}
             else:
-                print('- Transfer failed: crc32c mistmatch, please try again')
+                if journal is not None:
+                    journal.update(location=None)
+                log('- Transfer failed: crc32c mistmatch, please try again')
                 raise Exception("Transfer failed: crc32c mistmatch, please try again ")
 
     # Abstracted from Downloader
-    def download(self, localfilename, dataset):
+    def download(self, localfilename, dataset, **kwargs):
 
         split_gcs_url = dataset.gcsurl.split("/")
         bucket, object_path = split_gcs_url[0], "/".join(split_gcs_url[1:])
 
-        print('')
+        log = printer(kwargs.get('quiet', False))
+        log('')
         start_time = time.time()
 
+        nobjects = dataset.filemetadata['nobjects']
+        resume = kwargs.get('resume', False)
+        objnames = [object_path + '/' + str(obj) for obj in range(0, nobjects)]
+        workers = int(kwargs.get('workers') or self._max_workers)
+        tuner = kwargs.get('tuner')
+        if tuner is not None:
+            workers, _ = tuner.start(workers)
+        engine = ParallelRangeDownloader(workers, self._chunkSize, tuner=tuner, log=log)
+        progress_file = localfilename + engine.PROGRESS_SUFFIX
+
+        def probe(obj):
+            return (int(self.object_size(bucket, objnames[obj], dataset.tenant, dataset.subproject)),
+                    self.object_attribute(bucket, objnames[obj], 'crc32c', dataset.tenant, dataset.subproject))
+
+        def fetch_into(obj, offset, length, buffer):
+            return self.object_download_into(buffer, bucket, objnames[obj], dataset.tenant,
+                                             dataset.subproject, offset, offset + length - 1)
+
         # download partial objects
-        cursize = 0
-        with open(localfilename, 'wb') as lfile:
-            nobjects = dataset.filemetadata['nobjects']
-            for obj in range(0, nobjects):
-                cursize_incr, crc32c_local = self.downloadObject(lfile, bucket, object_path + '/' +
-                                                                 str(obj), dataset, cursize)
-                crc32c_remote = self.object_attribute(bucket, object_path + '/' +
-                                                      str(obj), 'crc32c', dataset.tenant, dataset.subproject)
-                crc32c_local = base64.b64encode(struct.pack(">I", crc32c_local)).decode("utf-8")
-                if crc32c_remote != crc32c_local:
-                    lfile.close()
-                    os.remove(localfilename)
-                    print('- Transfer failed: crc32c mistmatch, please try again')
+        attributes = engine.probe(probe, nobjects)
+        crc32c_local = [0] * nobjects
+
+        def on_data(obj, bts):
+            crc32c_local[obj] = crc32c.crc32(bts, crc32c_local[obj])
 
-                cursize += cursize_incr
+        def on_object(obj):
+            crc32c_remote = attributes[obj][1]
+            if crc32c_remote != base64.b64encode(struct.pack(">I", crc32c_local[obj])).decode("utf-8"):
+                raise Exception("Transfer failed: crc32c mistmatch, please try again ")
+
+        bar = '- Downloading Data [ {percentage:3.0f}%  |{bar}|  {n_fmt}/{total_fmt}  -  {elapsed}|{remaining}  -  {rate_fmt}{postfix} ]'
+        with tqdm(total=dataset.filemetadata['size'], bar_format=bar, unit='B', unit_scale=True, unit_divisor=1024,
+                  disable=kwargs.get('quiet', False)) as pbar:
+            try:
+                engine.run(localfilename, dataset.filemetadata['size'], [size for size, _ in attributes], None,
+                           fetch_into=fetch_into, on_data=on_data, on_object=on_object, on_progress=pbar.update,
+                           progress_file=progress_file, resume=resume, source=dataset.gcsurl)
+            except Exception:
+                # do not leave a partially downloaded file behind (unless it can be resumed)
+                if not os.path.exists(progress_file) and os.path.exists(localfilename):
+                    os.remove(localfilename)
+                raise
 
-            lfile.close()
-            ctime = time.time() - start_time + sys.float_info.epsilon
-            speed = str(round(((dataset.filemetadata['size'] / 1048576.0) /
-                               ctime), 3))
-            print('- Transfer completed: ' + speed + ' [MB/s]')
+        ctime = time.time() - start_time + sys.float_info.epsilon
+        speed = str(round(((dataset.filemetadata['size'] / 1048576.0) /
+                           ctime), 3))
+        log('- Transfer completed: ' + speed + ' [MB/s]')
 
         # download seismicmeta companion if present
         if dataset.seismicmeta is not None:
@@ -295,38 +384,6 @@ class GcStorageService(StorageService):
 
         return True
 
-    # Abstracted from Downloader
-    def downloadObject(self, lfile, bucket, obj, dataset, cursize):
-
-        objsize = int(self.object_size(bucket, obj, dataset.tenant,
-                                       dataset.subproject))
-        ntrx = int(math.floor(objsize / self._chunkSize))
-        rtrx_size = objsize - ntrx * self._chunkSize
-        crc32c_local_digest = 0
-
-        bar = '- Downloading Data [ {percentage:3.0f}%  |{bar}|  {n_fmt}/{total_fmt}  -  {elapsed}|{remaining}  -  {rate_fmt}{postfix} ]'
-        with tqdm(total=dataset.filemetadata['size'], bar_format=bar, unit='B', unit_scale=True, unit_divisor=1024) as pbar:
-            for ii in range(0, ntrx):
-                sstart = self._chunkSize * ii
-                ssend = self._chunkSize * (ii + 1) - 1
-                bts = self.object_download(bucket, obj, dataset.tenant,
-                                           dataset.subproject, sstart, ssend)
-                lfile.write(bts)
-                cursize = cursize + self._chunkSize
-                crc32c_local_digest = crc32c.crc32(bts, crc32c_local_digest)
-                pbar.update(self._chunkSize)
-
-            if rtrx_size != 0:
-                sstart = self._chunkSize * ntrx
-                ssend = self._chunkSize * ntrx + rtrx_size - 1
-                bts = self.object_download(bucket, obj, dataset.tenant,
-                                           dataset.subproject, sstart, ssend)
-                lfile.write(bts)
-                crc32c_local_digest = crc32c.crc32(bts, crc32c_local_digest)
-                pbar.update(rtrx_size)
-
-        return objsize, crc32c_local_digest
-
     @staticmethod
     def get_storage_regions():
         return [
@@ -14,22 +14,74 @@
 # limitations under the License.
 
 
+import hashlib
 import json
-import time
+import threading
 import re
 
 import requests
+
 from sdlib.shared.config import Config
+from sdlib.shared.dataset_cache import DatasetCache
+from sdlib.shared.http_session import HttpSession
 from sdlib.shared.sdpath import SDPath
+from sdlib.shared.token_cache import StorageTokenCache
+from sdlib.shared.user_cache import UserCache
 from urllib.parse import quote
 
 
 class SeismicStoreService(object):
 
+    SERVICE_PROVIDER_CACHE = 'service_provider'
+
+    # background refresh of the cached service provider
+    _service_provider_refresh = None
+    _service_provider_lock = threading.Lock()
+
+    # storage access tokens are shared by all service instances of the process
+    _storage_tokens = None
+    _storage_tokens_lock = threading.Lock()
+    _storage_token_fetch_locks = {}
+
+    # dataset records are shared by all service instances of the process
+    _dataset_cache = None
+    _dataset_cache_lock = threading.Lock()
+
     def __init__(self, auth):
         self._auth = auth
-        self._storage_access_token = None
-        self._storage_exp_time = time.time() - 3600
+
+    @classmethod
+    def get_storage_token_cache(cls):
+        with cls._storage_tokens_lock:
+            if cls._storage_tokens is None:
+                cls._storage_tokens = StorageTokenCache(
+                    ttl=Config.get_storage_token_ttl(), persist=Config.get_storage_token_cache())
+            return cls._storage_tokens
+
+    @classmethod
+    def get_storage_token_fetch_lock(cls, key):
+        """ Return the lock serializing the fetches of a token scope (other scopes are fetched concurrently) """
+        with cls._storage_tokens_lock:
+            return cls._storage_token_fetch_locks.setdefault(key, threading.Lock())
+
+    def caller_identity(self):
+        """ Return a digest of the credential token, keeping apart the cached entries of different callers """
+        return hashlib.sha256(str(self._auth.get_id_token()).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get_dataset_cache(cls):
+        with cls._dataset_cache_lock:
+            if cls._dataset_cache is None:
+                cls._dataset_cache = DatasetCache(ttl=Config.get_dataset_cache_ttl())
+            return cls._dataset_cache
+
+    def invalidate_dataset(self, sdpath):
+        """ Drop the cached records of a dataset changed through the service """
+        self.get_dataset_cache().invalidate(DatasetCache.scope(SDPath(sdpath)))
+
+    def invalidate_subproject(self, tenant, subproject):
+        """ Drop the cached records of all the datasets of a subproject """
+        self.get_dataset_cache().invalidate(DatasetCache.subproject_scope(tenant, subproject))
 
     def get_cloud_provider(self, sdpath):
         return Config.get_cloud_provider()
@@ -37,18 +89,69 @@ class SeismicStoreService(object):
 
     def status(self):
         url = Config.get_svc_url() + '/svcstatus'
+        header = self.status_header()
+
+        resp = HttpSession.get(url=url, headers=header)
+        if resp.status_code != 200:
+            raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
+
+        return resp.text, resp.headers
+
+    def get_service_provider(self, refresh=False):
+        """ Return the service provider (Service-Provider header of the service status).
+            The provider is cached per service in the user configuration folder. On a cold
+            or expired cache the configured cloud provider is returned and the cache is
+            refreshed in the background, so no call waits for the service status; a
+            refresh requests it to the service right away.
+        """
+        if refresh:
+            return self.fetch_service_provider(self.status_header()) or Config.get_cloud_provider()
+        provider = UserCache(self.SERVICE_PROVIDER_CACHE).get(Config.get_svc_url())
+        if provider is None:
+            self.refresh_service_provider()
+            provider = Config.get_cloud_provider()
+        return provider
+
+    def status_header(self):
         header = {
             'Content-Type': 'application/json',
             'Authorization': 'Bearer ' + self._auth.get_id_token(),
             Config.get_svc_appkey_name(): Config.get_svc_appkey(),
         }
         self.update_header_if_data_partition_id_provided(header)
-
-        resp = requests.get(url=url, headers=header,verify=Config.get_ssl_verify())
-        if resp.status_code != 200:
-            raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
-
-        return resp.text, resp.headers
+        return header
+
+    @classmethod
+    def fetch_service_provider(cls, header):
+        """ Request the service provider to the service and cache it, return None if not available """
+        resp = HttpSession.get(url=Config.get_svc_url() + '/svcstatus', headers=header)
+        provider = resp.headers.get('Service-Provider') if resp.status_code == 200 else None
+        if provider is not None:
+            UserCache(cls.SERVICE_PROVIDER_CACHE).put(
+                Config.get_svc_url(), provider, ttl=Config.get_service_provider_ttl())
+        return provider
+
+    @classmethod
+    def _fetch_service_provider_quietly(cls, header):
+        try:
+            cls.fetch_service_provider(header)
+        except (requests.RequestException, OSError):
+            # service not reachable or cache not writable: the cache stays cold and is refreshed by the next call
+            pass
+
+    def refresh_service_provider(self):
+        """ Refresh the cached service provider in the background (once at a time) """
+        # the credential token is resolved by the calling thread
+        header = self.status_header()
+        with self._service_provider_lock:
+            thread = SeismicStoreService._service_provider_refresh
+            if thread is not None and thread.is_alive():
+                return
+            # a daemon thread: the command never waits for the refresh at exit
+            thread = threading.Thread(target=self._fetch_service_provider_quietly, args=(header,),
+                                      name='service-provider-refresh', daemon=True)
+            SeismicStoreService._service_provider_refresh = thread
+            thread.start()
 
     def create_subproject(self, tenant, subproject, owner_email, gcsclass,
                           gcsloc, legal_tag, access_policy, admins = None, viewers = None):
@@ -83,7 +186,7 @@ class SeismicStoreService(object):
             'viewers': [] if viewers is None else [viewers]
         }
         
-        resp = requests.post(url=url, json=body, headers=header, verify=Config.get_ssl_verify())
+        resp = HttpSession.post(url=url, json=body, headers=header)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -98,7 +201,7 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.get(url=url, headers=header,verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header)
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
 
@@ -115,7 +218,7 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.get(url=url, headers=header,verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header)
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
 
@@ -152,7 +255,8 @@ class SeismicStoreService(object):
                 'viewers': [viewers] if viewers is not None else []
             }
             
-        resp = requests.patch(url=url, headers=header, json=body, params=querystring,verify=Config.get_ssl_verify())
+        resp = HttpSession.patch(url=url, headers=header, json=body, params=querystring)
+        self.invalidate_subproject(sdpath.tenant, sdpath.subproject)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -170,7 +274,8 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.delete(url=url, headers=header, verify=Config.get_ssl_verify())
+        resp = HttpSession.delete(url=url, headers=header)
+        self.invalidate_subproject(tenant, subproject)
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
 
@@ -193,7 +298,7 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.get(url=url, headers=header,verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -209,7 +314,9 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.post(url=url, headers=header, params=querystring,verify=Config.get_ssl_verify())
+        resp = HttpSession.post(url=url, headers=header, params=querystring)
+        self.invalidate_dataset(sdpath_from)
+        self.invalidate_dataset(sdpath_to)
         
         if resp.status_code == 202 or resp.status_code == 200:
             print(resp.json())
@@ -246,15 +353,21 @@ class SeismicStoreService(object):
         if body_none:
             body = None
 
-        resp = requests.post(url=url, headers=header,
-                             json=body, params=querystring,verify=Config.get_ssl_verify())
+        resp = HttpSession.post(url=url, headers=header,
+                                json=body, params=querystring)
+        self.get_dataset_cache().invalidate(DatasetCache.scope(sdpath))
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
 
         return resp.json()
 
-    def dataset_get(self, sdpath, seismicmeta=None):
+    def dataset_get(self, sdpath, seismicmeta=None, lock_state=True):
+        """ Return the dataset record. The lock and copy transfer state (sbit, sbit_count,
+            transfer_status) change on the server side, through other clients: a caller not
+            reading it (lock_state=False) is served from the dataset cache, without it.
+            The records of a copy in progress (with a transfer status) are not cached.
+        """
 
         sdpath = SDPath(sdpath)
         url = (Config.get_svc_url()
@@ -265,6 +378,15 @@ class SeismicStoreService(object):
                + '/dataset/'
                + sdpath.dataset)
 
+        cache = self.get_dataset_cache()
+        scope = DatasetCache.scope(sdpath)
+        # the records fetched with a credential are never served to another one
+        variant = self.caller_identity() + '|' + str(seismicmeta)
+        if not lock_state:
+            cached = cache.get(scope, variant)
+            if cached is not None:
+                return json.loads(cached)
+
         querystring = {"path": sdpath.path, "seismicmeta": seismicmeta}
         header = {
             'Authorization': 'Bearer ' + self._auth.get_id_token(),
@@ -272,12 +394,22 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.get(url=url, headers=header, params=querystring,verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header, params=querystring)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
 
-        return resp.json()
+        dataset = resp.json()
+        if dataset.get('transfer_status') is None:
+            cache.put(scope, variant, json.dumps(DatasetCache.stable_record(dataset)))
+        return dataset
+
+    def dataset_lock_state(self, sdpath):
+        """ Return the lock and copy transfer state of the dataset (the volatile fields of its record),
+            read from the service with the light record (without the seismic metadata)
+        """
+        dataset = self.dataset_get(sdpath, 'false')
+        return {field: dataset.get(field) for field in DatasetCache.VOLATILE_FIELDS}
 
     def dataset_lock(self, sdpath, openmode):
 
@@ -298,7 +430,10 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.put(url=url, headers=header, params=querystring,verify=Config.get_ssl_verify())
+        resp = HttpSession.put(url=url, headers=header, params=querystring)
+        # a read lock only changes the lock state, not the cached part of the record
+        if openmode != 'read':
+            self.get_dataset_cache().invalidate(DatasetCache.scope(sdpath))
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -325,7 +460,8 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.put(url=url, headers=header, params=querystring,verify=Config.get_ssl_verify())
+        # an unlock only changes the lock state, not the cached part of the record
+        resp = HttpSession.put(url=url, headers=header, params=querystring)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -352,8 +488,11 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.patch(url=url, headers=header,
-                              json=patch, params=querystring,verify=Config.get_ssl_verify())
+        resp = HttpSession.patch(url=url, headers=header,
+                                 json=patch, params=querystring)
+        # closing a lock without a patch only changes the lock state
+        if patch is not None:
+            self.get_dataset_cache().invalidate(DatasetCache.scope(sdpath))
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -377,7 +516,8 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.delete(url=url, headers=header, params=querystring,verify=Config.get_ssl_verify())
+        resp = HttpSession.delete(url=url, headers=header, params=querystring)
+        self.get_dataset_cache().invalidate(DatasetCache.scope(sdpath))
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -393,7 +533,7 @@ class SeismicStoreService(object):
 
         body = {'email': useremail}
 
-        resp = requests.post(url=url, headers=header, json=body, verify=Config.get_ssl_verify())
+        resp = HttpSession.post(url=url, headers=header, json=body)
 
         if resp.status_code != 200 and resp.status_code != 409:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -411,7 +551,7 @@ class SeismicStoreService(object):
         body = {
             'email': email
         }
-        resp = requests.put(url=url, headers=header, json=body, verify=Config.get_ssl_verify())
+        resp = HttpSession.put(url=url, headers=header, json=body)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -433,7 +573,7 @@ class SeismicStoreService(object):
         if role:
             body['group'] = role
 
-        resp = requests.put(url=url, headers=header, json=body, verify=Config.get_ssl_verify())
+        resp = HttpSession.put(url=url, headers=header, json=body)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -452,7 +592,7 @@ class SeismicStoreService(object):
             'path': sdpath,
         }
 
-        resp = requests.delete(url=url, headers=header, json=body, verify=Config.get_ssl_verify())
+        resp = HttpSession.delete(url=url, headers=header, json=body)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -465,7 +605,7 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.get(url=url, headers=header, verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -480,7 +620,7 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.get(url=url, headers=header, verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -495,7 +635,7 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.get(url=url, headers=header, verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -510,7 +650,7 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.get(url=url, headers=header, verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -530,7 +670,7 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.post(url=url, headers=header, verify=Config.get_ssl_verify())
+        resp = HttpSession.post(url=url, headers=header)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -550,7 +690,7 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.post(url=url, headers=header, verify=Config.get_ssl_verify())
+        resp = HttpSession.post(url=url, headers=header)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -567,7 +707,7 @@ class SeismicStoreService(object):
         }
         self.update_header_if_data_partition_id_provided(header)
 
-        resp = requests.get(url=url, headers=header, verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -590,7 +730,7 @@ class SeismicStoreService(object):
             'user': email,
         }
 
-        resp = requests.post(url=url, headers=header, json=payload, verify=Config.get_ssl_verify())
+        resp = HttpSession.post(url=url, headers=header, json=payload)
 
         if resp.status_code != 200:
             raise Exception('[' + str(resp.status_code) + '] ' + resp.text)
@@ -598,25 +738,35 @@ class SeismicStoreService(object):
     def get_storage_access_token(self, tenant, subproject, readonly, path=None, name=None):
         sub_project_path = 'sd:%2F%2F' + tenant + '%2F' + subproject
         row = 'true' if readonly else 'false'
-        if self._storage_access_token is None or self._storage_exp_time < time.time():
-            url = Config.get_svc_url() + "/utility/gcs-access-token?sdpath=" + \
-                sub_project_path
-            if path != None and name != None:
-                url = url + str(path).replace("/", "%2F") + str(name)
-            url = url + "&readonly=" + row
-            header = {
-                'content-type': 'application/json',
-                'Authorization': 'Bearer ' + self._auth.get_id_token(),
-                Config.get_svc_appkey_name(): Config.get_svc_appkey()
-            }
-            self.update_header_if_data_partition_id_provided(header)
-
-            resp = requests.get(url=url, headers=header,verify=Config.get_ssl_verify())
-            if resp.status_code != 200:
-                raise Exception('[' + str(resp.status_code) + '] ' + resp.text)
-            self._storage_access_token = json.loads(resp.text)['access_token']
-            self._storage_exp_time = time.time() + 3000
-        return self._storage_access_token
+        cache = self.get_storage_token_cache()
+        key = StorageTokenCache.key(Config.get_svc_url(), Config.get_data_partition_id(), self.caller_identity(),
+                                    tenant, subproject, readonly, path, name)
+        token = cache.get(key)
+        if token is not None:
+            return token
+        with self.get_storage_token_fetch_lock(key):
+            # fetched by another thread while waiting for the lock
+            token = cache.get(key)
+            if token is None:
+                url = Config.get_svc_url() + "/utility/gcs-access-token?sdpath=" + \
+                    sub_project_path
+                if path != None and name != None:
+                    url = url + str(path).replace("/", "%2F") + str(name)
+                url = url + "&readonly=" + row
+                header = {
+                    'content-type': 'application/json',
+                    'Authorization': 'Bearer ' + self._auth.get_id_token(),
+                    Config.get_svc_appkey_name(): Config.get_svc_appkey()
+                }
+                self.update_header_if_data_partition_id_provided(header)
+
+                resp = HttpSession.get(url=url, headers=header)
+                if resp.status_code != 200:
+                    raise Exception('[' + str(resp.status_code) + '] ' + resp.text)
+                res = json.loads(resp.text)
+                token = res['access_token']
+                cache.put(key, token, expires_in=res.get('expires_in'))
+        return token
 
     def operation_bulkDelete(self, sdpath):
 
@@ -628,7 +778,9 @@ class SeismicStoreService(object):
             Config.get_svc_appkey_name(): Config.get_svc_appkey()
         }
 
-        resp = requests.put(url=url, headers=header,verify=Config.get_ssl_verify())
+        resp = HttpSession.put(url=url, headers=header)
+        scope = SDPath(sdpath)
+        self.invalidate_subproject(scope.tenant, scope.subproject)
 
         if resp.status_code != 202:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -646,7 +798,7 @@ class SeismicStoreService(object):
             'data-partition-id': dataPartitionId
         }
 
-        resp = requests.get(url=url, headers=header, verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -664,7 +816,9 @@ class SeismicStoreService(object):
             Config.get_svc_appkey_name(): Config.get_svc_appkey()
         }
 
-        resp = requests.put(url=url, headers=header,verify=Config.get_ssl_verify())
+        resp = HttpSession.put(url=url, headers=header)
+        scope = SDPath(sdpath)
+        self.invalidate_subproject(scope.tenant, scope.subproject)
 
         if resp.status_code != 202:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -682,7 +836,7 @@ class SeismicStoreService(object):
             'data-partition-id': dataPartitionId
         }
 
-        resp = requests.get(url=url, headers=header, verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -703,7 +857,7 @@ class SeismicStoreService(object):
             'data-partition-id': dataPartitionId
         }
 
-        resp = requests.get(url=url, headers=header, params=querystring, verify=Config.get_ssl_verify())
+        resp = HttpSession.get(url=url, headers=header, params=querystring)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -725,7 +879,7 @@ class SeismicStoreService(object):
             'data-partition-id': dataPartitionId
         }
 
-        resp = requests.get(url=url, headers=header, params=querystring, verify=Config.get_ssl_verify(), timeout=10)
+        resp = HttpSession.get(url=url, headers=header, params=querystring, timeout=10)
 
         if resp.status_code != 200:
             raise Exception('\n[' + str(resp.status_code) + '] ' + resp.text)
@@ -16,9 +16,14 @@
 
 from __future__ import print_function
 
+import importlib
+
+from sdlib.shared.tracer import TracedCalls
+
 
 class StorageFactory(type):
     provider_classes = {}
+    provider_modules = {}
 
     @classmethod
     def register(cls, provider):
@@ -28,6 +33,11 @@ class StorageFactory(type):
 
         return wrapper
 
+    @classmethod
+    def register_module(cls, provider, module):
+        # the provider implementation is imported (and registered) on first build
+        StorageFactory.provider_modules[provider] = module
+
     @classmethod
     def build(cls, provider, *args, **kwargs):
         try:
@@ -35,10 +45,13 @@ class StorageFactory(type):
             if provider == 'unknown':
                 raise KeyError()
 
+            if provider not in cls.provider_classes and provider in cls.provider_modules:
+                importlib.import_module(cls.provider_modules[provider])
             klass = cls.provider_classes[provider]
         except KeyError:
             raise ValueError("No known class associated with %s" % provider)
-        return klass(*args, **kwargs)
+        # the provider operations are recorded on the --trace timeline
+        return TracedCalls.wrap(klass(*args, **kwargs), 'storage')
 
 
 class StorageService(object):
@@ -0,0 +1,884 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import hashlib
+import io
+import json
+import collections
+import mmap
+import os
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from sdlib.shared.config import Config
+from sdlib.shared.tracer import Tracer
+
+
+def printer(quiet):
+    """ Return the print function used by a transfer: a no-op one for quiet transfers """
+    return _silent if quiet else print
+
+
+def _silent(*args, **kwargs):
+    pass
+
+
+class QuietProgress(object):
+    """ Silent progress bar (alive_bar and tqdm compatible) used by quiet transfers,
+        e.g. when many files are transferred concurrently.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def __call__(self, *args, **kwargs):
+        pass
+
+    def update(self, *args, **kwargs):
+        pass
+
+
+UPLOAD_READERS = ('mmap', 'read')
+
+
+def open_upload_reader(filename, reader=None):
+    """ Open an upload source file with the given (or configured) reader: "mmap" reads
+        zero-copy memoryview chunks, "read" reads bytes chunks copied into the process memory.
+    """
+    reader = reader or Config.get_upload_reader()
+    if reader not in UPLOAD_READERS:
+        raise Exception('Unknown upload reader "' + str(reader) + '", expected one of ' + ', '.join(UPLOAD_READERS))
+    return MappedFileReader(filename) if reader == 'mmap' else open(filename, 'rb')
+
+
+def body_stream(chunk):
+    """ Return a chunk as an upload body for the SDKs accepting only bytes or file-like objects """
+    return chunk if isinstance(chunk, bytes) else BufferStream(chunk)
+
+
+def read_into(stream, buffer, block_size=1048576):
+    """ Fill a buffer from a response body read in blocks, return the number of bytes read """
+    received = 0
+    while received < len(buffer):
+        block = buffer[received:received + block_size]
+        if hasattr(stream, 'readinto'):
+            nbytes = stream.readinto(block)
+        else:
+            data = stream.read(len(block))
+            nbytes = len(data)
+            block[:nbytes] = data
+        if not nbytes:
+            break
+        received += nbytes
+    return received
+
+
+class MappedFileReader(object):
+    """ Zero-copy file reader used by the uploads.
+
+        The file is memory mapped read-only and read() returns read-only
+        memoryview slices of the mapping: checksums are computed and request
+        bodies are sent straight from the page cache, no chunk is copied into
+        a bytes object. Once a chunk has been sent, release() drops its pages
+        from the process (they stay in the page cache), so the resident memory
+        does not grow with the file size.
+    """
+
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        # empty files cannot be mapped
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+        self._view = memoryview(self._mmap) if self._mmap is not None else memoryview(b'')
+        self._pos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = min(max(offset, 0), self._size)
+        return self._pos
+
+    def read(self, size=-1):
+        end = self._size if size is None or size < 0 else min(self._pos + size, self._size)
+        chunk = self._view[self._pos:end]
+        self._pos = end
+        return chunk
+
+    def release(self, offset, length):
+        """ Drop the pages of a range already sent (a later access reads them again from the page cache) """
+        if self._mmap is None or not hasattr(self._mmap, 'madvise') or not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+        start = offset - offset % mmap.PAGESIZE
+        end = min(offset + length, self._size)
+        if end > start:
+            self._mmap.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def close(self):
+        self._view.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # chunks are still referenced: the mapping is closed once they are released
+                pass
+        self._file.close()
+
+
+class BufferStream(io.RawIOBase):
+    """ Seekable read-only file-like object over a buffer (e.g. a memoryview chunk).
+        Consumers read it in small blocks: the buffer is never copied as a whole.
+    """
+
+    def __init__(self, buffer):
+        super(BufferStream, self).__init__()
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def __len__(self):
+        return len(self._view)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        size = min(len(b), len(self._view) - self._pos)
+        if size <= 0:
+            return 0
+        b[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(offset, 0)
+        return self._pos
+
+
+class BufferWriter(io.RawIOBase):
+    """ Writable file-like object filling a buffer, for the SDKs downloading into a stream """
+
+    def __init__(self, buffer):
+        super(BufferWriter, self).__init__()
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        size = len(b)
+        if self._pos + size > len(self._view):
+            raise Exception('Received more bytes than requested (' + str(len(self._view)) + ')')
+        self._view[self._pos:self._pos + size] = b
+        self._pos += size
+        return size
+
+    def tell(self):
+        return self._pos
+
+
+class ConcurrencyLimit(object):
+    """ Semaphore whose limit can be changed while it is in use (e.g. by the transfer tuner) """
+
+    def __init__(self, limit):
+        self._limit = limit
+        self._active = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        return self._limit
+
+    def set(self, limit):
+        with self._cond:
+            self._limit = limit
+            self._cond.notify_all()
+
+    def acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+        return False
+
+
+class BufferPool(object):
+    """ Bounded pool of fixed-size transfer buffers.
+
+        Download workers fill the buffers with the fetched ranges and upload
+        workers read the file chunks into them. Buffers are allocated on demand,
+        up to "count", and reused: the memory held by the transfers is capped at
+        count x buffer_size whatever the dataset size. shared() returns the
+        process-wide pool of a buffer size (its count is the "transfer_buffers"
+        setting), so concurrent transfers share the same cap.
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, count, buffer_size):
+        if count < 1:
+            raise Exception('The number of transfer buffers must be greater than zero')
+        self._count = count
+        self._buffer_size = buffer_size
+        self._free = []
+        self._allocated = 0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def shared(cls, buffer_size):
+        with cls._shared_lock:
+            if buffer_size not in cls._shared:
+                cls._shared[buffer_size] = cls(Config.get_transfer_buffers(), buffer_size)
+            return cls._shared[buffer_size]
+
+    @property
+    def buffer_size(self):
+        return self._buffer_size
+
+    def acquire(self, block=True):
+        """ Return a free buffer, waiting for one if all are in use (None if not block) """
+        with self._cond:
+            while not self._free and self._allocated >= self._count:
+                if not block:
+                    return None
+                self._cond.wait()
+            if self._free:
+                return self._free.pop()
+            self._allocated += 1
+        return bytearray(self._buffer_size)
+
+    def release(self, buffer):
+        with self._cond:
+            self._free.append(buffer)
+            self._cond.notify()
+
+
+BANDWIDTH_UNITS = {'': 1, 'k': 1000, 'm': 1000 ** 2, 'g': 1000 ** 3, 't': 1000 ** 4,
+                   'ki': 1024, 'mi': 1024 ** 2, 'gi': 1024 ** 3, 'ti': 1024 ** 4}
+
+
+def parse_bandwidth(value):
+    """ Return a bandwidth in bytes per second from its text (e.g. "200MB/s", "1.5GiB/s", "500k", "1048576") """
+    match = re.match(r'^\s*(\d+(?:\.\d*)?)\s*([kmgt]?i?)b?(?:/s|ps)?\s*$', str(value), re.IGNORECASE)
+    if match is None or match.group(2).lower() not in BANDWIDTH_UNITS:
+        raise ValueError('Invalid bandwidth "' + str(value) + '"')
+    rate = float(match.group(1)) * BANDWIDTH_UNITS[match.group(2).lower()]
+    if rate <= 0:
+        raise ValueError('Invalid bandwidth "' + str(value) + '"')
+    return rate
+
+
+class BandwidthLimiter(object):
+    """ Process-wide token bucket capping the bandwidth of the transfers (--max-bandwidth).
+
+        Every range fetched and every chunk sent by the storage providers takes
+        its size in tokens from the bucket, refilled at "rate" bytes per second
+        up to "burst" bytes. A transfer may take more tokens than available:
+        the debt is paid by the next ones, so the average rate is held whatever
+        the chunk size. Waiting transfers are served in turn, one request per
+        flow (a file) at a time: a file staged by many workers does not get
+        more bandwidth than a file transferred sequentially.
+    """
+
+    _shared = None
+    # the limits of the commands running (batch --jobs)
+    _limits = []
+    _limits_lock = threading.Lock()
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise Exception('The maximum bandwidth must be greater than zero')
+        self._rate = float(rate)
+        self._burst = float(burst if burst is not None else rate)
+        self._tokens = self._burst
+        self._stamp = time.monotonic()
+        # waiting requests per flow, the flows in turn order
+        self._flows = collections.OrderedDict()
+        self._cond = threading.Condition()
+
+    @classmethod
+    def shared(cls):
+        """ Return the limiter of the process, None if the bandwidth is not limited """
+        return cls._shared
+
+    @classmethod
+    def add_limit(cls, rate):
+        """ Limit the bandwidth of all the transfers of the process to rate bytes per second while a command runs.
+            The commands running concurrently share the limiter, capped by the lowest of their rates.
+        """
+        if rate <= 0:
+            raise Exception('The maximum bandwidth must be greater than zero')
+        with cls._limits_lock:
+            cls._limits.append(rate)
+            cls._apply_limits()
+
+    @classmethod
+    def remove_limit(cls, rate):
+        """ Remove the limit of a completed command, the bandwidth is no longer limited after the last one """
+        with cls._limits_lock:
+            cls._limits.remove(rate)
+            cls._apply_limits()
+
+    @classmethod
+    def _apply_limits(cls):
+        if not cls._limits:
+            cls._shared = None
+        elif cls._shared is None:
+            cls._shared = cls(min(cls._limits))
+        else:
+            # the transfers in progress keep their turns
+            cls._shared.set_rate(min(cls._limits))
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def set_rate(self, rate):
+        with self._cond:
+            self._refill()
+            self._rate = float(rate)
+            self._burst = float(rate)
+            self._tokens = min(self._tokens, self._burst)
+            self._cond.notify_all()
+
+    def consume(self, nbytes, flow=None):
+        """ Wait for the turn of the flow and for tokens in the bucket, then take nbytes tokens """
+        with self._cond:
+            waiting = self._flows.setdefault(flow, collections.deque())
+            ticket = object()
+            waiting.append(ticket)
+            while True:
+                self._refill()
+                turn = next(iter(self._flows)) == flow and waiting[0] is ticket
+                if turn and self._tokens > 0:
+                    break
+                # the request served next waits for the debt to be paid, the others for their turn
+                self._cond.wait((1 - self._tokens) / self._rate if turn else None)
+            self._tokens -= nbytes
+            waiting.popleft()
+            if waiting:
+                self._flows.move_to_end(flow)
+            else:
+                del self._flows[flow]
+            self._cond.notify_all()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._stamp) * self._rate)
+        self._stamp = now
+
+
+_transfer = threading.local()
+
+
+def throttle(nbytes):
+    """ Take the bandwidth of nbytes sent or received from the process limiter, if any.
+        The bytes are accounted to the flow of the transfer engine running the
+        calling thread, or to the thread itself (sequential transfers).
+    """
+    limiter = BandwidthLimiter.shared()
+    if limiter is not None and nbytes:
+        limiter.consume(nbytes, getattr(_transfer, 'flow', None) or threading.get_ident())
+
+
+class ParallelChunkUploader(object):
+    """ Concurrent upload engine shared by the storage providers.
+
+        The source file is read sequentially in chunks of chunk_size bytes.
+        Every chunk is handed to the provider "on_chunk" hook in file order
+        (this is where running checksums are computed) and then staged by a
+        bounded pool of workers through the provider "stage" hook.
+        At most "workers" chunks are held in memory at any time: they are
+        read into the buffers of the shared pool, or, with a memory mapped
+        reader, the pages of every staged chunk are released.
+    """
+
+    def __init__(self, workers, chunk_size, tuner=None):
+        if workers < 1:
+            raise Exception('The number of transfer workers must be greater than zero')
+        if chunk_size < 1:
+            raise Exception('The transfer chunk size must be greater than zero')
+        self._workers = workers
+        self._chunk_size = chunk_size
+        self._tuner = tuner
+        self._lock = threading.Lock()
+
+    def run(self, fileobj, stage, on_chunk=None, on_progress=None):
+        """ Upload the whole file and return the "stage" results in chunk order.
+
+            stage(index, chunk)      executed on the worker pool
+            on_chunk(index, chunk)   executed on the reader thread, in file order
+            on_progress(nbytes)      executed after every staged chunk
+        """
+        # the tuner changes the number of chunks staged concurrently as the transfer goes
+        slots = self._tuner.limit if self._tuner is not None else threading.Semaphore(self._workers)
+        failure = threading.Event()
+        futures = []
+        release = getattr(fileobj, 'release', None)
+        # a memory mapped file is read without copy, other files into pooled buffers
+        pool = BufferPool.shared(self._chunk_size) if release is None and hasattr(fileobj, 'readinto') else None
+        # the bandwidth used by the stage hooks (throttle) is accounted to this file
+        flow = object()
+
+        def task(index, offset, chunk, buffer):
+            _transfer.flow = flow
+            try:
+                if failure.is_set():
+                    return None
+                start = time.time()
+                with Tracer.span('stage chunk', 'transfer', index=index, offset=offset, bytes=len(chunk)):
+                    result = stage(index, chunk)
+                if self._tuner is not None:
+                    self._tuner.record(len(chunk), time.time() - start)
+                if on_progress is not None:
+                    with self._lock:
+                        on_progress(len(chunk))
+                return result
+            except Exception:
+                failure.set()
+                raise
+            finally:
+                if release is not None:
+                    release(offset, len(chunk))
+                if buffer is not None:
+                    pool.release(buffer)
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self._tuner.max_workers if self._tuner else self._workers) as executor:
+            index = 0
+            while not failure.is_set():
+                slots.acquire()
+                offset = fileobj.tell()
+                buffer = None
+                if pool is not None:
+                    buffer = pool.acquire()
+                    chunk = memoryview(buffer)[:fileobj.readinto(buffer)]
+                else:
+                    chunk = fileobj.read(self._chunk_size)
+                if not chunk:
+                    if buffer is not None:
+                        pool.release(buffer)
+                    slots.release()
+                    break
+                if on_chunk is not None:
+                    on_chunk(index, chunk)
+                futures.append(executor.submit(task, index, offset, chunk, buffer))
+                index += 1
+
+        # surface the first failure (in chunk order) to the caller
+        return [future.result() for future in futures]
+
+
+class ResumableMultipartUploader(object):
+    """ S3 compatible (aws, anthos, ibm) multipart upload, resumable through a transfer journal.
+
+        Parts are read and sent by the chunk upload engine, each one with its
+        Content-MD5 so the server verifies it. Every completed part is recorded
+        in the journal with its md5 and etag: when an interrupted upload is
+        resumed, the parts still listed by the server with the expected size and
+        recorded with the md5 of the local content are not sent again.
+    """
+
+    MAX_PARTS = 10000
+    # S3 rejects the parts smaller than 5 MiB, the last one excepted
+    MIN_PART_SIZE = 5 * 1048576
+
+    def __init__(self, workers, part_size, reader=None, tuner=None):
+        self._workers = workers
+        self._part_size = part_size
+        self._reader = reader
+        self._tuner = tuner
+
+    def run(self, client, bucket, key, filename, journal=None, on_progress=None, size=None):
+        if size is None:
+            size = os.path.getsize(filename)
+        if size == 0:
+            # multipart uploads need at least one part
+            client.put_object(Bucket=bucket, Key=key, Body=b'')
+            return
+
+        upload_id = None
+        uploaded = {}
+        if journal is not None and journal.state.get('upload_id'):
+            upload_id = journal.state['upload_id']
+            uploaded = self._list_parts(client, bucket, key, upload_id)
+            if uploaded is None:
+                # the interrupted upload has been aborted or has expired
+                upload_id = None
+        if upload_id is None:
+            part_size = max(self._part_size, self.MIN_PART_SIZE, -(-size // self.MAX_PARTS))
+            upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+            uploaded = {}
+            if journal is not None:
+                journal.update(upload_id=upload_id, part_size=part_size, parts={})
+        else:
+            part_size = journal.state['part_size']
+
+        def stage(index, chunk):
+            number = index + 1
+            md5 = hashlib.md5(chunk)
+            if journal is not None:
+                recorded = journal.get('parts', number)
+                if recorded and recorded['md5'] == md5.hexdigest() and uploaded.get(number) == len(chunk):
+                    return recorded['etag']
+            throttle(len(chunk))
+            res = client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body_stream(chunk),
+                                     ContentMD5=base64.b64encode(md5.digest()).decode('utf-8'))
+            if journal is not None:
+                journal.record('parts', number, {'md5': md5.hexdigest(), 'etag': res['ETag']})
+            return res['ETag']
+
+        try:
+            with open_upload_reader(filename, self._reader) as fileobj:
+                etags = ParallelChunkUploader(self._workers, part_size, self._tuner).run(
+                    fileobj, stage, on_progress=on_progress)
+            client.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={'Parts': [{'ETag': etag, 'PartNumber': index + 1}
+                                           for index, etag in enumerate(etags)]})
+        except Exception:
+            # the uploaded parts are kept to be resumed if journaled
+            if journal is None:
+                client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+
+    @staticmethod
+    def _list_parts(client, bucket, key, upload_id):
+        """ Return the size of the parts stored by the server, None if the upload no longer exists """
+        parts = {}
+        marker = 0
+        while True:
+            try:
+                res = client.list_parts(Bucket=bucket, Key=key, UploadId=upload_id, PartNumberMarker=marker)
+            except Exception as ex:
+                if getattr(ex, 'response', {}).get('Error', {}).get('Code') == 'NoSuchUpload':
+                    return None
+                raise
+            for part in res.get('Parts', []):
+                parts[part['PartNumber']] = part['Size']
+            if not res.get('IsTruncated'):
+                return parts
+            marker = res['NextPartNumberMarker']
+
+
+class ParallelRangeDownloader(object):
+    """ Concurrent download engine shared by the storage providers.
+
+        The local file is preallocated to its final size and every dataset
+        object is split in ranges of range_size bytes. Ranges are fetched by
+        a bounded pool of workers and written in place with positional I/O,
+        so objects (and ranges inside large objects) are transferred
+        independently. A failed range is retried on its own.
+
+        Fetched ranges are handed back to the caller in file order through
+        the "on_data" hook (this is where per-object checksums are computed),
+        so at most twice the number of workers ranges are held in memory at
+        any time. With a "fetch_into" hook the ranges are read into the
+        buffers of the shared pool instead, which also bounds the ranges in
+        flight. With a tuner, the number of workers changes as the transfer goes.
+
+        With a progress file, the checksum (crc32) of every range handed back
+        is appended to it, whether the download is resumed or not. When an
+        interrupted download is resumed, the recorded ranges are read back
+        from the partial local file and kept (and handed back) while they
+        match their checksum: only the ranges after the verified prefix are
+        fetched again. Without a usable progress file there is nothing to
+        verify the local file against, it is downloaded again.
+    """
+
+    PROGRESS_SUFFIX = '.sdprogress'
+
+    def __init__(self, workers, range_size, max_retries=5, max_retries_total=None, backoff=None, tuner=None,
+                 log=print):
+        if workers < 1:
+            raise Exception('The number of transfer workers must be greater than zero')
+        if range_size < 1:
+            raise Exception('The transfer range size must be greater than zero')
+        self._workers = workers
+        self._range_size = range_size
+        self._tuner = tuner
+        self._max_retries = max_retries
+        self._max_retries_total = max_retries_total
+        self._backoff = backoff or (lambda retries: min(2 ** retries, 30))
+        # the retries are reported through the print function of the transfer (printer(quiet))
+        self._log = log
+        self._total_retries = 0
+        self._lock = threading.Lock()
+
+    def probe(self, func, count):
+        """ Run func(index) for every object on the worker pool (e.g. to get the objects size) """
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            return list(executor.map(func, range(count)))
+
+    def run(self, local_filename, total_size, sizes, fetch, on_data=None, on_object=None, on_progress=None,
+            progress_file=None, source=None, fetch_into=None, resume=False):
+        """ Download all objects into local_filename.
+
+            fetch(index, offset, length)   executed on the worker pool, returns the bytes of the range
+            fetch_into(index, offset, length, buffer)
+                                           replaces fetch: fills the buffer (a memoryview of length bytes)
+                                           with the range and returns the number of bytes received
+            on_data(index, data)           executed in file order
+            on_object(index)               executed in file order, once all the object bytes are fed
+            on_progress(nbytes)            executed in file order
+            progress_file                  resumable download progress (removed once completed)
+            source                         identifies the downloaded content in the progress file
+            resume                         keep the verified ranges recorded in the progress file
+        """
+        if sum(sizes) != total_size:
+            raise Exception('The dataset objects size (' + str(sum(sizes)) + ' bytes) '
+                            'does not match the dataset size (' + str(total_size) + ' bytes)')
+
+        ranges = []
+        offset = 0
+        for index, size in enumerate(sizes):
+            # objects without content are kept as an empty range, to be reported in order
+            for start in range(0, max(size, 1), self._range_size):
+                ranges.append((index, offset + start, start, min(self._range_size, size - start)))
+            offset += size
+
+        rejected = []
+
+        def deliver(seq, data):
+            index, _, start, length = ranges[seq]
+            if on_data is not None:
+                on_data(index, data)
+            if on_progress is not None:
+                on_progress(length)
+            if on_object is not None and start + length == sizes[index]:
+                try:
+                    on_object(index)
+                except Exception:
+                    # the recorded ranges of an object failing its verification cannot be kept
+                    rejected.append(index)
+                    raise
+
+        header = {'source': source, 'sizes': list(sizes), 'range_size': self._range_size}
+        recorded = []
+        if resume:
+            recorded = self._load_progress(progress_file, header, local_filename, total_size)
+            if not recorded and os.path.exists(local_filename):
+                self._log('- No download progress recorded for ' + local_filename + ', downloading it again')
+
+        with open(local_filename, 'r+b' if recorded else 'wb') as local_file:
+            local_file.truncate(total_size)
+            local_file.flush()
+            fd = local_file.fileno()
+
+            # the ranges of an interrupted download are kept while they match their checksum
+            kept = 0
+            try:
+                for checksum in recorded[:len(ranges)]:
+                    data = self._read_at(fd, ranges[kept][3], ranges[kept][1])
+                    if zlib.crc32(data) != checksum:
+                        break
+                    deliver(kept, data)
+                    kept += 1
+            except Exception:
+                if rejected:
+                    os.remove(progress_file)
+                raise
+
+            progress = self._open_progress(progress_file, header, recorded[:kept])
+            pool = BufferPool.shared(self._range_size) if fetch_into is not None else None
+            buffers = {}
+            # the bandwidth of the ranges is accounted to this file
+            flow = object()
+            try:
+                with ThreadPoolExecutor(max_workers=self._tuner.max_workers if self._tuner else self._workers) \
+                        as executor:
+                    pending = {}
+                    next_submit = kept
+                    try:
+                        for seq in range(kept, len(ranges)):
+                            while next_submit < len(ranges) and next_submit < seq + 2 * self._concurrency():
+                                if pool is not None:
+                                    # wait for a buffer only when none is held, the pool is shared
+                                    buffer = pool.acquire(block=not pending)
+                                    if buffer is None:
+                                        break
+                                    buffers[next_submit] = buffer
+                                pending[next_submit] = executor.submit(
+                                    self._download_range, flow, fd, fetch, fetch_into, buffers.get(next_submit),
+                                    *ranges[next_submit])
+                                next_submit += 1
+                            data = pending.pop(seq).result()
+                            deliver(seq, data)
+                            if progress is not None:
+                                progress.write(str(zlib.crc32(data)) + '\n')
+                                progress.flush()
+                            if seq in buffers:
+                                pool.release(buffers.pop(seq))
+                    except Exception:
+                        for future in pending.values():
+                            future.cancel()
+                        raise
+            finally:
+                # the workers are done with the buffers left
+                for buffer in buffers.values():
+                    pool.release(buffer)
+                if progress is not None:
+                    progress.close()
+                    if rejected:
+                        os.remove(progress_file)
+
+        if progress_file is not None:
+            os.remove(progress_file)
+
+    @staticmethod
+    def _load_progress(progress_file, header, local_filename, total_size):
+        """ Return the checksums of the ranges recorded by an interrupted download of the same content """
+        if progress_file is None or not os.path.exists(progress_file) or not os.path.exists(local_filename):
+            return []
+        if os.path.getsize(local_filename) != total_size:
+            return []
+        try:
+            with open(progress_file, 'r') as fh:
+                if json.loads(fh.readline()) != header:
+                    return []
+                # a partially written last line is discarded
+                return [int(line) for line in fh if line.endswith('\n')]
+        except ValueError:
+            return []
+
+    @staticmethod
+    def _open_progress(progress_file, header, recorded):
+        if progress_file is None:
+            return None
+        progress = open(progress_file, 'w')
+        progress.write(json.dumps(header) + '\n')
+        progress.writelines(str(checksum) + '\n' for checksum in recorded)
+        progress.flush()
+        return progress
+
+    def _concurrency(self):
+        return self._tuner.workers if self._tuner is not None else self._workers
+
+    def _download_range(self, flow, fd, fetch, fetch_into, buffer, index, file_offset, start, length):
+        if length == 0:
+            return b''
+        _transfer.flow = flow
+        retries = 0
+        while True:
+            try:
+                throttle(length)
+                if self._tuner is not None:
+                    # the tuner changes the number of ranges fetched concurrently as the transfer goes
+                    with self._tuner.limit:
+                        started = time.time()
+                        data, received = self._fetch_range(fetch, fetch_into, buffer, index, start, length)
+                        self._tuner.record(received, time.time() - started)
+                else:
+                    data, received = self._fetch_range(fetch, fetch_into, buffer, index, start, length)
+                if received != length:
+                    raise Exception('Expected to read ' + str(length) + ' bytes, actually read ' + str(received))
+                self._write_at(fd, data, file_offset)
+                return data
+            except Exception as ex:
+                retries += 1
+                with self._lock:
+                    self._total_retries += 1
+                    total_retries = self._total_retries
+                if retries > self._max_retries or (
+                        self._max_retries_total is not None and total_retries > self._max_retries_total):
+                    raise
+                self._log('Exception ' + str(ex) + ' while downloading object #' + str(index) +
+                          ' [' + str(start) + '-' + str(start + length - 1) + '], retrying ...')
+                time.sleep(self._backoff(retries))
+
+    @staticmethod
+    def _fetch_range(fetch, fetch_into, buffer, index, start, length):
+        with Tracer.span('fetch range', 'transfer', object=index, start=start, bytes=length) as span:
+            if buffer is not None:
+                data = memoryview(buffer)[:length]
+                received = fetch_into(index, start, length, data)
+            else:
+                data = fetch(index, start, length)
+                received = len(data)
+            span.set(received=received)
+            return data, received
+
+    def _read_at(self, fd, length, offset):
+        if hasattr(os, 'pread'):
+            chunks = []
+            while length > 0:
+                chunk = os.pread(fd, length, offset)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                length -= len(chunk)
+                offset += len(chunk)
+            return b''.join(chunks)
+        with self._lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            return os.read(fd, length)
+
+    def _write_at(self, fd, data, offset):
+        view = memoryview(data)
+        if hasattr(os, 'pwrite'):
+            while len(view):
+                written = os.pwrite(fd, view, offset)
+                view = view[written:]
+                offset += written
+        else:
+            # no positional I/O available (windows): serialize seek + write
+            with self._lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                while len(view):
+                    view = view[os.write(fd, view):]
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+from sdlib.api.transfer import ConcurrencyLimit
+from sdlib.shared.user_cache import UserCache
+
+
+class TransferTuner(object):
+    """ Adaptive chunk size and concurrency of a transfer (cp --auto-tune).
+
+        The throughput is measured over windows of transferred chunks. The
+        number of workers is doubled while the throughput improves (or halved,
+        if the first increase does not help) and then settled on the best
+        value, within bounds. The chunk size is adjusted on the time taken to
+        transfer a chunk: doubled when chunks are too quick to amortize the
+        request overhead, halved when they are too slow to keep the workers
+        balanced. A chunk size change applies from the next transfer, as the
+        objects layout of a transfer is fixed.
+
+        The settings reached are recorded per (provider, endpoint) and
+        direction in the user configuration folder, so the next transfers
+        start from them. Settings given on the command line take precedence.
+    """
+
+    CACHE_NAME = 'transfer_tuning'
+    MIN_WORKERS = 1
+    MAX_WORKERS = 32
+    MIN_CHUNK_SIZE = 4 * 1048576
+    MAX_CHUNK_SIZE = 256 * 1048576
+    SAMPLE_CHUNKS = 4
+    CHUNK_SECONDS = (2.0, 10.0)
+    MIN_GAIN = 1.1
+
+    def __init__(self, provider, endpoint, direction, chunk_size=None, workers=None, cache_dir=None):
+        self._cache = UserCache(self.CACHE_NAME, cache_dir)
+        self._key = str(provider) + ' ' + str(endpoint)
+        self._direction = direction
+        self._requested_chunk_size = chunk_size
+        self._requested_workers = workers
+        self._lock = threading.Lock()
+        self.limit = None
+
+    @property
+    def max_workers(self):
+        return self.MAX_WORKERS
+
+    @property
+    def workers(self):
+        return self.limit.limit
+
+    def start(self, workers=None, chunk_size=None, min_chunk_size=None):
+        """ Return the (workers, chunk_size) a transfer starts with: the ones given on the command line,
+            else the ones recorded for the endpoint, else the provider defaults given.
+            The settings not tunable by the transfer are given (and returned) as None.
+            The chunk size is kept above min_chunk_size if the provider requires a larger one.
+        """
+        self._min_chunk_size = max(self.MIN_CHUNK_SIZE, min_chunk_size or 0)
+        recorded = (self._cache.get(self._key) or {}).get(self._direction, {})
+        if workers is not None:
+            workers = self._clamp(self._requested_workers or recorded.get('workers') or workers,
+                                  self.MIN_WORKERS, self.MAX_WORKERS)
+        if chunk_size is not None:
+            chunk_size = self._clamp(self._requested_chunk_size or recorded.get('chunk_size') or chunk_size,
+                                     self._min_chunk_size, self.MAX_CHUNK_SIZE)
+        self.limit = ConcurrencyLimit(workers or 1)
+        self._chunk_size = chunk_size
+        self._chunk_seconds = []
+        self._best = None
+        self._initial_workers = workers
+        # workers given on the command line are not tuned
+        self._phase = 'settled' if workers is None or self._requested_workers is not None else 'up'
+        self._window_start = time.time()
+        self._window_bytes = 0
+        self._window_chunks = 0
+        return workers, chunk_size
+
+    def record(self, nbytes, seconds):
+        """ A chunk of nbytes has been transferred in seconds (called by the transfer workers) """
+        with self._lock:
+            self._chunk_seconds.append(seconds)
+            if self._phase == 'settled':
+                return
+            self._window_bytes += nbytes
+            self._window_chunks += 1
+            if self._window_chunks < max(self.SAMPLE_CHUNKS, self.limit.limit):
+                return
+            now = time.time()
+            throughput = self._window_bytes / max(now - self._window_start, 1e-6)
+            self._window_start = now
+            self._window_bytes = 0
+            self._window_chunks = 0
+            self._step(throughput)
+
+    def finish(self):
+        """ Record the settings reached by a completed transfer for the endpoint """
+        with self._lock:
+            tuned = {}
+            if self._best is not None:
+                tuned['workers'] = self._best[0]
+            if self._chunk_seconds and self._chunk_size is not None and self._requested_chunk_size is None:
+                tuned['chunk_size'] = self._next_chunk_size()
+            if not tuned:
+                return
+            entry = self._cache.get(self._key) or {}
+            entry[self._direction] = dict(entry.get(self._direction, {}), **tuned)
+            self._cache.put(self._key, entry)
+
+    def _step(self, throughput):
+        workers = self.limit.limit
+        if self._best is None or throughput > self._best[1] * self.MIN_GAIN:
+            self._best = (workers, throughput)
+            # keep going in the same direction
+            self._try(workers * 2 if self._phase == 'up' else workers // 2)
+        elif self._phase == 'up' and self._best[0] == self._initial_workers > self.MIN_WORKERS:
+            # the first increase did not help: try fewer workers instead
+            self._phase = 'down'
+            self._try(self._initial_workers // 2)
+        else:
+            self._settle()
+
+    def _try(self, workers):
+        workers = self._clamp(workers, self.MIN_WORKERS, self.MAX_WORKERS)
+        if workers == self.limit.limit:
+            # a bound has been reached
+            self._settle()
+        else:
+            self.limit.set(workers)
+
+    def _settle(self):
+        self._phase = 'settled'
+        self.limit.set(self._best[0])
+
+    def _next_chunk_size(self):
+        seconds = sorted(self._chunk_seconds)[len(self._chunk_seconds) // 2]
+        if seconds < self.CHUNK_SECONDS[0]:
+            return self._clamp(self._chunk_size * 2, self._min_chunk_size, self.MAX_CHUNK_SIZE)
+        if seconds > self.CHUNK_SECONDS[1]:
+            return self._clamp(self._chunk_size // 2, self._min_chunk_size, self.MAX_CHUNK_SIZE)
+        return self._chunk_size
+
+    @staticmethod
+    def _clamp(value, low, high):
+        return max(low, min(high, int(value)))
@@ -14,10 +14,12 @@
 # limitations under the License.
 
 import abc
+import importlib
 
 
 class AuthFactory(type):
     provider_classes = {}
+    provider_modules = {}
 
     @classmethod
     def register(cls, provider):
@@ -27,10 +29,17 @@ class AuthFactory(type):
 
         return wrapper
 
+    @classmethod
+    def register_module(cls, provider, module):
+        # the provider implementation is imported (and registered) on first build
+        AuthFactory.provider_modules[provider] = module
+
     @classmethod
     def build(cls, provider, idtoken, *args, **kwargs):
         try:
             provider = provider.strip().lower()
+            if provider not in cls.provider_classes and provider in cls.provider_modules:
+                importlib.import_module(cls.provider_modules[provider])
             klass = cls.provider_classes[provider]
         except KeyError:
             raise ValueError("No known auth class associated with %s" % provider)
@@ -13,9 +13,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import importlib
 import os
 
+from sdlib.auth.auth_service import AuthFactory
+
+# register the provider names only: implementations (and their cloud SDKs) are imported on build
 for f in os.listdir(os.path.dirname(os.path.abspath(__file__))):
     if not f.startswith('.') and not f.startswith('__'):
-        importlib.import_module('.' + f, package=__name__)
+        AuthFactory.register_module(f, __name__ + '.' + f)
@@ -22,6 +22,8 @@ import errno
 
 from sdlib.cmd.cmd import SDUtilCMD
 from sdlib.cmd.helper import CMDHelper
+from sdlib.shared.dataset_cache import DatasetCache
+from sdlib.shared.token_cache import StorageTokenCache
 
 
 class Auth(SDUtilCMD):
@@ -48,6 +50,8 @@ class Auth(SDUtilCMD):
 
         if cmd == 'logout':
             self._auth.logout()
+            StorageTokenCache().clear()
+            DatasetCache().clear()
             return
 
         if cmd == "activate-service-account":
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import print_function
+
+import collections
+import importlib
+import io
+import json
+import os
+import shlex
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sdlib.cmd.cmd import SDUtilCMD
+from sdlib.cmd.helper import CMDHelper
+
+
+class CommandOutput(object):
+    """ Standard output routing the prints of every batch command to its own buffer.
+        The prints of the other threads (e.g. the transfer workers started by a
+        command) go to the fallback stream, so that the standard output only
+        carries the command results.
+    """
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def capture(self, buffer):
+        self._local.buffer = buffer
+
+    def release(self):
+        self._local.buffer = None
+
+    def _stream(self):
+        return getattr(self._local, 'buffer', None) or self._fallback
+
+    def write(self, text):
+        return self._stream().write(text)
+
+    def flush(self):
+        self._stream().flush()
+
+    def isatty(self):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._fallback, name)
+
+
+class CommandInput(object):
+    """ Standard input of the batch commands. A command prompting for input (a
+        confirmation, a choice) fails rather than reading the next command lines
+        (batch -) or blocking on the input of the process (serve).
+    """
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+
+    def _refuse(self, *args):
+        raise Exception('The command prompts for input, interactive commands cannot be run in a batch')
+
+    read = readline = readlines = __next__ = _refuse
+
+    def __iter__(self):
+        return self
+
+    def isatty(self):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._fallback, name)
+
+
+class Batch(SDUtilCMD):
+
+    # commands run concurrently
+    DEFAULT_JOBS = 1
+
+    # commands and options applying to the whole process, not to a single command of the batch
+    EXCLUDED_COMMANDS = ('batch', 'serve', 'config', 'auth')
+    EXCLUDED_OPTIONS = ('idtoken', 'data_partition_id', 'trace', 'profile', 'profile_top', 'no_cache')
+
+    def __init__(self, auth):
+        self._auth = auth
+        self._output = None
+        self._streams = None
+
+    def set_auth(self, auth):
+        """ Run the next commands with another auth provider """
+        self._auth = auth
+
+    def capture_output(self):
+        """ Route the prints of the commands to their own buffers and refuse their input prompts
+            until release_output is called
+        """
+        self._streams = sys.stdout, sys.stdin
+        self._output = CommandOutput(sys.stderr)
+        sys.stdout = self._output
+        sys.stdin = CommandInput(sys.stdin)
+
+    def release_output(self):
+        """ Restore the standard output and input """
+        sys.stdout, sys.stdin = self._streams
+
+    @staticmethod
+    def help():
+        reg = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'reg.json')
+        CMDHelper.cmd_help(reg)
+
+    @staticmethod
+    def get_jobs(keyword_args):
+        """ Return the number of commands run concurrently (--jobs=N) """
+        jobs = CMDHelper.getCount('batch', 'jobs', keyword_args.jobs)
+        return jobs or Batch.DEFAULT_JOBS
+
+    @staticmethod
+    def parse_line(text):
+        """ Return the id and the arguments of a command line: plain text,
+            a JSON list of arguments or a JSON object {"id": ..., "args": [...]}
+        """
+        if text[0] in '[{':
+            try:
+                command = json.loads(text)
+            except ValueError as ex:
+                raise Exception('Invalid JSON command line: ' + str(ex))
+            cmd_id = None
+            if isinstance(command, dict):
+                cmd_id = command.get('id')
+                command = command.get('args')
+            if not isinstance(command, list) or not command:
+                raise Exception('A JSON command line must be a non empty list of arguments '
+                                'or an object with a non empty "args" list')
+            return cmd_id, [str(arg) for arg in command]
+        return None, shlex.split(text)
+
+    @staticmethod
+    def read_commands(stream):
+        """ Yield the line number and the text of every command, empty and comment lines skipped """
+        for number, line in enumerate(stream, 1):
+            text = line.strip()
+            if text and not text.startswith('#'):
+                yield number, text
+
+    @staticmethod
+    def command_class(cmd_name):
+        if cmd_name not in CMDHelper.getCmdNames():
+            raise Exception('Unknown command ' + cmd_name)
+        if cmd_name in Batch.EXCLUDED_COMMANDS:
+            raise Exception('The ' + cmd_name + ' command cannot be run in a batch')
+        module = importlib.import_module('sdlib.cmd.%s.cmd' % cmd_name.lower())
+        return getattr(module, cmd_name.capitalize())
+
+    def run_args(self, args):
+        """ Run a command in the calling thread and return its output and its error message (None on success) """
+        buffer = io.StringIO()
+        self._output.capture(buffer)
+        error = None
+        try:
+            positional_args, keyword_args = CMDHelper.getPosAndKeyWordArguments(args)
+            for option in self.EXCLUDED_OPTIONS:
+                if option in vars(keyword_args):
+                    raise Exception('The --' + option.replace('_', '-') +
+                                    ' option applies to the whole process, it cannot be given to a command')
+            cmd = self.command_class(args[0])
+            cmd(self._auth).execute(positional_args, keyword_args)
+        except SystemExit:
+            # the command printed its help menu: wrong arguments
+            error = 'Wrong Command: invalid arguments, the command help menu is in the output'
+        except Exception as ex:  # pylint: disable=W0703
+            error = str(ex)
+        finally:
+            self._output.release()
+        return buffer.getvalue(), error
+
+    def run_command(self, number, text):
+        """ Run a command of the batch and return its result """
+        result = {'line': number, 'id': None, 'args': None, 'status': 'ok'}
+        start = time.perf_counter()
+        try:
+            result['id'], result['args'] = self.parse_line(text)
+            output, error = self.run_args(result['args'])
+        except Exception as ex:  # pylint: disable=W0703
+            output, error = '', str(ex)
+        if error is not None:
+            result['status'] = 'error'
+            result['error'] = error.strip()
+        result['output'] = output
+        result['elapsed'] = round(time.perf_counter() - start, 6)
+        return result
+
+    def run(self, commands, jobs):
+        """ Yield the results of the commands in order, at most "jobs" of them running at any time """
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = collections.deque()
+            for number, text in commands:
+                pending.append(executor.submit(self.run_command, number, text))
+                # a bounded window: the commands are read as they are run (e.g. from a pipe)
+                if len(pending) > jobs:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def execute(self, args, keyword_args):
+
+        if not args:
+            self.help()
+
+        source = str(args[0])
+        jobs = self.get_jobs(keyword_args)
+
+        if source != '-' and not os.path.isfile(source):
+            raise Exception(
+                '\n' + 'Wrong Command: ' + source + ' is not a file.'
+                       '\n               For more information type "python sdutil batch"'
+                       ' to open the command help menu.')
+
+        stdout = sys.stdout
+        total, failed = 0, 0
+        stdin = sys.stdin
+        fh = stdin if source == '-' else open(source)
+        self.capture_output()
+        try:
+            for result in self.run(self.read_commands(fh), jobs):
+                total += 1
+                if result['status'] != 'ok':
+                    failed += 1
+                stdout.write(json.dumps(result) + '\n')
+                stdout.flush()
+        finally:
+            self.release_output()
+            if fh is not stdin:
+                fh.close()
+
+        if failed:
+            raise Exception(str(failed) + ' of ' + str(total) + ' commands failed')
@@ -18,20 +18,32 @@ from __future__ import print_function
 
 import json
 import os
+import stat
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from sdlib.api.dataset import Dataset
+from sdlib.api.ls_walker import LsWalker
 from sdlib.api.seismic_store_service import SeismicStoreService
 from sdlib.api.storage_service import StorageFactory
+from sdlib.api.transfer import BandwidthLimiter, parse_bandwidth
+from sdlib.api.transfer_tuner import TransferTuner
 from sdlib.cmd.cmd import SDUtilCMD
 from sdlib.cmd.helper import CMDHelper
 from sdlib.shared.config import Config
 from sdlib.shared.utils import Utils
 from sdlib.shared.sdpath import SDPath
 from sdlib.shared.storagetier import Tier
+from sdlib.shared.transfer_journal import TransferJournal
 
 
 class Cp(SDUtilCMD):
+
+    # datasets transferred concurrently in recursive mode
+    DEFAULT_JOBS = 4
+
     def __init__(self, auth):
         self._auth = auth
 
@@ -41,24 +53,75 @@ class Cp(SDUtilCMD):
                            'reg.json')
         CMDHelper.cmd_help(reg)
 
+    @staticmethod
+    def get_workers(keyword_args):
+        """ Return the number of concurrent transfer workers (--workers=N),
+            None if not specified (the storage provider default is used)
+        """
+        return CMDHelper.getCount('cp', 'workers', keyword_args.workers)
+
+    @staticmethod
+    def get_jobs(keyword_args):
+        """ Return the number of datasets transferred concurrently in recursive mode (--jobs=N) """
+        jobs = CMDHelper.getCount('cp', 'jobs', keyword_args.jobs)
+        return jobs or Cp.DEFAULT_JOBS
+
+    @staticmethod
+    def get_max_bandwidth(keyword_args):
+        """ Return the bandwidth limit of the transfers in bytes per second (--max-bandwidth=200MB/s),
+            None if not specified
+        """
+        if keyword_args.max_bandwidth is None:
+            return None
+        try:
+            # discard option with no value (--max-bandwidth) or with a wrong value (--max-bandwidth=fast)
+            return parse_bandwidth('' if keyword_args.max_bandwidth is True else keyword_args.max_bandwidth)
+        except ValueError:
+            raise Exception(
+                '\n' + 'Wrong Command: '
+                       'The max-bandwidth argument must be a rate greater than zero, e.g. 200MB/s or 1.5GiB/s'
+                       '\n               For more information type "python sdutil cp"'
+                       ' to open the command help menu.')
+
+    @staticmethod
+    def build_tuner(sd, sdpath, direction, chunk_size=None, workers=None):
+        """ Return the tuner of an --auto-tune transfer, starting from the settings given on the command line
+        """
+        return TransferTuner(sd.get_cloud_provider(sdpath), Config.get_svc_url(), direction,
+                             chunk_size=chunk_size, workers=workers)
+
     def execute(self, args, keyword_args):
 
         if len(args) < 2:
             self.help()
 
-        if Utils.isSDPath(args[0]) and Utils.isSDPath(args[1]):
-            self.cp_sd_to_sd(args, keyword_args)
-        elif Utils.isSDPath(args[0]):
-            self.cp_sd_to_local(args, keyword_args)
-        elif Utils.isSDPath(args[-1]) or Utils.isSDPath(args[-2]):
-            self.cp_local_to_sd(args, keyword_args)
-        else:
-            raise Exception(
-                '\n' +
-                'Wrong Command: No seismic store dataset path has been '
-                'specified or the provided one does not start with sd://.\n'
-                '               For more information type "python sdutil cp"'
-                ' to open the command help menu.')
+        recursive_flag = keyword_args.r is not None or keyword_args.recursive is not None
+
+        # the limit is shared by all the files transferred by the command
+        max_bandwidth = self.get_max_bandwidth(keyword_args)
+        if max_bandwidth is not None:
+            BandwidthLimiter.add_limit(max_bandwidth)
+        try:
+            if recursive_flag and not Utils.isSDPath(args[0]) and Utils.isSDPath(args[1]):
+                self.cp_local_dir_to_sd(args, keyword_args)
+            elif recursive_flag and Utils.isSDPath(args[0]) and not Utils.isSDPath(args[1]):
+                self.cp_sd_dir_to_local(args, keyword_args)
+            elif Utils.isSDPath(args[0]) and Utils.isSDPath(args[1]):
+                self.cp_sd_to_sd(args, keyword_args)
+            elif Utils.isSDPath(args[0]):
+                self.cp_sd_to_local(args, keyword_args)
+            elif Utils.isSDPath(args[-1]) or Utils.isSDPath(args[-2]):
+                self.cp_local_to_sd(args, keyword_args)
+            else:
+                raise Exception(
+                    '\n' +
+                    'Wrong Command: No seismic store dataset path has been '
+                    'specified or the provided one does not start with sd://.\n'
+                    '               For more information type "python sdutil cp"'
+                    ' to open the command help menu.')
+        finally:
+            if max_bandwidth is not None:
+                BandwidthLimiter.remove_limit(max_bandwidth)
 
     def cp_sd_to_sd(self, args, keyword_args):
         """ Copy a file from seismic_store to seismic_store
@@ -100,6 +163,7 @@ class Cp(SDUtilCMD):
                             '         example, "local_file" or "c:\\\\Users\\\\MyUser\\\\Desktop\\\\local_file"')
         sdpath = str(args[0])
         local_file = str(args[1])
+        workers = self.get_workers(keyword_args)
         if ("--idtoken" in local_file):
             raise Exception(
                 '\n' + 'Wrong Command: the local directory ends with a backslash (\\)'
@@ -130,21 +194,10 @@ class Cp(SDUtilCMD):
                 '\n               For more information type "python sdutil cp"'
                 ' to open the command help menu.')
 
-        sd = SeismicStoreService(self._auth)
-        ds = Dataset.from_json(sd.dataset_lock(sdpath, "read"))
-        if ds.filemetadata is None:
-            raise Exception('Corrupted dataset ' + sdpath +
-                            ', filemetadata not found.')
-        if 'nobjects' not in ds.filemetadata:
-            raise Exception('Corrupted dataset ' + sdpath +
-                            ', unexpected filemetadata.')
-        if ds.filemetadata['type'] != 'GENERIC':
-            raise Exception('Dataset is of type ' + ds.filemetadata['type'] +
-                            '. This type is not currently supported')
-        storage_service = StorageFactory.build(
-            sd.get_cloud_provider(sdpath), auth=self._auth)
         force = keyword_args.force or keyword_args.f or False
-        if (os.path.isfile(local_file) and not force):
+        resume = keyword_args.resume is not None
+        auto_tune = keyword_args.auto_tune is not None
+        if (os.path.isfile(local_file) and not force and not resume):
                 raise Exception('The local file ' + local_file + ' already exists. If you want to overwrite it, please use the --force flag (or --f).')
         if (os.name == "nt"):
             if  ("c:" in local_file.lower() and "\\" in local_file and os.path.isdir(local_file)):
@@ -155,21 +208,112 @@ class Cp(SDUtilCMD):
                 if (confirm != 'y'):
                     raise Exception('\nProgram Terminated. Please ensure your local file path is specified between quotes. ' +
                         'for example "local_file" or "c:\\\\Users\\\\MyUser\\\\Desktop\\\\local_file"')
-        storage_service.download(local_file, ds)
-        if ds.sbit is not None:
-            sd.dataset_patch(sdpath, None, ds.sbit)
 
+        sd = SeismicStoreService(self._auth)
+        storage_service = StorageFactory.build(
+            sd.get_cloud_provider(sdpath), auth=self._auth)
+        self.download_dataset(sd, storage_service, sdpath, local_file, workers, resume=resume, auto_tune=auto_tune)
+
+    def download_dataset(self, sd, storage_service, sdpath, local_file, workers, quiet=False, resume=False,
+                         auto_tune=False):
+        """ Download a dataset to a local file under a read lock, released (sbit) once the transfer is over.
+            A resumed download keeps the verified part of an interrupted one (progress sidecar file).
+            Return the dataset size.
+        """
+        tuner = self.build_tuner(sd, sdpath, 'download', workers=workers) if auto_tune else None
+        ds = Dataset.from_json(sd.dataset_lock(sdpath, "read"))
+        try:
+            if ds.filemetadata is None:
+                raise Exception('Corrupted dataset ' + sdpath +
+                                ', filemetadata not found.')
+            if 'nobjects' not in ds.filemetadata:
+                raise Exception('Corrupted dataset ' + sdpath +
+                                ', unexpected filemetadata.')
+            if ds.filemetadata['type'] != 'GENERIC':
+                raise Exception('Dataset is of type ' + ds.filemetadata['type'] +
+                                '. This type is not currently supported')
+            storage_service.download(local_file, ds, workers=workers, quiet=quiet, resume=resume, tuner=tuner)
+        finally:
+            if ds.sbit is not None:
+                sd.dataset_patch(sdpath, None, ds.sbit)
+        if tuner is not None:
+            tuner.finish()
+
+        size = ds.filemetadata['size']
         if ds.seismicmeta is None:
-            ds = Dataset.from_json(sd.dataset_get(sdpath, 'true'))
-        
+            ds = Dataset.from_json(sd.dataset_get(sdpath, 'true', lock_state=False))
+
         if ds.seismicmeta is not None:
             with open(local_file + '.json', 'w') as outfile:
                 json.dump(ds.seismicmeta, outfile)
+        return size
 
-    def cp_local_to_sd(self, args, keyword_args):
-        """ Copy a local file to seismic store
+    def cp_sd_dir_to_local(self, args, keyword_args):
+        """ Copy a seismic store folder tree to a local directory (recursive download)
+        """
+        sdpath_root = str(args[0]).rstrip('/')
+        local_dir = str(args[1])
+        workers = self.get_workers(keyword_args)
+        jobs = self.get_jobs(keyword_args)
+        force = keyword_args.force or keyword_args.f or False
+        resume = keyword_args.resume is not None
+        auto_tune = keyword_args.auto_tune is not None
+
+        if not (Utils.isSubProject(sdpath_root) or Utils.isDatasetPath(sdpath_root)):
+            raise Exception(
+                '\n' + 'Wrong Command: ' + sdpath_root +
+                ' is not a valid seismic store folder path.\n'
+                '               A valid seismic store folder path must be in '
+                'this form '
+                'sd://<tenant_name>/<subproject_name>/<path>*/'
+                '\n               For more information type "python sdutil cp"'
+                ' to open the command help menu.')
+
+        if os.path.exists(local_dir) and not os.path.isdir(local_dir):
+            raise Exception(
+                '\n' + 'Wrong Command: ' + local_dir +
+                ' is not a valid local directory.\n'
+                '               For more information type "python sdutil cp"'
+                ' to open the command help menu.')
+
+        # a single seismic store client, storage service and token cache shared by all the transfers
+        sd = SeismicStoreService(self._auth)
+        storage_service = StorageFactory.build(sd.get_cloud_provider(sdpath_root), auth=self._auth)
+        self._auth.get_id_token()
+
+        # the seismic store folder is mapped onto the local tree: <sdpath>/a/b.segy -> <local_dir>/a/b.segy
+        folders = [local_dir]
+        transfers = []
+        walker = LsWalker(sd, sd.get_service_provider())
+        for sdpath, item, folder in walker.walk(sdpath_root, recursive=True, ordered=False):
+            relpath = (sdpath + '/' + (folder or item))[len(sdpath_root) + 1:]
+            local_path = os.path.join(local_dir, *relpath.split('/'))
+            if folder is not None:
+                folders.append(local_path)
+            else:
+                transfers.append((sdpath + '/' + item, local_path, None))
+
+        for folder in folders:
+            os.makedirs(folder, exist_ok=True)
+
+        if not transfers:
+            print('\nNo datasets found in ' + sdpath_root + '/')
+            return
+        transfers.sort()
+
+        def download(sdpath, local_file):
+            if os.path.exists(local_file) and not force and not resume:
+                raise Exception('The local file already exists. If you want to overwrite it, '
+                                'please use the --force flag (or --f).')
+            return self.download_dataset(sd, storage_service, sdpath, local_file, workers, quiet=True, resume=resume,
+                                         auto_tune=auto_tune)
+
+        print('\n- Downloading ' + str(len(transfers)) + ' datasets from ' + sdpath_root + '/ to ' + local_dir)
+        self.run_transfers(transfers, download, jobs, 'downloaded')
+
+    def get_upload_options(self, keyword_args):
+        """ Parse the upload options shared by the single file and the recursive upload
         """
-        seismicmeta = None
         seismicmeta_file = None
         read_write_flag = None
         read_only_file_flag = None
@@ -226,6 +370,25 @@ class Cp(SDUtilCMD):
                            '\n               For more information type "python sdutil cp"'
                            ' to open the command help menu.')
 
+        return {
+            'tier': tier,
+            'seismicmeta_file': seismicmeta_file,
+            'read_only': read_only_file_flag,
+            'read_write': read_write_flag,
+            'chunk_size': chunk_size,
+            'workers': self.get_workers(keyword_args),
+            'resume': keyword_args.resume is not None,
+            'auto_tune': keyword_args.auto_tune is not None,
+            'chunk_size_given': keyword_args.chunk_size is not None
+        }
+
+    def cp_local_to_sd(self, args, keyword_args):
+        """ Copy a local file to seismic store
+        """
+        seismicmeta = None
+        options = self.get_upload_options(keyword_args)
+        seismicmeta_file = options['seismicmeta_file']
+
         local_file = None
         legal_tag = None
         sdpath = None
@@ -269,14 +432,12 @@ class Cp(SDUtilCMD):
                 '\n               For more information type "python sdutil cp"'
                 'to open the command help menu.')
 
-        sd = SeismicStoreService(self._auth)
-        if seismicmeta_file:
-            with open(seismicmeta_file, 'r') as f:
-                seismicmeta = json.load(f)
-        ds = Dataset.from_json(sd.dataset_register(sdpath, None,
-                                                   legal_tag, seismicmeta))
-
-        if os.path.isfile(local_file) is False:
+        # the local file is stat'ed once, its size and fingerprint are taken from this result
+        try:
+            local_stat = os.stat(local_file)
+        except OSError:
+            local_stat = None
+        if local_stat is None or not stat.S_ISREG(local_stat.st_mode):
             raise Exception(
                 '\n' + 'Wrong Command: ' + local_file +
                 ' is not a valid local file name or '
@@ -285,13 +446,68 @@ class Cp(SDUtilCMD):
                 'please use double backslash.\n'
                 '               For more information type "python sdutil cp"'
                 ' to open the command help menu.')
+
+        sd = SeismicStoreService(self._auth)
+        if seismicmeta_file:
+            with open(seismicmeta_file, 'r') as f:
+                seismicmeta = json.load(f)
+        ds, journal = self.register_dataset(sd, sdpath, local_file, legal_tag, seismicmeta, options['resume'],
+                                            local_stat=local_stat)
+
         storage_service = StorageFactory.build(
             sd.get_cloud_provider(sdpath), auth=self._auth)
 
+        self.upload_dataset(sd, storage_service, local_file, sdpath, ds, options, journal=journal,
+                            local_stat=local_stat)
+
+    def register_dataset(self, sd, sdpath, local_file, legal_tag, seismicmeta, resume, quiet=False, local_stat=None):
+        """ Register the dataset to upload, or reload the one of an interrupted upload (--resume).
+            Return the dataset and the transfer journal (None if the upload is not resumable)
+        """
+        if not resume:
+            return Dataset.from_json(sd.dataset_register(sdpath, None, legal_tag, seismicmeta)), None
+
+        journal = TransferJournal('upload', sdpath, local_file, local_stat=local_stat)
+        state = journal.load()
+        if state is not None:
+            if state.get('source') != journal.fingerprint():
+                journal.remove()
+                raise Exception(
+                    'The local file ' + local_file + ' has changed since the interrupted upload to ' + sdpath +
+                    '. Remove the dataset (python sdutil rm ' + sdpath + ') and upload the file again.')
+            if not quiet:
+                print('\n- Resuming the interrupted upload of ' + local_file + ' to ' + sdpath)
+            return Dataset.from_json(state['dataset']), journal
+
+        dataset = sd.dataset_register(sdpath, None, legal_tag, seismicmeta)
+        ds = Dataset.from_json(dataset)
+        journal.start(dataset=dataset, sbit=ds.sbit)
+        return ds, journal
+
+    def upload_dataset(self, sd, storage_service, local_file, sdpath, ds, options, quiet=False, journal=None,
+                       local_stat=None):
+        """ Upload a local file to a registered dataset and finalize its metadata.
+            A journaled upload keeps the dataset and the transferred objects on failure, to be resumed.
+            The size of the file is taken from local_stat when given (the file is not stat'ed again).
+        """
+        size = local_stat.st_size if local_stat is not None else os.path.getsize(local_file)
+        tuner = None
+        if options['auto_tune']:
+            # the settings given on the command line are not tuned
+            tuner = self.build_tuner(sd, sdpath, 'upload', workers=options['workers'],
+                                     chunk_size=options['chunk_size'] * 1048576 if options['chunk_size_given'] else None)
         try:
-            upload_response = storage_service.upload(local_file, ds, storage_tier=tier, chunk_size=chunk_size)
+            upload_response = storage_service.upload(local_file, ds, storage_tier=options['tier'],
+                                                     chunk_size=options['chunk_size'],
+                                                     workers=options['workers'], quiet=quiet,
+                                                     journal=journal, tuner=tuner, size=size)
         except Exception:
-            print('Error encountered during upload, deleting the partially created record from seismic store')
+            if journal is not None:
+                if not quiet:
+                    print('Error encountered during upload, run the command again with --resume to resume it')
+                raise
+            if not quiet:
+                print('Error encountered during upload, deleting the partially created record from seismic store')
             sd.dataset_delete(sdpath)
             raise
 
@@ -299,17 +515,140 @@ class Cp(SDUtilCMD):
             patch = {
                 'filemetadata': {
                     'type': 'GENERIC',
-                    'size':  os.path.getsize(local_file),
+                    'size':  size,
                     'nobjects': upload_response["num_of_objects"],
                     'md5Checksum': upload_response.get("md5_checksum", None),
                     'tier_class': upload_response.get("blob_tier")
                 }
             }
 
-            if read_write_flag:
+            if options['read_write']:
                 patch['readonly'] = False
-            elif sdpath.endswith(tuple(Config.get_readonly_file_formats())) or read_only_file_flag:
+            elif sdpath.endswith(tuple(Config.get_readonly_file_formats())) or options['read_only']:
                 patch['readonly'] = True
             sd.dataset_patch(sdpath, patch, ds.sbit)
         else:
             sd.dataset_delete(sdpath)
+        if journal is not None:
+            journal.remove()
+        if tuner is not None:
+            tuner.finish()
+
+    def cp_local_dir_to_sd(self, args, keyword_args):
+        """ Copy a local directory tree to a seismic store folder (recursive upload)
+        """
+        options = self.get_upload_options(keyword_args)
+        jobs = self.get_jobs(keyword_args)
+        local_dir = str(args[0])
+        sdpath_root = str(args[1]).rstrip('/')
+        legal_tag = args[2] if len(args) > 2 else None
+
+        if options['seismicmeta_file']:
+            raise Exception(
+                '\n' + 'Wrong Command: '
+                       'The seismicmeta argument is not supported in recursive mode'
+                       '\n               For more information type "python sdutil cp"'
+                       ' to open the command help menu.')
+
+        if not os.path.isdir(local_dir):
+            raise Exception(
+                '\n' + 'Wrong Command: ' + local_dir +
+                ' is not a valid local directory.\n'
+                '               For more information type "python sdutil cp"'
+                ' to open the command help menu.')
+
+        if not (Utils.isSubProject(sdpath_root) or Utils.isDatasetPath(sdpath_root)):
+            raise Exception(
+                '\n' + 'Wrong Command: ' + sdpath_root +
+                ' is not a valid seismic store folder path.\n'
+                '               A valid seismic store folder path must be in '
+                'this form '
+                'sd://<tenant_name>/<subproject_name>/<path>*/'
+                '\n               For more information type "python sdutil cp"'
+                ' to open the command help menu.')
+
+        # the local tree is mapped onto the seismic store folder: <local_dir>/a/b.segy -> <sdpath>/a/b.segy
+        transfers = []
+        local_stats = {}
+        for local_file, local_stat in self.scan_local_tree(local_dir):
+            relpath = os.path.relpath(local_file, local_dir).replace(os.sep, '/')
+            transfers.append((local_file, sdpath_root + '/' + relpath, local_stat.st_size))
+            local_stats[local_file] = local_stat
+
+        if not transfers:
+            print('\nNo files found in ' + local_dir)
+            return
+
+        # a single seismic store client, storage service and token cache shared by all the transfers
+        sd = SeismicStoreService(self._auth)
+        storage_service = StorageFactory.build(sd.get_cloud_provider(sdpath_root), auth=self._auth)
+        self._auth.get_id_token()
+
+        def upload(local_file, sdpath):
+            local_stat = local_stats[local_file]
+            ds, journal = self.register_dataset(sd, sdpath, local_file, legal_tag, None, options['resume'], quiet=True,
+                                                local_stat=local_stat)
+            self.upload_dataset(sd, storage_service, local_file, sdpath, ds, options, quiet=True, journal=journal,
+                                local_stat=local_stat)
+
+        print('\n- Uploading ' + str(len(transfers)) + ' files from ' + local_dir + ' to ' + sdpath_root + '/')
+        self.run_transfers(transfers, upload, jobs, 'uploaded')
+
+    def scan_local_tree(self, local_dir):
+        """ Return the (path, stat) of every file of a local directory tree, in os.walk order.
+            The stat results come with the directory listing (os.scandir), symbolic links to
+            directories are not followed.
+        """
+        with os.scandir(local_dir) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        files = [(entry.path, entry.stat()) for entry in entries if not entry.is_dir()]
+        for entry in entries:
+            if entry.is_dir() and not entry.is_symlink():
+                files.extend(self.scan_local_tree(entry.path))
+        return files
+
+    def run_transfers(self, transfers, transfer, jobs, verb):
+        """ Run transfer(source, destination) for every (source, destination, size) on a pool of
+            workers, report each completed transfer and a final summary.
+            If the size is not known upfront (None) it is the one returned by transfer.
+            Failed transfers do not stop the others, they are reported at the end.
+        """
+        lock = threading.Lock()
+        failures = []
+        done = [0, 0]
+        start_time = time.time()
+
+        def run(source, destination, size):
+            try:
+                transferred = transfer(source, destination)
+            except Exception as ex:
+                with lock:
+                    failures.append((source, destination, str(ex).strip()))
+                    done[0] += 1
+                    print('- [' + str(done[0]) + '/' + str(len(transfers)) + '] failed ' + source +
+                          ' -> ' + destination + ': ' + str(ex).strip())
+                return
+            if size is None:
+                size = transferred or 0
+            with lock:
+                done[0] += 1
+                done[1] += size
+                print('- [' + str(done[0]) + '/' + str(len(transfers)) + '] ' + verb + ' ' + source +
+                      ' -> ' + destination + ' (' + Utils.sizeof_fmt(size) + ')')
+                sys.stdout.flush()
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(lambda item: run(*item), transfers))
+
+        elapsed = time.time() - start_time + sys.float_info.epsilon
+        completed = len(transfers) - len(failures)
+        print('\n- Transfer summary: ' + str(completed) + ' files ' + verb + ', ' + Utils.sizeof_fmt(done[1]) +
+              ' in ' + ('%.1f' % elapsed) + ' s (' + ('%.2f' % (done[1] / 1048576.0 / elapsed)) + ' MB/s, ' +
+              ('%.2f' % (completed / elapsed)) + ' files/s), ' + str(len(failures)) + ' failures')
+        sys.stdout.flush()
+
+        if failures:
+            raise Exception(
+                '\n' + str(len(failures)) + ' of ' + str(len(transfers)) + ' transfers failed:\n' +
+                '\n'.join('  ' + source + ' -> ' + destination + ': ' + error
+                          for source, destination, error in failures))
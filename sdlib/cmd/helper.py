@@ -17,27 +17,22 @@
 import os
 import json
 from sdlib.cmd.keyword_args import KeywordArguments
+from sdlib.cmd.registry import CommandRegistry
+from sdlib.shared.profiler import Profiler
+from sdlib.shared.tracer import Tracer
 
 
 class CMDHelper(object):
 
     @staticmethod
     def getRegFiles():
-        dircmd = os.path.dirname(__file__)
-        full_cmd_dirs = map(lambda x: os.path.join(dircmd, x),
-                            os.listdir(dircmd))
-        return [os.path.join(x, 'reg.json')
-                for x in filter(lambda x: os.path.isdir(x) and "__pycache__" not in x,
-                                full_cmd_dirs)]
+        return CommandRegistry.reg_files()
 
     @staticmethod
     def getMainHelp():
-        data = []
-        for rfile in CMDHelper.getRegFiles():
-            with open(rfile) as f:
-                data.append(json.load(f))
-        names = [x['name'] for x in data]
-        descriptions = [x['description'] for x in data]
+        commands = CommandRegistry.commands().values()
+        names = [x['name'] for x in commands]
+        descriptions = [x['description'] for x in commands]
         return names, descriptions
 
     @staticmethod
@@ -50,11 +45,7 @@ class CMDHelper(object):
 
     @staticmethod
     def getCmdNames():
-        data = []
-        for rfile in CMDHelper.getRegFiles():
-            with open(rfile) as f:
-                data.append(json.load(f))
-        return [x['name'] for x in data]
+        return list(CommandRegistry.commands())
 
     @staticmethod
     def getPosAndKeyWordArguments(args):
@@ -94,6 +85,26 @@ class CMDHelper(object):
 
         return positional_args, kw_args
 
+    @staticmethod
+    def getCount(cmd_name, name, value):
+        """ Return the value of a count option (--workers=N, --jobs=N), None if not specified.
+            A count must be an integer value greater than zero.
+        """
+        if value is None:
+            return None
+        try:
+            # discard option with no value (--workers) or with value "not an int" (--workers=test)
+            count = 0 if value is True else int(value)
+        except ValueError:
+            count = 0
+        if count <= 0:
+            raise Exception(
+                '\n' + 'Wrong Command: '
+                       'The ' + name + ' argument must be an integer value greater than zero'
+                       '\n               For more information type "python sdutil ' + cmd_name + '"'
+                       ' to open the command help menu.')
+        return count
+
     @staticmethod
     def main_help():
         version = CMDHelper.getVersion().replace(" ", "")
@@ -107,23 +118,37 @@ class CMDHelper(object):
         for name, desc in zip(names, descriptions):
             spacing = ' ' * (lmax - len(name))
             s += ' * ' + name + spacing + ' : ' + desc + '\n'
+        s += '\nglobal options:\n\n'
+        s += ' * --trace[=file] : save a timeline of the service, storage and auth calls of the command\n'
+        s += '                   in the Chrome trace format (default file ' + Tracer.DEFAULT_FILE + ')\n'
+        s += ' * --profile[=file] : profile the command, save the stats (default file ' + Profiler.DEFAULT_FILE + ') and print\n'
+        s += '                     the top functions (--profile-top=N, default ' + str(Profiler.DEFAULT_TOP) + '), the wall and cpu time and the peak memory\n'
+        s += ' * --no-cache       : read the dataset records from the service rather than from the local metadata cache\n'
         return s
 
+    @staticmethod
+    def getRegistration(regfile):
+        """ Return the registration of a command from the index, the file itself if not indexed """
+        reg = CommandRegistry.commands().get(os.path.basename(os.path.dirname(regfile)))
+        if reg is None:
+            with open(regfile) as f:
+                reg = json.load(f)
+        return reg
+
     @staticmethod
     def cmd_help(helpfile):
-        with open(helpfile) as f:
-            reg = json.load(f)
-            version = CMDHelper.getVersion().replace(" ", "")
-            if len(version) > 0:
-                version = ' (' + version + ')'
-            if 'help' in reg:
-                # s = '\n---------------------------------------------------\n'
-                s = '\nSeismic Store Utility' + version + '\n'
-                # s += '---------------------------------------------------\n'
-                s += '\ncommand name: ' + reg['name']
-                s += '\ncommand desc: ' + reg['description'] + '\n\n'
-                # s += '\n---------------------------------------------------\n\n'  # noqa E501
-                s += '\n'.join(reg['help']) + '\n'
-                # s += '\n\n---------------------------------------------------'
-                print(s)
-                exit(0)
+        reg = CMDHelper.getRegistration(helpfile)
+        version = CMDHelper.getVersion().replace(" ", "")
+        if len(version) > 0:
+            version = ' (' + version + ')'
+        if 'help' in reg:
+            # s = '\n---------------------------------------------------\n'
+            s = '\nSeismic Store Utility' + version + '\n'
+            # s += '---------------------------------------------------\n'
+            s += '\ncommand name: ' + reg['name']
+            s += '\ncommand desc: ' + reg['description'] + '\n\n'
+            # s += '\n---------------------------------------------------\n\n'  # noqa E501
+            s += '\n'.join(reg['help']) + '\n'
+            # s += '\n\n---------------------------------------------------'
+            print(s)
+            exit(0)
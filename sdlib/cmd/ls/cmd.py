@@ -23,6 +23,7 @@ from sdlib.cmd.cmd import SDUtilCMD
 from sdlib.cmd.helper import CMDHelper
 from sdlib.shared.utils import Utils
 from sdlib.api.seismic_store_service import SeismicStoreService
+from sdlib.api.ls_walker import LsWalker
 
 
 class Ls(SDUtilCMD):
@@ -36,6 +37,12 @@ class Ls(SDUtilCMD):
                            'reg.json')
         CMDHelper.cmd_help(reg)
 
+    @staticmethod
+    def get_workers(keyword_args):
+        """ Return the number of concurrent listing workers (--workers=N) """
+        workers = CMDHelper.getCount('ls', 'workers', keyword_args.workers)
+        return workers or LsWalker.DEFAULT_WORKERS
+
     def execute(self, args, keyword_args):
 
         if not args:
@@ -46,8 +53,17 @@ class Ls(SDUtilCMD):
         full_path_flag = any([keyword_args.l, keyword_args.full_path,
                               keyword_args.long, keyword_args.lr,
                               keyword_args.rl])
+        # recursive listings are streamed as they arrive, unless sorted output is requested
+        sorted_flag = not recursive_flag or keyword_args.sorted is not None
+        workers = self.get_workers(keyword_args)
         names = args
 
+        # the service provider is resolved once (and cached) for all the listed paths
+        provider = None
+        if names and all(Utils.isSDPath(sdpath) for sdpath in names):
+            provider = SeismicStoreService(self._auth).get_service_provider(
+                refresh=keyword_args.refresh_provider is not None)
+
         for sdpath in names:
             # If multiple command line arguments, show which arg
             # we are processing. Similar to the recursive mode.
@@ -55,9 +71,9 @@ class Ls(SDUtilCMD):
                 print('')
                 print(sdpath + "/")
             print('')
-            self.executeLs(sdpath, None, recursive_flag, full_path_flag)
+            self.executeLs(sdpath, provider, recursive_flag, full_path_flag, sorted_flag, workers)
 
-    def executeLs(self, sdpath, provider, recursive_flag, full_path_flag):
+    def executeLs(self, sdpath, provider, recursive_flag, full_path_flag, sorted_flag=True, workers=None):
 
         if Utils.isSDPath(sdpath) is False:
             raise Exception(
@@ -72,102 +88,36 @@ class Ls(SDUtilCMD):
 
         seismicStoreClient = SeismicStoreService(self._auth)
         if provider is None:
-            res, headers = seismicStoreClient.status()
-            provider = headers['Service-Provider']
-
-        if provider == 'azure':
-
-            next_page_cursor = None
-            limit = 10000
-            working_mode = 'all'
-            while True:
-
-                res = seismicStoreClient.ls(
-                    sdpath, limit=limit, next_page_cursor=next_page_cursor, working_mode=working_mode)
-
-                if sdpath == 'sd://' or Utils.isTenant(sdpath):
-                    for item in res:
-                        if full_path_flag:
-                            print(sdpath + "/" + item)
-                        else:
-                            print(item)
-                    return
-
-                # folders returned with the first call, after only  pagination calls for datasets  
-                working_mode = 'datasets'
-
-                # The backend returns all the sub-folders before the datasets.
-                # Keep this behavior for backwards compatibility.
-                # Apart from that the items are returned in an arbitrarily
-                # scrambled order. I want them sorted to improve usability.
-                dirs = sorted([e for e in res['datasets'] if e and e[-1] == '/'])
-                datasets = sorted([e for e in res['datasets'] if e and e[-1] != '/'])
-
-                for item in (list(dirs) + list(datasets)):
-
-                    # If this item represents a folder or a subproject, set "folder"
-                    # to the name (sans trailing slash) of that folder.
-                    if "/" not in sdpath[5:]:
-                        folder = item
-                    elif item[-1] == '/':
-                        folder = item[:-1]
-                    else:
-                        folder = None
-
-                    # Print the item (file or folder) itself, except for -lr
-                    # where we don't show folders at all.
-                    if recursive_flag and full_path_flag and folder:
-                        pass
-                    elif full_path_flag or (recursive_flag and folder):
-                        print(sdpath + "/" + item)
-                    else:
-                        print(item)
-
-                    if recursive_flag and folder:
-                        self.executeLs(sdpath + "/" + folder, provider, recursive_flag, full_path_flag)
-
-                sys.stdout.flush()
+            provider = seismicStoreClient.get_service_provider()
 
-                if 'nextPageCursor' not in res or res['nextPageCursor'] is None:
-                    break
-
-                next_page_cursor = res['nextPageCursor']
-        
-        else: # provider != 'azure' // for these pagination of the ls method should be checked/reviewed
-            
-            res = seismicStoreClient.ls(sdpath)
+        # for the non azure providers the sub-folders trees are separated by an empty line
+        tree_separator = provider != 'azure' and sorted_flag and not (recursive_flag and full_path_flag)
+        if provider != 'azure' and not recursive_flag:
+            print('')
 
-            # The backend returns all the sub-folders before the datasets.
-            # Keep this behavior for backwards compatibility.
-            # Apart from that the items are returned in an arbitrarily
-            # scrambled order. I want them sorted to improve usability.
-            dirs = sorted([e for e in res if e[-1] == '/'])
-            datasets = sorted([e for e in res if e[-1] != '/'])
+        walker = LsWalker(seismicStoreClient, provider, workers=workers or LsWalker.DEFAULT_WORKERS)
+        current_path = sdpath
+        for path, item, folder in walker.walk(sdpath, recursive=recursive_flag, ordered=sorted_flag):
 
-            if not recursive_flag:
-                print('')
-
-            for item in (list(dirs) + list(datasets)):
-                # If this item represents a folder or a subproject, set "folder"
-                # to the name (sans trailing slash) of that folder.
-                if "/" not in sdpath[5:]:
-                    folder = item
-                elif item[-1] == '/':
-                    folder = item[:-1]
-                else:
-                    folder = None
-                # Print the item (file or folder) itself, except for -lr
-                # where we don't show folders at all.
-                if recursive_flag and full_path_flag and folder:
-                    pass
-                elif full_path_flag or (recursive_flag and folder):
-                    print(sdpath + "/" + item)
-                else:
-                    print(item)
-                if recursive_flag and folder:
-                    self.executeLs(sdpath + "/" + folder, recursive_flag,
-                                full_path_flag)
-                    if not (recursive_flag and full_path_flag):
-                        print('')
-
-            sys.stdout.flush()
+            # flush the output once a folder listing has been printed
+            if path != current_path:
+                sys.stdout.flush()
+                current_path = path
+
+            if item is None:
+                # end of a sub-folder tree
+                if tree_separator:
+                    print('')
+                continue
+
+            # Print the item (file or folder) itself, except for -lr
+            # where we don't show folders at all.
+            if recursive_flag and full_path_flag and folder:
+                pass
+            elif full_path_flag or (recursive_flag and folder) or not sorted_flag:
+                # streamed listings interleave the folders: the datasets are printed with their folder
+                print(path + "/" + item)
+            else:
+                print(item)
+
+        sys.stdout.flush()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import pickle
+import threading
+
+from sdlib.shared.atomic_file import atomic_write
+
+
+class CommandRegistry(object):
+    """ Index of the command registrations (the reg.json of every sdlib/cmd folder).
+
+        The parsed registrations are saved in a pickled table next to the
+        commands, built at packaging time (python -m sdlib.cmd.registry) or by
+        the first run. The table records the size and modification time of
+        every reg.json it was built from: it is rebuilt as soon as one of them
+        changes or a command folder is added or removed, so checking it costs
+        a directory listing and a stat per command instead of parsing them all.
+    """
+
+    VERSION = 1
+    INDEX_FILE = 'cmd_index.pickle'
+
+    _commands = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def cmd_dir():
+        return os.path.dirname(os.path.abspath(__file__))
+
+    @classmethod
+    def reg_files(cls):
+        dircmd = cls.cmd_dir()
+        cmd_dirs = [os.path.join(dircmd, x) for x in os.listdir(dircmd) if x != '__pycache__']
+        return [os.path.join(x, 'reg.json') for x in cmd_dirs if os.path.isdir(x)]
+
+    @staticmethod
+    def signature(reg_files):
+        """ Return the size and modification time of every registration file """
+        entries = []
+        for rfile in reg_files:
+            st = os.stat(rfile)
+            entries.append((os.path.basename(os.path.dirname(rfile)), st.st_size, st.st_mtime_ns))
+        return sorted(entries)
+
+    @classmethod
+    def commands(cls):
+        """ Return the registrations of the commands by name, in listing order """
+        with cls._lock:
+            if cls._commands is None:
+                cls._commands = cls.load(os.path.join(cls.cmd_dir(), cls.INDEX_FILE))
+            return cls._commands
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._commands = None
+
+    @classmethod
+    def load(cls, index_file):
+        """ Return the registrations from the index file, rebuilt (and saved if possible) when stale """
+        reg_files = cls.reg_files()
+        signature = cls.signature(reg_files)
+        try:
+            with open(index_file, 'rb') as fh:
+                index = pickle.load(fh)
+            if index['version'] == cls.VERSION and index['signature'] == signature:
+                return index['commands']
+        except Exception:  # pylint: disable=W0703
+            # missing, corrupted or from another version: rebuilt
+            pass
+        commands = cls.build(reg_files)
+        cls.save(index_file, {'version': cls.VERSION, 'signature': signature, 'commands': commands})
+        return commands
+
+    @staticmethod
+    def build(reg_files):
+        commands = {}
+        for rfile in reg_files:
+            with open(rfile) as fh:
+                reg = json.load(fh)
+            commands[reg['name']] = reg
+        return commands
+
+    @staticmethod
+    def save(index_file, index):
+        try:
+            # shared by the users of the installation
+            atomic_write(index_file, lambda fh: pickle.dump(index, fh, protocol=pickle.HIGHEST_PROTOCOL),
+                         binary=True, mode=0o644)
+        except OSError:
+            # read-only installation: the index is rebuilt by every run
+            pass
+
+
+if __name__ == '__main__':
+    CommandRegistry.load(os.path.join(CommandRegistry.cmd_dir(), CommandRegistry.INDEX_FILE))
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import socket
+
+from sdlib.shared.config import Config
+
+
+class DaemonClient(object):
+    """ Thin client of the sdutil daemon (sdutil serve), listening on a Unix socket.
+
+        The commands working on seismic store only (no local file argument)
+        are forwarded to the daemon when it is running, so they are served
+        by its loaded configuration, auth provider, HTTP connections and
+        caches. When no daemon listens the command is run locally.
+    """
+
+    SOCKET = 'sdutil.sock'
+
+    # the commands prompting for input (cp, mk, config) are run locally
+    FORWARDED_COMMANDS = ('stat', 'ls', 'rm', 'mv', 'unlock', 'user', 'app', 'op')
+
+    # options applying to the whole process: the command is run locally
+    LOCAL_OPTIONS = ('idtoken', 'data_partition_id', 'trace', 'profile', 'profile_top', 'no_cache')
+
+    # options making a command print its output as it goes, while a forwarded command
+    # returns it once completed: the command is run locally
+    STREAMING_OPTIONS = {'ls': ('r', 'recursive', 'lr', 'rl')}
+
+    CONNECT_TIMEOUT = 1.0
+
+    def __init__(self, socket_path=None):
+        self._socket_path = socket_path or self.default_socket_path()
+
+    @property
+    def socket_path(self):
+        return self._socket_path
+
+    @classmethod
+    def default_socket_path(cls):
+        return os.path.join(os.path.expanduser("~"), Config.HOME, cls.SOCKET)
+
+    @classmethod
+    def forwardable(cls, cmd_name, keyword_args):
+        if not hasattr(socket, 'AF_UNIX') or cmd_name not in cls.FORWARDED_COMMANDS:
+            return False
+        options = cls.LOCAL_OPTIONS + cls.STREAMING_OPTIONS.get(cmd_name, ())
+        # reading a keyword argument never given sets it to None: only the values given count
+        return not any(getattr(keyword_args, option, None) not in (None, False) for option in options)
+
+    def request(self, message):
+        """ Send a request to the daemon and return its response, None if no daemon is running """
+        if not os.path.exists(self._socket_path):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.CONNECT_TIMEOUT)
+            try:
+                sock.connect(self._socket_path)
+            except (ConnectionRefusedError, FileNotFoundError, socket.timeout):
+                # a stale socket file left by a daemon which did not stop cleanly
+                return None
+            # a command may take as long as it needs
+            sock.settimeout(None)
+            sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as fh:
+                line = fh.readline()
+            if not line:
+                raise Exception('The sdutil daemon closed the connection without responding')
+            return json.loads(line.decode('utf-8'))
+        finally:
+            sock.close()
+
+    def forward(self, args):
+        """ Run a command in the daemon and return its output and error message (None on success),
+            None if no daemon is running
+        """
+        response = self.request({'op': 'run', 'args': args})
+        if response is None:
+            return None
+        return response['output'], response['error']
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import print_function
+
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from sdlib.auth.auth_service import AuthFactory
+from sdlib.cmd.batch.cmd import Batch
+from sdlib.cmd.cmd import SDUtilCMD
+from sdlib.cmd.helper import CMDHelper
+from sdlib.cmd.serve.client import DaemonClient
+from sdlib.shared.config import Config
+from sdlib.shared.tracer import TracedCalls
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """ One JSON request line, one JSON response line """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line.decode('utf-8'))
+            response = self.server.daemon.handle(request)
+        except ValueError as ex:
+            response = {'output': '', 'error': 'Invalid request: ' + str(ex)}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, daemon):
+        self.daemon = daemon
+        socketserver.UnixStreamServer.__init__(self, socket_path, _RequestHandler)
+
+
+class Serve(SDUtilCMD):
+
+    # the credentials saved by "sdutil auth login" (all the auth providers)
+    CREDENTIALS_FILE = 'auth.token'
+
+    def __init__(self, auth):
+        self._auth = auth
+        self._batch = Batch(auth)
+        self._server = None
+        self._started = None
+        self._served = 0
+        self._lock = threading.Lock()
+        # the auth provider is rebuilt when the user logs in (or out) again, unless given a token
+        self._credentials = None
+        self._credentials_signature = None
+
+    @staticmethod
+    def help():
+        reg = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'reg.json')
+        CMDHelper.cmd_help(reg)
+
+    def handle(self, request):
+        """ Serve a daemon request: run a command, report the daemon status or stop it """
+        op = request.get('op') if isinstance(request, dict) else None
+        if op == 'run':
+            args = request.get('args')
+            if not isinstance(args, list) or not args or args[0] not in DaemonClient.FORWARDED_COMMANDS:
+                return {'output': '', 'error': 'The daemon only runs the ' +
+                        ', '.join(DaemonClient.FORWARDED_COMMANDS) + ' commands'}
+            self.check_credentials()
+            output, error = self._batch.run_args([str(arg) for arg in args])
+            with self._lock:
+                self._served += 1
+            return {'output': output, 'error': error}
+        if op == 'ping':
+            with self._lock:
+                served = self._served
+            return {'pid': os.getpid(), 'uptime': round(time.time() - self._started, 3), 'served': served}
+        if op == 'stop':
+            # shutdown waits for the serving loop, which runs in another thread
+            threading.Thread(target=self._server.shutdown).start()
+            return {'pid': os.getpid()}
+        return {'output': '', 'error': 'Unknown request ' + str(op)}
+
+    @classmethod
+    def credentials_file(cls):
+        return os.path.join(os.path.expanduser("~"), Config.HOME, cls.CREDENTIALS_FILE)
+
+    @staticmethod
+    def _file_signature(filename):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def watch_credentials(self, credentials_file):
+        """ Rebuild the auth provider of the commands when credentials_file changes """
+        self._credentials = credentials_file
+        self._credentials_signature = self._file_signature(credentials_file)
+
+    def check_credentials(self):
+        if self._credentials is None:
+            return
+        signature = self._file_signature(self._credentials)
+        with self._lock:
+            if signature == self._credentials_signature:
+                return
+            self._credentials_signature = signature
+            # the new credentials are loaded by the next command
+            self._auth = TracedCalls.wrap(AuthFactory.build(Config.get_auth_provider(), None), 'auth')
+            self._batch.set_auth(self._auth)
+
+    def start(self, socket_path):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise Exception('\nThe sdutil daemon requires Unix domain sockets, not available on this platform')
+        if DaemonClient(socket_path).request({'op': 'ping'}) is not None:
+            raise Exception('\nAn sdutil daemon is already listening on ' + socket_path)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        socket_dir = os.path.dirname(socket_path)
+        if socket_dir and not os.path.exists(socket_dir):
+            os.makedirs(socket_dir)
+
+        # the socket is only accessible to the user: the commands run with the user credentials
+        umask = os.umask(0o177)
+        try:
+            self._server = _UnixServer(socket_path, self)
+        finally:
+            os.umask(umask)
+        self._started = time.time()
+
+        print('')
+        print('> sdutil daemon (pid ' + str(os.getpid()) + ') listening on ' + socket_path)
+        print('  stop it with "python sdutil serve stop" or Ctrl+C')
+        sys.stdout.flush()
+
+        self._batch.capture_output()
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._batch.release_output()
+            self._server.server_close()
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+        print('> sdutil daemon stopped after serving ' + str(self._served) + ' commands')
+
+    def execute(self, args, keyword_args):
+
+        action = str(args[0]) if args else 'start'
+        if action not in ('start', 'stop', 'status'):
+            self.help()
+
+        socket_path = DaemonClient.default_socket_path()
+        if keyword_args.socket is not None and keyword_args.socket is not True:
+            socket_path = os.path.abspath(keyword_args.socket)
+
+        if action == 'start':
+            if keyword_args.idtoken is None:
+                self.watch_credentials(self.credentials_file())
+            self.start(socket_path)
+            return
+
+        response = DaemonClient(socket_path).request({'op': 'ping' if action == 'status' else 'stop'})
+        if response is None:
+            raise Exception('\nNo sdutil daemon is listening on ' + socket_path)
+        print('')
+        if action == 'status':
+            print('> sdutil daemon (pid ' + str(response['pid']) + ') listening on ' + socket_path)
+            print('  uptime ' + str(response['uptime']) + ' s, ' + str(response['served']) + ' commands served')
+        else:
+            print('> sdutil daemon (pid ' + str(response['pid']) + ') stopping')
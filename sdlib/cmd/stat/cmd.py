@@ -24,6 +24,7 @@ from sdlib.api.dataset import Dataset
 from sdlib.api.seismic_store_service import SeismicStoreService
 from sdlib.cmd.cmd import SDUtilCMD
 from sdlib.cmd.helper import CMDHelper
+from sdlib.shared.dataset_cache import DatasetCache
 from sdlib.shared.utils import Utils
 
 
@@ -112,8 +113,13 @@ class Stat(SDUtilCMD):
 
     def display_dataset(self, sdpath, detailed_flag):
         # Display dataset data
-        ds = Dataset.from_json(SeismicStoreService(
-            self._auth).dataset_get(sdpath, str(detailed_flag).lower()))
+        sd = SeismicStoreService(self._auth)
+        # the record is served from the dataset cache, without its lock state:
+        # the lock state displayed (-d) is read from the service
+        dataset = sd.dataset_get(sdpath, str(detailed_flag).lower(), lock_state=False)
+        if detailed_flag and not any(field in dataset for field in DatasetCache.VOLATILE_FIELDS):
+            dataset.update(sd.dataset_lock_state(sdpath))
+        ds = Dataset.from_json(dataset)
         print('')
         print(' - Name: ' + 'sd://' + ds.tenant +
               '/' + ds.subproject + ds.path + ds.name)
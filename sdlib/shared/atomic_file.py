@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+
+
+def atomic_write(filename, dump, binary=False, mode=0o600):
+    """ Write a file aside and swap it in place: the readers (other threads or invocations) never
+        see a partial file, an interruption never leaves one behind, and the concurrent writers
+        never share a temporary file. dump(fh) writes the content; the file is created readable
+        and writable by the owner only unless another mode is given.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    if not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=os.path.basename(filename) + '.', suffix='.tmp')
+    try:
+        if mode != 0o600:
+            os.chmod(tmp_file, mode)
+        with os.fdopen(fd, 'wb' if binary else 'w') as fh:
+            dump(fh)
+        os.replace(tmp_file, filename)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
@@ -18,20 +18,23 @@ import json
 import os
 import sys
 
-import yaml
+from sdlib.shared.atomic_file import atomic_write
 
 
 class Config(object):
 
     HOME = ".sdcfg"
     CONFIG_FILE = "sducfg.json"
+    SNAPSHOT_FILE = "config_snapshot.json"
+    SNAPSHOT_VERSION = 2
     SDPATH_PREFIX = 'sd://'
     USER_ROLES = ['ADMIN', 'VIEWER']
 
     __configuration = {}
     __user_configuration = {}
     __data_partition_id = None
-
+    # validated configuration saved for the next runs, keyed on the files it was compiled from
+    __snapshot = None
 
     @classmethod 
     def load(cls, forced_configuration=None):
@@ -46,11 +49,22 @@ class Config(object):
         '''
 
         cls.__configuration = forced_configuration
+        cls.__snapshot = None
         if not cls.__configuration:
-            configuration_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', "config.yaml")
+            configuration_file = cls._configuration_file()
             if os.path.exists(configuration_file):
+                signature = cls._file_signature(configuration_file)
+                snapshot = cls._load_snapshot()
+                if snapshot and snapshot['config_file'] == configuration_file and snapshot['config_signature'] == signature:
+                    # unchanged since validated: neither parsed nor yaml imported
+                    cls.__snapshot = snapshot
+                    cls.__configuration = snapshot['configuration']
+                    return
+                import yaml
                 with open(configuration_file, 'r') as fh:
                     cls.__configuration = yaml.safe_load(fh)
+                cls.__snapshot = {'version': cls.SNAPSHOT_VERSION, 'config_file': configuration_file,
+                                  'config_signature': signature}
             else:
                 raise Exception("\nThe \"sdlib/config.yaml\" utility configuration has not been found."); 
 
@@ -76,15 +90,26 @@ class Config(object):
         # load default readonly file formats 
         if  cls.__configuration.get('read_only_file_formats', False):
             cls.__configuration['read_only_file_formats'] = json.loads(cls.__configuration['read_only_file_formats'])
-        
+
+        if cls.__snapshot is not None:
+            cls.__snapshot['configuration'] = cls.__configuration
+            cls._save_snapshot(cls.__snapshot)
+
     @classmethod
     def load_user_config(cls,  forced_configuration=None):
         ''' Load configuration'''
 
         configuration = forced_configuration
+        snapshot = None
         if not configuration:
             configuration_file = os.path.join(os.path.expanduser("~"), cls.HOME, cls.CONFIG_FILE)
             if os.path.exists(configuration_file):
+                signature = cls._file_signature(configuration_file)
+                snapshot = cls.__snapshot
+                if snapshot is not None and snapshot.get('user_signature') == signature:
+                    cls.__user_configuration = dict(snapshot['user_configuration'])
+                    cls._apply_user_configuration()
+                    return
                 with open(configuration_file, "r") as fh:
                     configuration = json.load(fh)
             else:
@@ -123,16 +148,82 @@ class Config(object):
         else:
             cls.__user_configuration["verify_ssl"] = True
 
-        if cls.__user_configuration["verify_ssl"] == False:
-            import urllib3
-            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
         if "sdms_target_audience" in config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]:
             cls.__user_configuration["sdms_target_audience"] = config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]['sdms_target_audience']
         
         if "de_target_audience" in config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]:
             cls.__user_configuration["de_target_audience"] = config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]['de_target_audience']
 
+        if "storage_token_ttl" in config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]:
+            cls.__user_configuration["storage_token_ttl"] = int(config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]['storage_token_ttl'])
+
+        if "storage_token_cache" in config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]:
+            cls.__user_configuration["storage_token_cache"] = config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]['storage_token_cache'] == True
+
+        if "service_provider_ttl" in config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]:
+            cls.__user_configuration["service_provider_ttl"] = int(config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]['service_provider_ttl'])
+
+        if "dataset_cache_ttl" in config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]:
+            cls.__user_configuration["dataset_cache_ttl"] = int(config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]['dataset_cache_ttl'])
+
+        if "http_pool_size" in config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]:
+            cls.__user_configuration["http_pool_size"] = int(config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]['http_pool_size'])
+
+        if "http_timeout" in config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]:
+            cls.__user_configuration["http_timeout"] = float(config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]['http_timeout'])
+
+        if "upload_reader" in config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]:
+            cls.__user_configuration["upload_reader"] = config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]['upload_reader']
+
+        if "transfer_buffers" in config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]:
+            cls.__user_configuration["transfer_buffers"] = int(config_service[cls.__user_configuration["cloudprovider"]][cls.__user_configuration["env"]]['transfer_buffers'])
+
+        cls._apply_user_configuration()
+
+        if snapshot is not None:
+            snapshot['user_signature'] = signature
+            snapshot['user_configuration'] = dict(cls.__user_configuration)
+            cls._save_snapshot(snapshot)
+
+    @classmethod
+    def _apply_user_configuration(cls):
+        if cls.__user_configuration["verify_ssl"] == False:
+            import urllib3
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    @staticmethod
+    def _configuration_file():
+        return os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', "config.yaml"))
+
+    @staticmethod
+    def _file_signature(filename):
+        st = os.stat(filename)
+        return [st.st_size, st.st_mtime_ns]
+
+    @classmethod
+    def _snapshot_file(cls):
+        return os.path.join(os.path.expanduser("~"), cls.HOME, cls.SNAPSHOT_FILE)
+
+    @classmethod
+    def _load_snapshot(cls):
+        try:
+            with open(cls._snapshot_file(), "r") as fh:
+                snapshot = json.load(fh)
+        except (OSError, ValueError):
+            # missing or corrupted: compiled again
+            return None
+        if not isinstance(snapshot, dict) or snapshot.get('version') != cls.SNAPSHOT_VERSION:
+            return None
+        return snapshot
+
+    @classmethod
+    def _save_snapshot(cls, snapshot):
+        try:
+            atomic_write(cls._snapshot_file(), lambda fh: json.dump(snapshot, fh))
+        except (OSError, TypeError, ValueError):
+            # not writable or not serializable: the configuration is compiled by every run
+            pass
+
     @classmethod
     def get_auth_provider_configurations(cls):
         return cls.__configuration['auth_provider'][list(cls.__configuration['auth_provider'].keys())[0]]
@@ -171,6 +262,46 @@ class Config(object):
         # pylint: disable=no-member
         return cls.__user_configuration["verify_ssl"]
 
+    @classmethod
+    def get_storage_token_ttl(cls):
+        # pylint: disable=no-member
+        return cls.__user_configuration.get("storage_token_ttl", 3000)
+
+    @classmethod
+    def get_storage_token_cache(cls):
+        # pylint: disable=no-member
+        return cls.__user_configuration.get("storage_token_cache", False)
+
+    @classmethod
+    def get_service_provider_ttl(cls):
+        # pylint: disable=no-member
+        return cls.__user_configuration.get("service_provider_ttl", 86400)
+
+    @classmethod
+    def get_dataset_cache_ttl(cls):
+        # pylint: disable=no-member
+        return cls.__user_configuration.get("dataset_cache_ttl", 60)
+
+    @classmethod
+    def get_http_pool_size(cls):
+        # pylint: disable=no-member
+        return cls.__user_configuration.get("http_pool_size", 16)
+
+    @classmethod
+    def get_http_timeout(cls):
+        # pylint: disable=no-member
+        return cls.__user_configuration.get("http_timeout", 300)
+
+    @classmethod
+    def get_upload_reader(cls):
+        # pylint: disable=no-member
+        return cls.__user_configuration.get("upload_reader", "mmap")
+
+    @classmethod
+    def get_transfer_buffers(cls):
+        # pylint: disable=no-member
+        return cls.__user_configuration.get("transfer_buffers", 8)
+
     @classmethod
     def get_svc_target_audiences(cls):
         aud = ''
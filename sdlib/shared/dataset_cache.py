@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import os
+import threading
+import time
+
+from sdlib.shared.config import Config
+
+
+class DatasetCache(object):
+    """ Dataset records cache, keyed by the dataset path and the request variant
+        (the caller credential digest, with or without seismicmeta).
+
+        The records are kept for ttl seconds in a SQLite database of the user
+        configuration folder (readable by the owner only), shared across
+        invocations, and fronted by an in-memory LRU. The records of a dataset
+        are dropped when it is changed through the service (patch, delete, cp,
+        register, lock). The lock and copy transfer state is never cached. Any
+        database error falls back to the in-memory cache.
+    """
+
+    CACHE_FILE = "dataset_cache.db"
+    MEMORY_ENTRIES = 1024
+
+    # changed on the server side by the other clients (locks) and by the copies in progress
+    VOLATILE_FIELDS = ('sbit', 'sbit_count', 'transfer_status')
+
+    # --no-cache: every record is read from the service
+    bypass = False
+
+    def __init__(self, ttl=60, cache_file=None, memory_entries=None):
+        self._ttl = ttl
+        self._cache_file = cache_file or os.path.join(os.path.expanduser("~"), Config.HOME, self.CACHE_FILE)
+        self._memory = collections.OrderedDict()
+        self._memory_entries = memory_entries or self.MEMORY_ENTRIES
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._persist = True
+
+    @property
+    def enabled(self):
+        return not self.bypass and self._ttl > 0
+
+    @staticmethod
+    def scope(sdpath):
+        """ Return the dataset identity: service, data partition and normalized path """
+        return '|'.join([Config.get_svc_url(), str(Config.get_data_partition_id()),
+                         sdpath.tenant, sdpath.subproject or '', sdpath.path or '', sdpath.dataset or ''])
+
+    @staticmethod
+    def subproject_scope(tenant, subproject):
+        """ Return the prefix of the identities of the datasets of a subproject (of a tenant if None) """
+        scope = [Config.get_svc_url(), str(Config.get_data_partition_id()), tenant]
+        if subproject:
+            scope.append(subproject)
+        return '|'.join(scope) + '|'
+
+    @classmethod
+    def stable_record(cls, record):
+        """ Return the record without its volatile fields """
+        return {key: value for key, value in record.items() if key not in cls.VOLATILE_FIELDS}
+
+    def get(self, dataset, variant):
+        """ Return the cached record text, None if missing or expired """
+        if not self.enabled:
+            return None
+        key = dataset + '#' + str(variant)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[2] > now:
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+        row = self._query('SELECT value, expires FROM datasets WHERE key = ? AND expires > ?', (key, now))
+        if not row:
+            return None
+        value, expires = row[0]
+        self._remember(key, dataset, value, expires)
+        return value
+
+    def put(self, dataset, variant, value):
+        if not self.enabled:
+            return
+        key = dataset + '#' + str(variant)
+        expires = time.time() + self._ttl
+        self._remember(key, dataset, value, expires)
+        self._execute('INSERT OR REPLACE INTO datasets (key, dataset, value, expires) VALUES (?, ?, ?, ?)',
+                      (key, dataset, value, expires))
+
+    def invalidate(self, dataset):
+        """ Drop the records of a dataset, or of all the datasets under a scope prefix (subproject) """
+        prefix = dataset.endswith('|')
+        with self._lock:
+            for key in [key for key, entry in self._memory.items()
+                        if entry[0] == dataset or (prefix and entry[0].startswith(dataset))]:
+                del self._memory[key]
+        if not os.path.exists(self._cache_file):
+            return
+        if prefix:
+            # a range rather than LIKE, the names may contain wildcards
+            self._execute('DELETE FROM datasets WHERE dataset >= ? AND dataset < ?', (dataset, dataset + '\uffff'))
+        else:
+            self._execute('DELETE FROM datasets WHERE dataset = ?', (dataset,))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self._close()
+        try:
+            os.remove(self._cache_file)
+        except OSError:
+            pass
+
+    def _remember(self, key, dataset, value, expires):
+        with self._lock:
+            self._memory[key] = (dataset, value, expires)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._memory_entries:
+                self._memory.popitem(last=False)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            import sqlite3
+            cache_dir = os.path.dirname(self._cache_file)
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            if not os.path.exists(self._cache_file):
+                # created readable/writable by the owner only
+                os.close(os.open(self._cache_file, os.O_WRONLY | os.O_CREAT, 0o600))
+            connection = sqlite3.connect(self._cache_file, timeout=5, isolation_level=None)
+            connection.execute('CREATE TABLE IF NOT EXISTS datasets '
+                               '(key TEXT PRIMARY KEY, dataset TEXT, value TEXT, expires REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS datasets_dataset ON datasets (dataset)')
+            connection.execute('DELETE FROM datasets WHERE expires <= ?', (time.time(),))
+            self._local.connection = connection
+        return connection
+
+    def _close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _query(self, sql, args):
+        if not self._persist:
+            return None
+        try:
+            return self._connection().execute(sql, args).fetchall()
+        except Exception:  # pylint: disable=W0703
+            # unusable database (read-only folder, corrupted file): in-memory cache only
+            self._persist = False
+            return None
+
+    def _execute(self, sql, args):
+        if not self._persist:
+            return
+        try:
+            self._connection().execute(sql, args)
+        except Exception:  # pylint: disable=W0703
+            self._persist = False
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from sdlib.shared.config import Config
+from sdlib.shared.tracer import Tracer
+
+
+class HttpSession(object):
+    """ Process-wide pooled HTTP session.
+
+        All the seismic store REST calls and the HTTP based storage providers
+        go through a single requests.Session, so connections (and their TLS
+        handshake) are kept alive and reused across calls and worker threads.
+        The pool size and the timeout are taken from the utility configuration,
+        as is the ssl verification of the seismic store calls: the storage
+        endpoints are always verified.
+    """
+
+    _session = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def session(cls):
+        with cls._lock:
+            if cls._session is None:
+                session = requests.Session()
+                pool_size = Config.get_http_pool_size()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                cls._session = session
+            return cls._session
+
+    @classmethod
+    def close(cls):
+        with cls._lock:
+            if cls._session is not None:
+                cls._session.close()
+                cls._session = None
+
+    @staticmethod
+    def ssl_verify(url):
+        """ Return the ssl verification of a url: the configured one for the seismic store service only """
+        if str(url).startswith(Config.get_svc_url()):
+            return Config.get_ssl_verify()
+        return True
+
+    @classmethod
+    def request(cls, method, url, **kwargs):
+        kwargs.setdefault('verify', cls.ssl_verify(url))
+        kwargs.setdefault('timeout', Config.get_http_timeout())
+        if not Tracer.enabled():
+            return cls.session().request(method, url, **kwargs)
+        return cls._traced_request(method, url, **kwargs)
+
+    @classmethod
+    def _traced_request(cls, method, url, **kwargs):
+        """ Send a request recording its endpoint template, status, bytes, elapsed and time to first byte """
+        args = {'method': method, 'endpoint': Tracer.endpoint(url)}
+        start = time.perf_counter()
+        try:
+            resp = cls.session().request(method, url, **kwargs)
+        except Exception as ex:
+            args['error'] = type(ex).__name__
+            Tracer.add(method + ' ' + args['endpoint'], 'http', start, time.perf_counter(), **args)
+            raise
+        args['status'] = resp.status_code
+        args['bytes_sent'] = cls._body_size(resp.request.body)
+        if kwargs.get('stream'):
+            # the streamed content is not read yet
+            args['bytes_received'] = int(resp.headers.get('Content-Length', 0))
+        else:
+            args['bytes_received'] = len(resp.content)
+        # the response elapsed time stops when the headers are parsed
+        args['ttfb_ms'] = round(resp.elapsed.total_seconds() * 1000, 3)
+        Tracer.add(method + ' ' + args['endpoint'], 'http', start, time.perf_counter(), **args)
+        return resp
+
+    @staticmethod
+    def _body_size(body):
+        if body is None:
+            return 0
+        try:
+            return len(body)
+        except TypeError:
+            # a generator or a file object: not known before it is sent
+            return None
+
+    @classmethod
+    def get(cls, url, **kwargs):
+        return cls.request('GET', url, **kwargs)
+
+    @classmethod
+    def post(cls, url, **kwargs):
+        return cls.request('POST', url, **kwargs)
+
+    @classmethod
+    def put(cls, url, **kwargs):
+        return cls.request('PUT', url, **kwargs)
+
+    @classmethod
+    def patch(cls, url, **kwargs):
+        return cls.request('PATCH', url, **kwargs)
+
+    @classmethod
+    def delete(cls, url, **kwargs):
+        return cls.request('DELETE', url, **kwargs)
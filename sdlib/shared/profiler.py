@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cProfile
+import pstats
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+class Profiler(object):
+    """ CPU profile of a command invocation (--profile).
+
+        The calls of the command and of the threads it starts (the transfer
+        workers hashing and staging chunks) are profiled together. The stats
+        are saved in the pstats format, to be sorted and browsed with
+        "python -m pstats <file>" or snakeviz, and the top functions by own
+        time are printed with the wall time, the CPU time and the peak memory
+        of the invocation.
+    """
+
+    DEFAULT_FILE = 'sdutil.prof'
+    DEFAULT_TOP = 20
+
+    # since python 3.12 a profiler sees the events of every thread
+    _PER_THREAD = sys.version_info < (3, 12)
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._wall = 0.0
+        self._cpu = 0.0
+
+    def _start_thread(self, frame, event, arg):
+        # first profiling event of a thread started by the command: hand it over to a dedicated profiler
+        profile = cProfile.Profile()
+        with self._lock:
+            self._threads[threading.current_thread()] = profile
+        profile.enable()
+
+    def __enter__(self):
+        if self._PER_THREAD:
+            threading.setprofile(self._start_thread)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *args):
+        self._profile.disable()
+        self._wall = time.perf_counter() - self._wall
+        self._cpu = time.process_time() - self._cpu
+        if self._PER_THREAD:
+            threading.setprofile(None)
+        return False
+
+    def stats(self):
+        """ Return the stats of the command and of its threads, those still running excepted """
+        stats = pstats.Stats(self._profile)
+        with self._lock:
+            threads = dict(self._threads)
+        for thread, profile in threads.items():
+            if not thread.is_alive():
+                stats.add(profile)
+        return stats
+
+    @staticmethod
+    def peak_memory():
+        """ Return the peak resident set size of the process in bytes, None if unknown """
+        if resource is None:
+            return None
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KiB elsewhere
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+    def report(self, filename, top, stream=None):
+        """ Save the stats in filename and print the top functions and the resources used """
+        stream = stream or sys.stdout
+        stats = self.stats()
+        stats.dump_stats(filename)
+        stats.stream = stream
+        stats.sort_stats('tottime').print_stats(top)
+        peak = self.peak_memory()
+        stream.write('wall time   : %.3f s\n' % self._wall)
+        stream.write('cpu time    : %.3f s\n' % self._cpu)
+        stream.write('peak memory : %s\n' % ('n/a' if peak is None else '%.1f MiB' % (peak / 1048576.0)))
+        stream.write('profile saved to ' + filename + ' (python -m pstats ' + filename + ')\n')
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import calendar
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from urllib.parse import unquote
+
+from sdlib.shared.atomic_file import atomic_write
+from sdlib.shared.config import Config
+
+
+class StorageTokenCache(object):
+    """ Storage access tokens cache, keyed by the token scope and the caller identity.
+
+        The token expiry is taken from the token itself (SAS "se=" field)
+        or from the service response (expires_in), falling back to the
+        configured ttl. The cache can be persisted in the user configuration
+        folder (readable by the owner only) to be shared across invocations.
+    """
+
+    CACHE_FILE = "storage_tokens.json"
+
+    # tokens are discarded this many seconds before their real expiry
+    EXPIRY_MARGIN = 60
+
+    def __init__(self, ttl=3000, persist=False, cache_file=None):
+        self._ttl = ttl
+        self._persist = persist
+        self._cache_file = cache_file or os.path.join(os.path.expanduser("~"), Config.HOME, self.CACHE_FILE)
+        self._tokens = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(*scope):
+        return json.dumps(list(scope))
+
+    def get(self, key):
+        with self._lock:
+            self._load()
+            entry = self._tokens.get(key)
+            if entry is None:
+                return None
+            if entry['expires'] - self.EXPIRY_MARGIN < time.time():
+                del self._tokens[key]
+                return None
+            return entry['token']
+
+    def put(self, key, token, expires_in=None):
+        expires = self.token_expiry(token)
+        if expires is None:
+            expires = time.time() + (int(expires_in) if expires_in else self._ttl)
+        with self._lock:
+            self._load()
+            self._tokens[key] = {'token': token, 'expires': expires}
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._tokens = {}
+            self._loaded = True
+            try:
+                os.remove(self._cache_file)
+            except OSError:
+                pass
+
+    @staticmethod
+    def token_expiry(token):
+        """ Return the expiry time (epoch) embedded in a SAS token, None if not found """
+        match = re.search(r'(?:^|[?&])se=([^&]+)', str(token))
+        if match is None:
+            return None
+        value = unquote(match.group(1))
+        for fmt in ('%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%MZ', '%Y-%m-%d'):
+            try:
+                return calendar.timegm(datetime.strptime(value, fmt).timetuple())
+            except ValueError:
+                pass
+        return None
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self._persist or not os.path.exists(self._cache_file):
+            return
+        try:
+            with open(self._cache_file, 'r') as fh:
+                tokens = json.load(fh)
+            now = time.time()
+            self._tokens = {key: entry for key, entry in tokens.items()
+                            if isinstance(entry, dict) and 'token' in entry
+                            and isinstance(entry.get('expires'), (int, float)) and entry['expires'] > now}
+        except (OSError, ValueError, AttributeError):
+            # a corrupted cache is discarded
+            self._tokens = {}
+
+    def _save(self):
+        if not self._persist:
+            return
+        now = time.time()
+        tokens = {key: entry for key, entry in self._tokens.items() if entry['expires'] > now}
+        atomic_write(self._cache_file, lambda fh: json.dump(tokens, fh))
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class _Span(object):
+    """ A traced operation, recorded when its context exits """
+
+    def __init__(self, name, category, args):
+        self._name = name
+        self._category = category
+        self._args = args
+
+    def set(self, **args):
+        self._args.update(args)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._args.setdefault('error', exc_type.__name__)
+        Tracer.add(self._name, self._category, self._start, time.perf_counter(), **self._args)
+        return False
+
+
+class _NullSpan(object):
+    """ The span returned when the tracing is off: nothing is measured nor recorded """
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer(object):
+    """ Process-wide timeline of the outbound calls of a command (--trace).
+
+        The HTTP requests (seismic store and HTTP based providers), the chunks
+        and ranges transferred by the storage SDKs and the auth calls are
+        recorded as complete events with their arguments (method, endpoint
+        template, status, bytes, time to first byte), and saved in the Chrome
+        trace event format (chrome://tracing, https://ui.perfetto.dev).
+        When the tracing is off, every hook is a single attribute check.
+    """
+
+    DEFAULT_FILE = 'sdutil_trace.json'
+
+    _events = None
+    _threads = {}
+    _lock = threading.Lock()
+    _origin = 0.0
+
+    # path segments replaced by their role in the endpoint templates
+    _TEMPLATES = [
+        (re.compile(r'/tenant/[^/]+'), '/tenant/{tenant}'),
+        (re.compile(r'/subproject/[^/]+'), '/subproject/{subproject}'),
+        (re.compile(r'(/subproject/\{subproject\}/dataset/)[^/]+'), r'\1{dataset}'),
+        (re.compile(r'/b/[^/]+/o/.+$'), '/b/{bucket}/o/{object}'),
+        (re.compile(r'/b/[^/]+/o$'), '/b/{bucket}/o'),
+        (re.compile(r'/[0-9a-fA-F-]{16,}(?=/|$)'), '/{id}'),
+    ]
+
+    @classmethod
+    def start(cls):
+        with cls._lock:
+            cls._events = []
+            cls._threads = {}
+            cls._origin = time.perf_counter()
+
+    @classmethod
+    def stop(cls):
+        with cls._lock:
+            cls._events = None
+
+    @classmethod
+    def enabled(cls):
+        return cls._events is not None
+
+    @classmethod
+    def span(cls, name, category, **args):
+        """ Return the context manager tracing an operation, its arguments can be completed with set() """
+        if cls._events is None:
+            return _NULL_SPAN
+        return _Span(name, category, args)
+
+    @classmethod
+    def add(cls, name, category, start, end, **args):
+        """ Record an operation from its perf_counter start and end times """
+        thread = threading.current_thread()
+        event = {'name': name, 'cat': category, 'ph': 'X', 'pid': os.getpid(), 'tid': thread.ident,
+                 'ts': round((start - cls._origin) * 1e6, 1), 'dur': round((end - start) * 1e6, 1), 'args': args}
+        with cls._lock:
+            if cls._events is not None:
+                cls._events.append(event)
+                cls._threads[thread.ident] = thread.name
+
+    @classmethod
+    def events(cls):
+        with cls._lock:
+            return list(cls._events or [])
+
+    @classmethod
+    def save(cls, filename):
+        """ Write the timeline in the Chrome trace event format, the worker threads named """
+        with cls._lock:
+            events = list(cls._events or [])
+            threads = dict(cls._threads)
+        pid = os.getpid()
+        names = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                 for tid, name in threads.items()]
+        with open(filename, 'w') as fh:
+            json.dump({'traceEvents': names + events, 'displayTimeUnit': 'ms'}, fh)
+
+    @classmethod
+    def endpoint(cls, url):
+        """ Return the template of a request url: the query is dropped and the resource names replaced """
+        parts = urlsplit(url)
+        host = parts.netloc
+        if host.endswith('.storage.googleapis.com'):
+            return '{bucket}.storage.googleapis.com/{object}'
+        path = parts.path
+        for pattern, template in cls._TEMPLATES:
+            path = pattern.sub(template, path)
+        return host + path
+
+
+class TracedCalls(object):
+    """ Proxy tracing the method calls of the wrapped object (an auth provider
+        token refresh, a storage provider upload) as operations of a category
+    """
+
+    def __init__(self, target, category):
+        self._target = target
+        self._category = category
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+
+        def traced(*args, **kwargs):
+            with Tracer.span(type(self._target).__name__ + '.' + name, self._category):
+                return attribute(*args, **kwargs)
+        return traced
+
+    @staticmethod
+    def wrap(target, category):
+        """ Return the target itself when the tracing is off """
+        return TracedCalls(target, category) if Tracer.enabled() else target
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import threading
+
+from sdlib.shared.atomic_file import atomic_write
+from sdlib.shared.config import Config
+
+
+class TransferJournal(object):
+    """ On-disk journal of a resumable transfer, saved in the user configuration folder.
+
+        A journal is identified by the transfer direction, the seismic store path and
+        the local file. It records the dataset (and its sbit) and the provider
+        transfer state: the objects or parts already committed with their checksums,
+        or the resumable session and the offset reached. The journal is rewritten
+        after every committed object, so an interrupted transfer can continue from
+        the last one recorded.
+    """
+
+    JOURNAL_DIR = "transfers"
+
+    def __init__(self, kind, sdpath, local_file, journal_dir=None, local_stat=None):
+        self._local_file = os.path.abspath(local_file)
+        # the stat result of the local file, when the caller already has it
+        self._local_stat = local_stat
+        key = json.dumps([kind, sdpath, self._local_file])
+        self._journal_file = os.path.join(
+            journal_dir or os.path.join(os.path.expanduser("~"), Config.HOME, self.JOURNAL_DIR),
+            hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+        self._state = {}
+        self._lock = threading.RLock()
+
+    @property
+    def state(self):
+        return self._state
+
+    def fingerprint(self):
+        """ Identify the local file content: a journal is only valid for the file it was created for """
+        stat = self._local_stat or os.stat(self._local_file)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def load(self):
+        """ Load the journal, return its state or None if there is no (valid) journal """
+        if not os.path.exists(self._journal_file):
+            return None
+        try:
+            with open(self._journal_file, 'r') as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            # a corrupted journal cannot be trusted
+            return None
+        with self._lock:
+            self._state = state
+        return state
+
+    def start(self, **state):
+        """ Create a new journal for the transfer """
+        with self._lock:
+            self._state = dict(state, source=self.fingerprint())
+            self._save()
+
+    def update(self, **fields):
+        with self._lock:
+            self._state.update(fields)
+            self._save()
+
+    def record(self, section, key, value):
+        """ Record an entry (e.g. a committed object and its checksum) in a journal section """
+        with self._lock:
+            self._state.setdefault(section, {})[str(key)] = value
+            self._save()
+
+    def get(self, section, key):
+        with self._lock:
+            return self._state.get(section, {}).get(str(key))
+
+    def remove(self):
+        with self._lock:
+            self._state = {}
+            try:
+                os.remove(self._journal_file)
+            except OSError:
+                pass
+
+    def _save(self):
+        atomic_write(self._journal_file, lambda fh: json.dump(self._state, fh))
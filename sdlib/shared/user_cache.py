@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import threading
+import time
+
+from sdlib.shared.atomic_file import atomic_write
+from sdlib.shared.config import Config
+
+
+class UserCache(object):
+    """ Small key/value store with expiry, saved as a json file in the user configuration folder """
+
+    # the read-modify-write of the caches are serialized across the threads of the process
+    _lock = threading.Lock()
+
+    def __init__(self, name, cache_dir=None):
+        self._cache_file = os.path.join(
+            cache_dir or os.path.join(os.path.expanduser("~"), Config.HOME), name + '.json')
+
+    def get(self, key):
+        entry = self._load().get(key)
+        if entry is None or (entry['expires'] is not None and entry['expires'] < time.time()):
+            return None
+        return entry['value']
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            entries = self._load()
+            entries[key] = {'value': value, 'expires': time.time() + ttl if ttl is not None else None}
+            self._save(entries)
+
+    def remove(self, key):
+        with self._lock:
+            entries = self._load()
+            if entries.pop(key, None) is not None:
+                self._save(entries)
+
+    def _load(self):
+        if not os.path.exists(self._cache_file):
+            return {}
+        try:
+            with open(self._cache_file, 'r') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            # a corrupted cache is discarded
+            return {}
+
+    def _save(self, entries):
+        atomic_write(self._cache_file, lambda fh: json.dump(entries, fh))
@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Local stand-ins of the services driven by the transfer benchmark: a minimal
+# seismic store (datasets, storage access tokens, listing) and in-memory
+# Azure Blob, GCS (JSON and XML APIs) and S3 object stores. Each one is an
+# HTTP/1.1 server running on a background thread of the benchmark process and
+# implements only what sdutil cp sends, with the range semantics of the real
+# service. The time spent serving every data request (a chunk, part or range)
+# is recorded as its latency.
+
+import base64
+import hashlib
+import json
+import math
+import re
+import struct
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ElementTree
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import crc32c
+
+
+class Request(object):
+
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    stand_in = None
+
+    def _serve(self):
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        request = Request(self.command, unquote(url.path), dict(parse_qsl(url.query, keep_blank_values=True)),
+                          self.headers, self._read_body())
+        try:
+            status, headers, body = self.stand_in.handle(request)
+        except KeyError:
+            status, headers, body = 404, {}, b'not found'
+        body = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if 'Content-Length' not in headers:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        if self.stand_in.is_data(request):
+            self.stand_in.record(time.perf_counter() - started)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+                if size == 0:
+                    return b''.join(chunks)
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    do_GET = do_PUT = do_POST = do_PATCH = do_DELETE = do_HEAD = _serve
+
+    def log_message(self, *args):
+        pass
+
+
+class StandIn(object):
+    """ HTTP stand-in served from a background thread, to be used as a context manager """
+
+    def __init__(self):
+        self.latencies = []
+        self._lock = threading.Lock()
+        handler = type(type(self).__name__ + 'Handler', (_Handler,), {'stand_in': self})
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:' + str(self._server.server_address[1])
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+    def handle(self, request):
+        raise NotImplementedError()
+
+    def is_data(self, request):
+        """ Return whether the request transfers a chunk of a dataset (its latency is recorded) """
+        return False
+
+    def record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.latencies = []
+
+    def clear(self):
+        """ Drop the stored content """
+        pass
+
+
+def _http_date():
+    return formatdate(usegmt=True)
+
+
+def _byte_range(header, size):
+    """ Return the (start, end) of a "bytes=start-end" range header, clamped to the object size """
+    match = re.match(r'bytes=(\d+)-(\d*)', header or '')
+    if match is None:
+        return None
+    start = int(match.group(1))
+    return start, min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+
+
+class SeismicStoreStandIn(StandIn):
+    """ Seismic store service: /dataset, /utility/gcs-access-token, /utility/ls and /svcstatus.
+
+        The datasets of every provider are stored by an object store stand-in
+        whose access token (or SAS URL) is returned by gcs-access-token.
+    """
+
+    GCSURL_SEPARATOR = {'anthos': '$$', 'aws': '$$'}
+
+    def __init__(self, provider, storage):
+        super(SeismicStoreStandIn, self).__init__()
+        self._provider = provider
+        self._storage = storage
+        self.datasets = {}
+
+    def handle(self, request):
+        if request.path == '/svcstatus':
+            return 200, {'Service-Provider': self._provider}, b'running'
+        if request.path == '/utility/gcs-access-token':
+            return 200, {}, {'access_token': self._storage.access_token(request.query['sdpath']), 'expires_in': 3600}
+        if request.path == '/utility/ls':
+            return self._ls(request)
+        match = re.match(r'/dataset/tenant/([^/]+)/subproject/([^/]+)/dataset/([^/]+)(/lock|/unlock)?$', request.path)
+        key = (match.group(1), match.group(2), unquote(request.query.get('path', '/')), match.group(3))
+        if match.group(4) == '/lock':
+            self.datasets[key]['sbit'] = uuid.uuid4().hex
+            return 200, {}, self.datasets[key]
+        if match.group(4) == '/unlock':
+            self.datasets[key]['sbit'] = None
+            return 200, {}, b''
+        if request.method == 'POST':
+            self.datasets[key] = self._dataset(key, json.loads(request.body or b'null') or {})
+            return 200, {}, self.datasets[key]
+        if request.method == 'PATCH':
+            self.datasets[key].update(json.loads(request.body or b'null') or {})
+            if 'close' in request.query:
+                self.datasets[key]['sbit'] = None
+            return 200, {}, self.datasets[key]
+        if request.method == 'DELETE':
+            del self.datasets[key]
+            return 200, {}, b''
+        return 200, {}, self.datasets[key]
+
+    def _dataset(self, key, body):
+        tenant, subproject, path, name = key
+        container = tenant + '-' + subproject
+        return dict(body, tenant=tenant, subproject=subproject, path=path, name=name,
+                    created_date=_http_date(), last_modified_date=_http_date(), access_policy='uniform',
+                    gcsurl=container + self.GCSURL_SEPARATOR.get(self._provider, '/') + uuid.uuid4().hex,
+                    sbit=uuid.uuid4().hex, filemetadata=None, readonly=False)
+
+    def _ls(self, request):
+        sdpath = request.query['sdpath'].rstrip('/')
+        items = set()
+        for (tenant, subproject, path, name) in self.datasets:
+            full = ('sd://' + tenant + '/' + subproject + '/' + path.strip('/')).rstrip('/') + '/' + name
+            if full.startswith(sdpath + '/'):
+                rest = full[len(sdpath) + 1:].split('/')
+                items.add(rest[0] + '/' if len(rest) > 1 else rest[0])
+        if 'limit' in request.query:
+            return 200, {}, {'datasets': sorted(items), 'nextPageCursor': None}
+        return 200, {}, sorted(items)
+
+
+class AzureBlobStandIn(StandIn):
+    """ Azure Blob service: Put Block, Put Block List, Put Blob, Get Blob (ranges), Get Blob Properties """
+
+    def __init__(self):
+        super(AzureBlobStandIn, self).__init__()
+        self.blobs = {}
+        self._blocks = {}
+
+    def clear(self):
+        self.blobs = {}
+        self._blocks = {}
+
+    def access_token(self, sdpath):
+        # the SAS url of the subproject container
+        tenant, subproject = sdpath[5:].split('/')[:2]
+        return self.url + '/' + tenant + '-' + subproject + '?sv=2020-02-10&sig=bench'
+
+    def is_data(self, request):
+        return request.query.get('comp') == 'block' or (request.method == 'GET' and not request.query.get('comp'))
+
+    def handle(self, request):
+        headers = {'ETag': '"0x8D' + uuid.uuid4().hex[:13].upper() + '"', 'Last-Modified': _http_date(),
+                   'x-ms-version': '2020-02-10', 'x-ms-request-id': str(uuid.uuid4())}
+        comp = request.query.get('comp')
+        if request.method == 'PUT' and comp == 'block':
+            self._blocks[(request.path, request.query['blockid'])] = request.body
+            headers['Content-MD5'] = base64.b64encode(hashlib.md5(request.body).digest()).decode()
+            headers['x-ms-request-server-encrypted'] = 'true'
+            return 201, headers, b''
+        if request.method == 'PUT' and comp == 'blocklist':
+            ids = [element.text for element in ElementTree.fromstring(request.body)]
+            self.blobs[request.path] = {'data': b''.join(self._blocks.pop((request.path, block_id)) for block_id in ids),
+                                        'md5': request.headers.get('x-ms-blob-content-md5')}
+            return 201, headers, b''
+        if request.method == 'PUT':
+            self.blobs[request.path] = {'data': request.body, 'md5': request.headers.get('x-ms-blob-content-md5')}
+            headers['Content-MD5'] = base64.b64encode(hashlib.md5(request.body).digest()).decode()
+            return 201, headers, b''
+        if request.method == 'DELETE':
+            self.blobs.pop(request.path, None)
+            return 202, headers, b''
+        if request.path not in self.blobs:
+            return 404, dict(headers, **{'x-ms-error-code': 'BlobNotFound'}), b''
+        blob = self.blobs[request.path]
+        data = blob['data']
+        headers.update({'x-ms-blob-type': 'BlockBlob', 'Content-Type': 'application/octet-stream',
+                        'x-ms-creation-time': _http_date(), 'Accept-Ranges': 'bytes'})
+        if blob['md5']:
+            headers['Content-MD5' if request.method == 'HEAD' else 'x-ms-blob-content-md5'] = blob['md5']
+        if request.method == 'HEAD':
+            headers['Content-Length'] = str(len(data))
+            return 200, headers, b''
+        byte_range = _byte_range(request.headers.get('x-ms-range') or request.headers.get('Range'), len(data))
+        if byte_range is None:
+            return 200, headers, data
+        start, end = byte_range
+        body = data[start:end + 1]
+        headers['Content-Range'] = 'bytes ' + str(start) + '-' + str(end) + '/' + str(len(data))
+        if request.headers.get('x-ms-range-get-content-md5') == 'true':
+            headers['Content-MD5'] = base64.b64encode(hashlib.md5(body).digest()).decode()
+        return 206, headers, body
+
+
+class GcsStandIn(StandIn):
+    """ Google Cloud Storage: JSON API (resumable and media uploads, object metadata) and XML API (ranged reads).
+
+        The sdutil google provider targets the public endpoints: the benchmark
+        redirects them with rewrite().
+    """
+
+    def __init__(self):
+        super(GcsStandIn, self).__init__()
+        self.objects = {}
+        self._sessions = {}
+
+    def clear(self):
+        self.objects = {}
+        self._sessions = {}
+
+    def access_token(self, sdpath):
+        return 'bench-token'
+
+    def rewrite(self, url):
+        """ Return the stand-in url of a googleapis.com url """
+        match = re.match(r'https://([^/]+)\.storage\.googleapis\.com/(.*)', url)
+        if match is not None:
+            return self.url + '/xml/' + match.group(1) + '/' + match.group(2)
+        return url.replace('https://www.googleapis.com', self.url)
+
+    def is_data(self, request):
+        return request.path.startswith('/upload/session/') or request.path.startswith('/xml/')
+
+    def handle(self, request):
+        if request.path.startswith('/upload/session/'):
+            return self._resumable(request)
+        if request.path.startswith('/xml/'):
+            bucket, name = request.path[5:].split('/', 1)
+            data = self.objects[(bucket, name)]
+            byte_range = _byte_range(request.headers.get('Range'), len(data))
+            if byte_range is None:
+                return 200, {}, data
+            start, end = byte_range
+            return 206, {'Content-Range': 'bytes ' + str(start) + '-' + str(end) + '/' + str(len(data))}, \
+                data[start:end + 1]
+        match = re.match(r'/upload/storage/v1/b/([^/]+)/o$', request.path)
+        if match is not None:
+            key = (match.group(1), request.query['name'])
+            if request.query.get('uploadType') == 'resumable':
+                session = uuid.uuid4().hex
+                self._sessions[session] = {'key': key, 'data': bytearray()}
+                return 200, {'Location': self.url + '/upload/session/' + session}, b''
+            self.objects[key] = request.body
+            return 200, {}, self._metadata(key)
+        match = re.match(r'/storage/v1/b/([^/]+)/o/(.+)$', request.path)
+        key = (match.group(1), match.group(2))
+        if request.method == 'DELETE':
+            del self.objects[key]
+            return 204, {}, b''
+        metadata = self._metadata(key)
+        fields = request.query.get('fields')
+        return 200, {}, {fields: metadata[fields]} if fields else metadata
+
+    def _metadata(self, key):
+        data = self.objects[key]
+        return {'bucket': key[0], 'name': key[1], 'size': str(len(data)),
+                'crc32c': base64.b64encode(struct.pack('>I', crc32c.crc32c(data))).decode()}
+
+    def _resumable(self, request):
+        session = self._sessions.get(request.path.split('/')[-1])
+        if session is None:
+            return 404, {}, b''
+        match = re.match(r'bytes (\*|(\d+)-(\d+))/(\d+)', request.headers.get('Content-Range', ''))
+        total = int(match.group(4))
+        if match.group(2) is not None and int(match.group(2)) == len(session['data']):
+            session['data'] += request.body
+        if len(session['data']) == total:
+            self.objects[session['key']] = bytes(session['data'])
+            return 200, {}, self._metadata(session['key'])
+        headers = {'Range': 'bytes=0-' + str(len(session['data']) - 1)} if session['data'] else {}
+        return 308, headers, b''
+
+
+class S3StandIn(StandIn):
+    """ S3 (path-style addressing): multipart uploads, Put Object, Get Object (ranges), Head Object """
+
+    XMLNS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+    def __init__(self):
+        super(S3StandIn, self).__init__()
+        self.objects = {}
+        self._uploads = {}
+
+    def clear(self):
+        self.objects = {}
+        self._uploads = {}
+
+    def access_token(self, sdpath):
+        # access key id, secret key and session token
+        return 'bench:bench-secret:bench-session'
+
+    def is_data(self, request):
+        return request.method == 'PUT' or (request.method == 'GET' and 'uploadId' not in request.query)
+
+    def handle(self, request):
+        if request.method == 'POST' and 'uploads' in request.query:
+            upload_id = uuid.uuid4().hex
+            self._uploads[upload_id] = {}
+            return 200, {}, self._xml('InitiateMultipartUploadResult', UploadId=upload_id)
+        if request.method == 'PUT':
+            if 'partNumber' in request.query:
+                self._uploads[request.query['uploadId']][int(request.query['partNumber'])] = request.body
+            else:
+                self.objects[request.path] = request.body
+            return 200, {'ETag': '"' + hashlib.md5(request.body).hexdigest() + '"'}, b''
+        if request.method == 'POST':
+            parts = self._uploads.pop(request.query['uploadId'])
+            numbers = [int(element.text) for element in ElementTree.fromstring(request.body).iter()
+                       if element.tag.endswith('PartNumber')]
+            self.objects[request.path] = b''.join(parts[number] for number in numbers)
+            return 200, {}, self._xml('CompleteMultipartUploadResult', Key=request.path, ETag='"bench"')
+        if request.method == 'DELETE':
+            self._uploads.pop(request.query.get('uploadId'), None)
+            return 204, {}, b''
+        if 'uploadId' in request.query:
+            parts = self._uploads[request.query['uploadId']]
+            entries = ''.join('<Part><PartNumber>%d</PartNumber><Size>%d</Size></Part>' % (number, len(parts[number]))
+                              for number in sorted(parts))
+            return 200, {}, ('<ListPartsResult xmlns="%s">%s<IsTruncated>false</IsTruncated></ListPartsResult>'
+                             % (self.XMLNS, entries)).encode()
+        if request.path not in self.objects:
+            return 404, {}, self._xml('Error', Code='NoSuchKey')
+        data = self.objects[request.path]
+        headers = {'ETag': '"' + hashlib.md5(data).hexdigest() + '"', 'Last-Modified': _http_date(),
+                   'Content-Type': 'binary/octet-stream', 'Accept-Ranges': 'bytes'}
+        if request.method == 'HEAD':
+            headers['Content-Length'] = str(len(data))
+            return 200, headers, b''
+        byte_range = _byte_range(request.headers.get('Range'), len(data))
+        if byte_range is None:
+            return 200, headers, data
+        start, end = byte_range
+        headers['Content-Range'] = 'bytes ' + str(start) + '-' + str(end) + '/' + str(len(data))
+        return 206, headers, data[start:end + 1]
+
+    def _xml(self, root, **fields):
+        return ('<?xml version="1.0" encoding="UTF-8"?><%s xmlns="%s">%s</%s>' % (
+            root, self.XMLNS, ''.join('<%s>%s</%s>' % (name, value, name) for name, value in fields.items()),
+            root)).encode()
+
+
+STORAGE_STAND_INS = {'azure': AzureBlobStandIn, 'google': GcsStandIn, 'anthos': S3StandIn}
+
+
+def percentile(values, fraction):
+    """ Return the nearest-rank percentile of a list of values (None if empty) """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, int(math.ceil(fraction * len(ordered))) - 1)]
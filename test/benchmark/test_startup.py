@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Cold start benchmark: every command module is imported (together with the
+# sdutil entry point) in a fresh interpreter, as it happens on each invocation.
+#
+#   pytest test/benchmark --benchmark-autosave
+#   pytest test/benchmark --benchmark-compare --benchmark-compare-fail=mean:20%
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_COMMANDS = sorted(
+    f for f in os.listdir(os.path.join(_ROOT, 'sdlib', 'cmd'))
+    if os.path.isdir(os.path.join(_ROOT, 'sdlib', 'cmd', f)) and not f.startswith('__'))
+
+# cloud SDKs and UI libraries loaded only by the provider actually used
+_HEAVY_MODULES = ['boto3', 'botocore', 'azure.storage.blob', 'crc32c', 'tqdm',
+                  'alive_progress', 'flask', 'authlib', 'google.auth']
+
+_SCRIPT = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+import sdlib.__main__
+importlib.import_module('sdlib.cmd.%s.cmd')
+elapsed = time.perf_counter() - start
+print(json.dumps({'import_ms': elapsed * 1000, 'modules': [m for m in %r if m in sys.modules]}))
+'''
+
+
+def _cold_import(command):
+    out = subprocess.check_output([sys.executable, '-c', _SCRIPT % (command, _HEAVY_MODULES)], cwd=_ROOT)
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize('command', _COMMANDS)
+def test_command_startup(benchmark, command):
+    result = benchmark.pedantic(_cold_import, args=(command,), rounds=5, iterations=1)
+    benchmark.extra_info['import_ms'] = result['import_ms']
+    benchmark.extra_info['heavy_modules'] = result['modules']
+    assert result['modules'] == []
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Offline transfer benchmark: sdutil cp uploads and downloads datasets through
+# the local seismic store and object store stand-ins (stand_ins.py), for every
+# provider, file size, chunk size and number of workers. Every transfer runs in
+# a fresh interpreter (the peak resident memory is a process-wide figure); the
+# chunk latency percentiles are measured by the object store stand-in.
+#
+#   pytest test/benchmark/test_transfer.py --benchmark-json=transfer.json
+#   SDUTIL_BENCHMARK_PROVIDERS=azure SDUTIL_BENCHMARK_SIZES_MB=256,1024 pytest test/benchmark/test_transfer.py
+#
+# The MB/s, p50/p99 chunk latency (ms) and peak RSS (MB) of every case are
+# reported in the "extra_info" of the benchmark JSON.
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from test.benchmark.stand_ins import STORAGE_STAND_INS, SeismicStoreStandIn, percentile
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _setting(name, default):
+    return os.environ.get('SDUTIL_BENCHMARK_' + name, default).split(',')
+
+
+_PROVIDERS = _setting('PROVIDERS', 'azure,google,anthos')
+_SIZES_MB = [int(size) for size in _setting('SIZES_MB', '16,64')]
+_CHUNKS_MB = [int(chunk) for chunk in _setting('CHUNKS_MB', '4,16')]
+_WORKERS = [int(workers) for workers in _setting('WORKERS', '1,4')]
+
+_SDPATH = 'sd://bench/data/run/dataset.bin'
+
+# the provider attributes holding the size of the chunks (parts, ranges) transferred
+_CHUNK_ATTRIBUTES = {'azure': ['_max_single_get_size'], 'google': ['_chunkSize'], 'anthos': ['_chunkSize']}
+
+_SCRIPT = '''
+import json, os, resource, sys, time
+from requests.adapters import HTTPAdapter
+
+params = json.loads(sys.argv[1])
+from sdlib.shared.config import Config
+from sdlib.shared.http_session import HttpSession
+Config.load(params['config'])
+Config.load_user_config(params['user_config'])
+
+
+class Redirect(HTTPAdapter):
+    # the google provider targets the public endpoints
+    def send(self, request, **kwargs):
+        url = request.url
+        if 'storage.googleapis.com' in url:
+            bucket, rest = url[len('https://'):].split('.storage.googleapis.com', 1)
+            url = params['storage_url'] + '/xml/' + bucket + rest
+        request.url = url.replace('https://www.googleapis.com', params['storage_url'])
+        return super(Redirect, self).send(request, **kwargs)
+
+
+HttpSession.session().mount('https://', Redirect())
+
+from sdlib.api.storage_service import StorageFactory
+build = StorageFactory.build
+
+
+def build_service(cls, provider, *args, **kwargs):
+    service = build(provider, *args, **kwargs)
+    for attribute in params['chunk_attributes']:
+        setattr(service, attribute, params['chunk_size'])
+    return service
+
+
+StorageFactory.build = classmethod(build_service)
+
+from sdlib.cmd.cp.cmd import Cp
+from sdlib.cmd.helper import CMDHelper
+
+
+class Auth(object):
+    def get_id_token(self):
+        return 'bench-token'
+
+    def refresh(self):
+        pass
+
+
+args, keyword_args = CMDHelper.getPosAndKeyWordArguments(['cp'] + params['argv'])
+start = time.perf_counter()
+Cp(Auth()).execute(args, keyword_args)
+elapsed = time.perf_counter() - start
+# the high-water mark of the process memory: ru_maxrss also accounts the forked benchmark process on linux
+peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if os.path.exists('/proc/self/status'):
+    with open('/proc/self/status') as fh:
+        peak_rss_kb = int([line for line in fh if line.startswith('VmHWM:')][0].split()[1])
+print(json.dumps({'seconds': elapsed, 'peak_rss_mb': peak_rss_kb / 1024.0}))
+'''
+
+
+class _Services(object):
+    """ The seismic store and object store stand-ins of a provider """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.storage = STORAGE_STAND_INS[provider]()
+        self.seistore = SeismicStoreStandIn(provider, self.storage)
+
+    def __enter__(self):
+        self.storage.__enter__()
+        self.seistore.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self.seistore.__exit__(*args)
+        self.storage.__exit__(*args)
+        return False
+
+
+@pytest.fixture(scope='module')
+def workdir():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield tmpdir
+
+
+@pytest.fixture(scope='module', params=_PROVIDERS)
+def services(request):
+    with _Services(request.param) as services:
+        yield services
+
+
+def _source_file(workdir, size_mb):
+    filename = os.path.join(workdir, 'source-' + str(size_mb))
+    if not os.path.exists(filename):
+        with open(filename, 'wb') as fh:
+            for _ in range(size_mb):
+                fh.write(os.urandom(1048576))
+    return filename
+
+
+def _cp(services, workdir, argv, chunk_mb, clear=False):
+    params = {
+        'config': {'seistore': {'service': json.dumps({services.provider: {'bench': {'url': services.seistore.url}}})},
+                   'auth_provider': {'default': ''}},
+        'user_config': {'cloudprovider': services.provider, 'env': 'bench'},
+        'storage_url': services.storage.url,
+        'chunk_attributes': _CHUNK_ATTRIBUTES[services.provider],
+        'chunk_size': chunk_mb * 1048576,
+        'argv': argv,
+    }
+    # the user configuration folder (caches, journals) is kept away from the user one
+    env = dict(os.environ, HOME=workdir, MINIO_ENDPOINT=services.storage.url, NO_PROXY='127.0.0.1', no_proxy='127.0.0.1')
+    if clear:
+        # the datasets uploaded before are not kept in memory
+        services.storage.clear()
+    services.storage.reset()
+    out = subprocess.check_output([sys.executable, '-c', _SCRIPT, json.dumps(params)], cwd=_ROOT, env=env,
+                                  stdin=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    result = json.loads(out.decode().strip().splitlines()[-1])
+    result['latencies'] = list(services.storage.latencies)
+    return result
+
+
+def _report(benchmark, result, size_mb):
+    benchmark.extra_info['mb_per_s'] = size_mb / result['seconds']
+    benchmark.extra_info['p50_chunk_latency_ms'] = percentile(result['latencies'], 0.5) * 1000
+    benchmark.extra_info['p99_chunk_latency_ms'] = percentile(result['latencies'], 0.99) * 1000
+    benchmark.extra_info['chunks'] = len(result['latencies'])
+    benchmark.extra_info['peak_rss_mb'] = result['peak_rss_mb']
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='the peak resident memory is measured with resource')
+@pytest.mark.parametrize('workers', _WORKERS)
+@pytest.mark.parametrize('chunk_mb', _CHUNKS_MB)
+@pytest.mark.parametrize('size_mb', _SIZES_MB)
+def test_upload(benchmark, services, workdir, size_mb, chunk_mb, workers):
+    argv = [_source_file(workdir, size_mb), _SDPATH, '--chunk-size=' + str(chunk_mb), '--workers=' + str(workers)]
+    result = benchmark.pedantic(_cp, args=(services, workdir, argv, chunk_mb, True), rounds=3, iterations=1)
+    _report(benchmark, result, size_mb)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='the peak resident memory is measured with resource')
+@pytest.mark.parametrize('workers', _WORKERS)
+@pytest.mark.parametrize('chunk_mb', _CHUNKS_MB)
+@pytest.mark.parametrize('size_mb', _SIZES_MB)
+def test_download(benchmark, services, workdir, size_mb, chunk_mb, workers):
+    source = _source_file(workdir, size_mb)
+    _cp(services, workdir, [source, _SDPATH, '--chunk-size=' + str(chunk_mb)], chunk_mb, True)
+    local_file = os.path.join(workdir, 'downloaded')
+    argv = [_SDPATH, local_file, '--force', '--workers=' + str(workers)]
+    result = benchmark.pedantic(_cp, args=(services, workdir, argv, chunk_mb), rounds=3, iterations=1)
+    with open(source, 'rb') as expected, open(local_file, 'rb') as downloaded:
+        assert expected.read() == downloaded.read()
+    _report(benchmark, result, size_mb)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Upload reader benchmark: a local file is read and staged through the chunk
+# upload engine with both readers, in a fresh interpreter each (the peak
+# resident memory is a process-wide figure). Every chunk is hashed and written
+# to the null device in socket-sized blocks, as the provider uploads do.
+#
+#   SDUTIL_BENCHMARK_SIZE_MB=1024 pytest test/benchmark/test_upload_reader.py --benchmark-autosave
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_SIZE_MB = int(os.environ.get('SDUTIL_BENCHMARK_SIZE_MB', '256'))
+_CHUNK_MB = 32
+_WORKERS = 4
+
+_SCRIPT = '''
+import hashlib, json, os, resource, time
+from sdlib.api.transfer import ParallelChunkUploader, open_upload_reader
+sink = os.open(os.devnull, os.O_WRONLY)
+
+def stage(index, chunk):
+    hashlib.md5(chunk)
+    view = memoryview(chunk)
+    for pos in range(0, len(view), 65536):
+        os.write(sink, view[pos:pos + 65536])
+
+start = time.perf_counter()
+with open_upload_reader(%r, %r) as reader:
+    ParallelChunkUploader(%d, %d).run(reader, stage)
+elapsed = time.perf_counter() - start
+print(json.dumps({'mb_per_s': %d / elapsed, 'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}))
+'''
+
+
+@pytest.fixture(scope='module')
+def source_file():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'dataset')
+        with open(filename, 'wb') as fh:
+            for _ in range(_SIZE_MB):
+                fh.write(os.urandom(1048576))
+        yield filename
+
+
+def _upload(filename, reader):
+    script = _SCRIPT % (filename, reader, _WORKERS, _CHUNK_MB * 1048576, _SIZE_MB)
+    out = subprocess.check_output([sys.executable, '-c', script], cwd=_ROOT)
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='the peak resident memory is measured with resource')
+@pytest.mark.parametrize('reader', ['read', 'mmap'])
+def test_upload_reader(benchmark, source_file, reader):
+    result = benchmark.pedantic(_upload, args=(source_file, reader), rounds=3, iterations=1)
+    benchmark.extra_info['mb_per_s'] = result['mb_per_s']
+    benchmark.extra_info['peak_rss_mb'] = result['peak_rss_mb']
@@ -14,6 +14,7 @@
 
 from sdlib.api.dataset import Dataset
 from sdlib.api.providers.aws.storage_service import AwsStorageService
+import io
 import os
 import sys
 from mock import patch, Mock
@@ -39,9 +40,7 @@ class TestApiAws(SdUtilTestCase):
         self.ds.subproject = 'subproject'
         self.object_name = 'test_object'
         self.file_name = 'test_file.txt'
-        self.cursize = 0
         self.bucket = 'bucket_name'
-        self.obj = 2
 
         with open(self.file_name, 'w') as f:
             f.write("Test content")
@@ -62,37 +61,26 @@ class TestApiAws(SdUtilTestCase):
 
         self.assertEqual(result, {"num_of_objects": 1})
 
+        # a size already known is not read from the file again
+        with patch('os.path.getsize', side_effect=AssertionError('the file is stat\'ed again')):
+            result = self.aws.upload(self.file_name, self.ds, self.object_name, size=12)
+        self.assertEqual(result, {"num_of_objects": 1})
+
     @patch('sdlib.api.providers.aws.storage_service.boto3.client')
     def test_download(self, mock_boto3_client):
         mock_s3_client = Mock()
         mock_boto3_client.return_value = mock_s3_client
 
-        self.aws.downloadObject = Mock(return_value=524288)  
+        self.aws._s3_client.head_object.return_value = {'ContentLength': 1}
+        self.aws._s3_client.get_object.return_value = {'Body': io.BytesIO(b'x')}
 
         result = self.aws.download(self.file_name, self.ds)
 
         self.assertTrue(result)
-
-    @patch('sdlib.api.providers.aws.storage_service.boto3.resource')
-    @patch('sdlib.api.providers.aws.storage_service.boto3.client')
-    def test_download_object(self, mock_boto3_client, mock_boto3_resource):
-        # Mock S3 client and resource
-        mock_s3_client = Mock()
-        mock_boto3_client.return_value = mock_s3_client
-
-        self.aws._s3_resource.Object.return_value.content_length = 12345
-        # Mock get_object response
-        mock_response = {
-    'Body': [b'chunk1', b'chunk2', b'chunk3']  # Simulating the response body as chunks of bytes
-        }   
-        self.aws._s3_client.get_object.return_value = mock_response
-        # Use a real file for local_file
-        with open(self.file_name, 'wb') as local_file:
-            objsize = self.aws.downloadObject(local_file, self.bucket, self.obj, self.ds, self.cursize)
-
-        # Assertions
-        self.assertEqual(objsize, 12345)
-
+        with open(self.file_name, 'rb') as local_file:
+            self.assertEqual(local_file.read(), b'x')
+        self.aws._s3_client.get_object.assert_called_with(
+            Bucket='bucket_name', Key='subproject_folder/dataset_folder/0', Range='bytes=0-0')
 
     @patch('boto3.resource')
     @patch('sdlib.api.providers.aws.storage_service.SeismicStoreService.get_storage_access_token')
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import threading
+from mock import patch, MagicMock
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.api.dataset import Dataset
+from sdlib.api.providers.azure import AzureStorageService
+from sdlib.api.transfer import QuietProgress
+from sdlib.shared.transfer_journal import TransferJournal
+
+from test.utest import SdUtilTestCase
+
+
+class FakeContainer(object):
+    """ In memory stand-in for the azure ContainerClient (single block blobs) """
+
+    def __init__(self):
+        self.staged = {}
+        self.blobs = {}
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def get_blob_client(self, name):
+        container = self
+        blob = MagicMock()
+        blob.__enter__.return_value = blob
+
+        def stage_block(block_id, data, length, **kwargs):
+            data = data.read()
+            with container.lock:
+                container.staged[(name, block_id)] = data
+            return {'content_md5': bytearray(hashlib.md5(data).digest())}
+
+        def commit_block_list(block_list, content_settings=None, **kwargs):
+            with container.lock:
+                container.blobs[name] = (b''.join(container.staged[(name, bid)] for bid in block_list),
+                                         content_settings.content_md5)
+
+        def upload_blob(data, content_settings=None, **kwargs):
+            with container.lock:
+                container.blobs[name] = (data.read(), content_settings.content_md5)
+
+        def get_blob_properties():
+            props = MagicMock()
+            props.blob_tier = 'Hot'
+            props.size = len(container.blobs[name][0])
+            props.content_settings = {'content_md5': container.blobs[name][1]}
+            return props
+
+        blob.stage_block.side_effect = stage_block
+        blob.commit_block_list.side_effect = commit_block_list
+        blob.upload_blob.side_effect = upload_blob
+        blob.download_blob.side_effect = lambda offset, length, **kwargs: MagicMock(
+            readinto=lambda stream: stream.write(container.blobs[name][0][offset:offset + length]))
+        blob.get_blob_properties.side_effect = get_blob_properties
+        return blob
+
+
+class TestApiAzure(SdUtilTestCase):
+
+    def setUp(self):
+        self.azure = AzureStorageService(auth=MagicMock())
+        self.ds = Dataset()
+        self.ds.access_policy = 'uniform'
+        self.ds.gcsurl = 'container/dataset'
+        self.ds.tenant = 'tnx01'
+        self.ds.subproject = 'spx01'
+        self.data = os.urandom(5 * 1048576 + 17)
+        with tempfile.NamedTemporaryFile(delete=False) as fx:
+            fx.write(self.data)
+            self.file_name = fx.name
+
+    def tearDown(self):
+        os.remove(self.file_name)
+
+    @patch('sdlib.api.providers.azure.storage_service.ContainerClient')
+    @patch('sdlib.api.providers.azure.storage_service.AzureStorageService._get_sas_url')
+    def test_upload_multi_object(self, mock_sas_url, mock_container_client):
+        container = FakeContainer()
+        mock_container_client.from_container_url.return_value = container
+
+        res = self.azure.upload(self.file_name, self.ds, chunk_size=1, workers=3)
+
+        self.assertEqual(res['num_of_objects'], 6)
+        self.assertEqual(res['md5_checksum'], hashlib.md5(self.data).hexdigest())
+        self.assertEqual(b''.join(container.blobs[str(ii)][0] for ii in range(6)), self.data)
+        # every object carries the md5 of the file up to its end, as with the serial upload
+        for ii in range(6):
+            self.assertEqual(bytes(container.blobs[str(ii)][1]),
+                             hashlib.md5(self.data[:(ii + 1) * 1048576]).digest())
+
+    @patch('sdlib.api.providers.azure.storage_service.ContainerClient')
+    @patch('sdlib.api.providers.azure.storage_service.AzureStorageService._get_sas_url')
+    def test_upload_single_object(self, mock_sas_url, mock_container_client):
+        real_open = open
+        for single_put_size in [64 * 1048576, 1048576]:
+            container = FakeContainer()
+            mock_container_client.from_container_url.return_value = container
+            self.azure._max_single_put_size = single_put_size
+            self.azure._max_block_size = 1048576
+
+            # the file is read once, the md5 is computed on the buffers sent
+            with patch('builtins.open', side_effect=real_open) as mock_open:
+                res = self.azure.upload(self.file_name, self.ds, chunk_size=0, workers=3)
+            self.assertEqual([call[0][0] for call in mock_open.call_args_list], [self.file_name])
+
+            self.assertEqual(res['num_of_objects'], 1)
+            self.assertEqual(res['md5_checksum'], hashlib.md5(self.data).hexdigest())
+            self.assertEqual(container.blobs['0'][0], self.data)
+            self.assertEqual(bytes(container.blobs['0'][1]), hashlib.md5(self.data).digest())
+        # staged in blocks when larger than the single put size
+        self.assertEqual(len(container.staged), 6)
+
+    @patch('sdlib.api.providers.azure.storage_service.ContainerClient')
+    @patch('sdlib.api.providers.azure.storage_service.AzureStorageService._get_sas_url')
+    def test_upload_multi_object_resume(self, mock_sas_url, mock_container_client):
+        container = FakeContainer()
+        mock_container_client.from_container_url.return_value = container
+        staged = []
+        get_blob_client = container.get_blob_client
+
+        def failing_blob_client(name):
+            blob = get_blob_client(name)
+            stage_block = blob.stage_block.side_effect
+
+            def stage(*args, **kwargs):
+                staged.append(name)
+                if name == '3' and fail[0]:
+                    raise Exception('connection reset')
+                return stage_block(*args, **kwargs)
+
+            blob.stage_block.side_effect = stage
+            return blob
+
+        container.get_blob_client = failing_blob_client
+        fail = [True]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            journal = TransferJournal('upload', 'sd://tnx01/spx01/data', self.file_name, tmpdir)
+            journal.start()
+            with self.assertRaises(Exception):
+                self.azure.upload(self.file_name, self.ds, chunk_size=1, workers=1, journal=journal)
+            # the committed objects are kept and journaled
+            self.assertEqual(sorted(container.blobs), ['0', '1', '2'])
+
+            fail[0] = False
+            del staged[:]
+            journal = TransferJournal('upload', 'sd://tnx01/spx01/data', self.file_name, tmpdir)
+            journal.load()
+            # resumed with the journaled chunk size
+            res = self.azure.upload(self.file_name, self.ds, chunk_size=4, workers=2, journal=journal)
+
+        self.assertEqual(sorted(staged), ['3', '4', '5'])
+        self.assertEqual(res['num_of_objects'], 6)
+        self.assertEqual(res['md5_checksum'], hashlib.md5(self.data).hexdigest())
+        self.assertEqual(b''.join(container.blobs[str(ii)][0] for ii in range(6)), self.data)
+
+    @patch('sdlib.api.providers.azure.storage_service.ContainerClient')
+    @patch('sdlib.api.providers.azure.storage_service.AzureStorageService._get_sas_url')
+    def test_download_verification(self, mock_sas_url, mock_container_client):
+        container = FakeContainer()
+        mock_container_client.from_container_url.return_value = container
+        res = self.azure.upload(self.file_name, self.ds, chunk_size=1, workers=3)
+        self.azure._max_single_get_size = 1000000
+        self.ds.filemetadata = {'size': len(self.data), 'nobjects': 6, 'md5Checksum': res['md5_checksum']}
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_filename = os.path.join(tmpdir, 'dataset')
+            real_open = open
+
+            # objects carrying the md5 of the file up to their end: verified without reading the file again
+            with patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                    patch('sdlib.api.providers.azure.storage_service.alive_bar', return_value=QuietProgress()), \
+                    patch('builtins.open', side_effect=real_open) as mock_open:
+                self.assertTrue(self.azure.download(local_filename, self.ds, quiet=False))
+            # the local file is written once (the other file opened is the progress one)
+            self.assertEqual([(call[0][0], call[0][1]) for call in mock_open.call_args_list],
+                             [(local_filename, 'wb'), (local_filename + '.sdprogress', 'w')])
+            self.assertIn('Source File Checksum: ' + res['md5_checksum'], stdout.getvalue())
+            self.assertIn('Checksum matches!!!', stdout.getvalue())
+            with open(local_filename, 'rb') as local_file:
+                self.assertEqual(local_file.read(), self.data)
+
+            # objects carrying their own md5 (uploaded by other tools)
+            for ii in range(6):
+                data = container.blobs[str(ii)][0]
+                container.blobs[str(ii)] = (data, bytearray(hashlib.md5(data).digest()))
+            del self.ds.filemetadata['md5Checksum']
+            with patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                    patch('sdlib.api.providers.azure.storage_service.alive_bar', return_value=QuietProgress()):
+                self.azure.download(local_filename, self.ds)
+            self.assertIn('Destination File Checksum: ' + res['md5_checksum'], stdout.getvalue())
+            self.assertIn('6 of 6 objects verified against their own md5', stdout.getvalue())
+
+            # a corrupted object is reported
+            container.blobs['3'] = (container.blobs['3'][0][:-1] + b'x', container.blobs['3'][1])
+            with self.assertRaises(Exception) as ctx:
+                self.azure.download(local_filename, self.ds, quiet=True)
+            self.assertIn('Checksum mismatch for object 3', str(ctx.exception))
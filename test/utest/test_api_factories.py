@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import unittest
+from mock import patch
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.api.storage_service import StorageFactory, StorageService
+from sdlib.auth.auth_service import AuthFactory
+
+
+class TestApiFactories(unittest.TestCase):
+
+    def test_provider_names_registered(self):
+        for provider in ['anthos', 'aws', 'azure', 'gc', 'google', 'ibm']:
+            self.assertEqual(StorageFactory.provider_modules[provider], 'sdlib.api.providers.' + provider)
+        for provider in ['aws', 'azure', 'default', 'ibm', 'oauth2']:
+            self.assertEqual(AuthFactory.provider_modules[provider], 'sdlib.auth.providers.' + provider)
+
+    def test_build_imports_on_demand(self):
+        class FakeStorageService(StorageService):
+            pass
+
+        def import_module(name):
+            self.assertEqual(name, 'test.fake')
+            StorageFactory.register(provider='fake')(FakeStorageService)
+
+        StorageFactory.register_module('fake', 'test.fake')
+        try:
+            with patch('sdlib.api.storage_service.importlib.import_module', side_effect=import_module) as mock_import:
+                self.assertIsInstance(StorageFactory.build('Fake', auth=None), FakeStorageService)
+                self.assertIsInstance(StorageFactory.build('fake', auth=None), FakeStorageService)
+                self.assertEqual(mock_import.call_count, 1)
+        finally:
+            StorageFactory.provider_modules.pop('fake')
+            StorageFactory.provider_classes.pop('fake')
+
+        with self.assertRaises(ValueError):
+            StorageFactory.build('unknown', auth=None)
+        with self.assertRaises(ValueError):
+            AuthFactory.build('missing', None)
@@ -16,9 +16,16 @@
 
 from sdlib.api.dataset import Dataset
 from sdlib.api.providers.google import GoogleStorageService
+from sdlib.shared.transfer_journal import TransferJournal
 
+import base64
+import io
 import os
+import struct
 import sys
+import tempfile
+
+import crc32c
 from mock import patch, Mock
 
 sys.path.append(
@@ -49,7 +56,7 @@ class TestApiGcs(SdUtilTestCase):
         self.ds = Dataset()
         self.ds.gcsurl = 'gs://bucket/folder'
 
-    @patch('requests.delete')
+    @patch('sdlib.shared.http_session.HttpSession.delete')
     def test_object_delete(self, mock_request_delete):
         with patch('sdlib.api.seismic_store_service.SeismicStoreService.get_storage_access_token'):
             mock_request_delete.return_value = self.mock_response(status=204)
@@ -60,7 +67,7 @@ class TestApiGcs(SdUtilTestCase):
                     status=404)
                 self.gcs.object_delete('obj', self.ds)
 
-    @patch('requests.post')
+    @patch('sdlib.shared.http_session.HttpSession.post')
     def test_object_add(self, mock_request_post):
         with patch('sdlib.api.seismic_store_service.SeismicStoreService.get_storage_access_token'):
             mock_request_post.return_value = self.mock_response(status=200)
@@ -70,7 +77,7 @@ class TestApiGcs(SdUtilTestCase):
                 mock_request_post.return_value = self.mock_response(status=404)
                 self.gcs.object_add('obj', self.ds)
 
-    @patch('requests.post')
+    @patch('sdlib.shared.http_session.HttpSession.post')
     def test_object_upload(self, mock_request_post):
         with patch('sdlib.api.seismic_store_service.SeismicStoreService.get_storage_access_token'):
             mock_request_post.return_value = self.mock_response(status=200)
@@ -82,7 +89,7 @@ class TestApiGcs(SdUtilTestCase):
                 self.gcs.object_upload(
                     'bucket', 'obj', 'data', 'tnx01', 'spx01')
 
-    @patch('requests.get')
+    @patch('sdlib.shared.http_session.HttpSession.get')
     def test_object_download(self, mock_request_get):
         with patch('sdlib.api.seismic_store_service.SeismicStoreService.get_storage_access_token'):
             mock_request_get.return_value = self.mock_response(
@@ -94,7 +101,22 @@ class TestApiGcs(SdUtilTestCase):
                 mock_request_get.return_value = self.mock_response(status=404)
                 self.gcs.object_download('bucket', 'obj', 'tnx01', 'spx01')
 
-    @patch('requests.get')
+    @patch('sdlib.shared.http_session.HttpSession.get')
+    def test_object_download_into(self, mock_request_get):
+        data = os.urandom(3000000)
+        with patch('sdlib.api.seismic_store_service.SeismicStoreService.get_storage_access_token'):
+            mock_request_get.return_value = self.mock_response(status=206)
+            mock_request_get.return_value.raw = io.BytesIO(data)
+            mock_request_get.return_value.__enter__ = Mock(return_value=mock_request_get.return_value)
+            mock_request_get.return_value.__exit__ = Mock(return_value=False)
+            buffer = bytearray(len(data))
+            self.assertEqual(self.gcs.object_download_into(
+                memoryview(buffer), 'bucket', 'obj', 'tnx01', 'spx01', 0, len(data) - 1), len(data))
+            self.assertEqual(buffer, data)
+            self.assertEqual(mock_request_get.call_args[1]['headers']['Range'], 'bytes=0-2999999')
+            self.assertTrue(mock_request_get.call_args[1]['stream'])
+
+    @patch('sdlib.shared.http_session.HttpSession.get')
     def test_object_attribute(self, mock_request_get):
         with patch('sdlib.api.seismic_store_service.SeismicStoreService.get_storage_access_token'):
             res_object_attribute = {'attribute': 'value'}
@@ -111,3 +133,87 @@ class TestApiGcs(SdUtilTestCase):
     def test_object_size(self):
         with patch('sdlib.api.providers.google.GoogleStorageService.object_attribute'):
             self.gcs.object_size('bucket', 'object', 'tnx01', 'spx01')
+
+    def test_download(self):
+        data = os.urandom(50)
+        crc = base64.b64encode(struct.pack(">I", crc32c.crc32(data))).decode("utf-8")
+        self.ds.tenant = 'tnx01'
+        self.ds.subproject = 'spx01'
+        self.ds.seismicmeta = None
+        self.ds.filemetadata = {'nobjects': 1, 'size': 50}
+        self.gcs._chunkSize = 16
+
+        def download_into(buffer, bucket, obj, tenant, subproject, bfrom, bto):
+            buffer[:bto + 1 - bfrom] = data[bfrom:bto + 1]
+            return bto + 1 - bfrom
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_filename = os.path.join(tmpdir, 'dataset')
+            with patch('sdlib.api.providers.google.GoogleStorageService.object_size', return_value='50'), \
+                    patch('sdlib.api.providers.google.GoogleStorageService.object_attribute', return_value=crc), \
+                    patch('sdlib.api.providers.google.GoogleStorageService.object_download_into',
+                          side_effect=download_into):
+                self.assertTrue(self.gcs.download(local_filename, self.ds))
+            with open(local_filename, 'rb') as local_file:
+                self.assertEqual(local_file.read(), data)
+
+            with patch('sdlib.api.providers.google.GoogleStorageService.object_size', return_value='50'), \
+                    patch('sdlib.api.providers.google.GoogleStorageService.object_attribute', return_value='invalid'), \
+                    patch('sdlib.api.providers.google.GoogleStorageService.object_download_into',
+                          side_effect=download_into):
+                with self.assertRaises(Exception):
+                    self.gcs.download(local_filename, self.ds)
+            self.assertFalse(os.path.exists(local_filename))
+
+            # an interrupted download is kept, with its progress, to be resumed
+            def interrupted_into(buffer, bucket, obj, tenant, subproject, bfrom, bto):
+                if bfrom >= 32:
+                    raise Exception('connection reset')
+                return download_into(buffer, bucket, obj, tenant, subproject, bfrom, bto)
+
+            with patch('sdlib.api.providers.google.GoogleStorageService.object_size', return_value='50'), \
+                    patch('sdlib.api.providers.google.GoogleStorageService.object_attribute', return_value=crc), \
+                    patch('sdlib.api.providers.google.GoogleStorageService.object_download_into',
+                          side_effect=interrupted_into), \
+                    patch('sdlib.api.transfer.time.sleep'):
+                with self.assertRaises(Exception):
+                    self.gcs.download(local_filename, self.ds, workers=1)
+            self.assertTrue(os.path.exists(local_filename))
+            self.assertTrue(os.path.exists(local_filename + '.sdprogress'))
+
+    @patch('sdlib.shared.http_session.HttpSession.put')
+    def test_upload_resumable_status(self, mock_request_put):
+        with patch('sdlib.api.seismic_store_service.SeismicStoreService.get_storage_access_token'):
+            mock_request_put.return_value = self.mock_response(status=308, headers={'Range': 'bytes=0-31'})
+            self.assertEqual(self.gcs.upload_resumable_status('location', 50, 'tnx01', 'spx01'), 32)
+            mock_request_put.return_value = self.mock_response(status=308, headers={})
+            self.assertEqual(self.gcs.upload_resumable_status('location', 50, 'tnx01', 'spx01'), 0)
+            mock_request_put.return_value = self.mock_response(status=200)
+            self.assertEqual(self.gcs.upload_resumable_status('location', 50, 'tnx01', 'spx01'), 50)
+            mock_request_put.return_value = self.mock_response(status=410)
+            self.assertIsNone(self.gcs.upload_resumable_status('location', 50, 'tnx01', 'spx01'))
+
+    def test_upload_resume(self):
+        data = os.urandom(50)
+        crc = base64.b64encode(struct.pack(">I", crc32c.crc32(data))).decode("utf-8")
+        self.ds.gcsurl = 'bucket/folder'
+        self.ds.tenant = 'tnx01'
+        self.ds.subproject = 'spx01'
+        self.gcs._chunkSize = 16
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_filename = os.path.join(tmpdir, 'dataset')
+            with open(local_filename, 'wb') as local_file:
+                local_file.write(data)
+            journal = TransferJournal('upload', 'sd://tnx01/spx01/data', local_filename, tmpdir)
+            journal.start(location='location', offset=32, crc32c=crc32c.crc32(data[:32]))
+            with patch('sdlib.api.providers.google.GoogleStorageService.upload_resumable_status',
+                       return_value=32), \
+                    patch('sdlib.api.providers.google.GoogleStorageService.upload_resumable_start') as start, \
+                    patch('sdlib.api.providers.google.GoogleStorageService.upload_resumable_continue') as cont, \
+                    patch('sdlib.api.providers.google.GoogleStorageService.object_attribute', return_value=crc):
+                self.assertEqual(self.gcs.upload(local_filename, self.ds, journal=journal), {'num_of_objects': 1})
+            start.assert_not_called()
+            # only the bytes not persisted by the interrupted session are sent
+            self.assertEqual([(call[0][2], call[0][3]) for call in cont.call_args_list], [(32, 47), (48, 49)])
+            self.assertEqual(b''.join(call[0][1] for call in cont.call_args_list), data[32:])
+            self.assertEqual(journal.state['offset'], 50)
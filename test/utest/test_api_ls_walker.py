@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.api.ls_walker import LsWalker
+
+
+class FakeSeismicStore(object):
+    """ Seismic store listing stand-in: folders are dicts, datasets are None """
+
+    TREE = {
+        'b/': {'x': None, 'y/': {'z': None}},
+        'a/': {'d2': None, 'd1': None},
+        'ds3': None, 'ds1': None, 'ds2': None,
+    }
+
+    def __init__(self, page_size=2, fail_on=None):
+        self.page_size = page_size
+        self.fail_on = fail_on
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _folder(self, sdpath):
+        node = self.TREE
+        for name in sdpath[len('sd://tnx01/spx01'):].split('/'):
+            if name:
+                node = node[name + '/']
+        return node
+
+    def ls(self, sdpath, limit=None, next_page_cursor=None, working_mode=None):
+        with self.lock:
+            self.calls.append((sdpath, next_page_cursor, working_mode))
+        if sdpath == self.fail_on:
+            raise Exception('[500] listing failed')
+        items = list(self._folder(sdpath).keys())
+        if working_mode is None:
+            return items
+        # azure: folders with the first page, datasets paginated
+        dirs = [e for e in items if e[-1] == '/']
+        datasets = sorted(e for e in items if e[-1] != '/')
+        start = int(next_page_cursor or 0)
+        page = datasets[start:start + self.page_size]
+        res = {'datasets': (dirs if working_mode == 'all' else []) + page}
+        if start + self.page_size < len(datasets):
+            res['nextPageCursor'] = str(start + self.page_size)
+        return res
+
+
+class TestApiLsWalker(unittest.TestCase):
+
+    EXPECTED = [
+        ('sd://tnx01/spx01', 'a/', 'a'),
+        ('sd://tnx01/spx01/a', 'd1', None),
+        ('sd://tnx01/spx01/a', 'd2', None),
+        ('sd://tnx01/spx01', None, 'a'),
+        ('sd://tnx01/spx01', 'b/', 'b'),
+        ('sd://tnx01/spx01/b', 'y/', 'y'),
+        ('sd://tnx01/spx01/b/y', 'z', None),
+        ('sd://tnx01/spx01/b', None, 'y'),
+        ('sd://tnx01/spx01/b', 'x', None),
+        ('sd://tnx01/spx01', None, 'b'),
+        ('sd://tnx01/spx01', 'ds1', None),
+        ('sd://tnx01/spx01', 'ds2', None),
+        ('sd://tnx01/spx01', 'ds3', None),
+    ]
+
+    def test_ordered(self):
+        for provider in ['google', 'azure']:
+            svc = FakeSeismicStore()
+            entries = list(LsWalker(svc, provider, workers=3).walk('sd://tnx01/spx01', recursive=True))
+            self.assertEqual(entries, self.EXPECTED)
+
+        # azure: the datasets pages are requested with the cursor of the previous page
+        self.assertEqual([call for call in svc.calls if call[0] == 'sd://tnx01/spx01'],
+                         [('sd://tnx01/spx01', None, 'all'), ('sd://tnx01/spx01', '2', 'datasets')])
+
+    def test_stream(self):
+        svc = FakeSeismicStore(page_size=1)
+        entries = list(LsWalker(svc, 'azure', workers=4).walk('sd://tnx01/spx01', recursive=True, ordered=False))
+        self.assertEqual(sorted(entries), sorted(e for e in self.EXPECTED if e[1] is not None))
+
+    def test_not_recursive(self):
+        svc = FakeSeismicStore()
+        entries = list(LsWalker(svc, 'google').walk('sd://tnx01/spx01/b'))
+        self.assertEqual(entries, [('sd://tnx01/spx01/b', 'y/', 'y'), ('sd://tnx01/spx01/b', 'x', None)])
+        self.assertEqual(svc.calls, [('sd://tnx01/spx01/b', None, None)])
+
+    def test_failure(self):
+        for ordered in [True, False]:
+            svc = FakeSeismicStore(fail_on='sd://tnx01/spx01/b/y')
+            with self.assertRaises(Exception):
+                list(LsWalker(svc, 'azure', workers=2).walk('sd://tnx01/spx01', recursive=True, ordered=ordered))
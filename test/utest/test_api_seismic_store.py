@@ -16,6 +16,9 @@
 
 import os
 import sys
+import tempfile
+
+import requests
 from mock import patch, Mock
 
 sys.path.append(
@@ -25,6 +28,8 @@ sys.path.append(
                 os.path.abspath(__file__)))))
 
 from sdlib.api.seismic_store_service import SeismicStoreService
+from sdlib.shared.dataset_cache import DatasetCache
+from sdlib.shared.user_cache import UserCache
 
 from test.utest import SdUtilTestCase
 
@@ -46,8 +51,15 @@ class TestApiSeismicStore(SdUtilTestCase):
         self.mock_auth = Mock()
         self.mock_auth.get_id_token = lambda: '!-my-magic-id-token'
         self.ss = SeismicStoreService(self.mock_auth)
+        SeismicStoreService._storage_tokens = None
+        self.tmpdir = tempfile.TemporaryDirectory()
+        SeismicStoreService._dataset_cache = DatasetCache(cache_file=os.path.join(self.tmpdir.name, DatasetCache.CACHE_FILE))
+
+    def tearDown(self):
+        SeismicStoreService._dataset_cache = None
+        self.tmpdir.cleanup()
 
-    @patch('requests.post')
+    @patch('sdlib.shared.http_session.HttpSession.post')
     def test_create_subproject(self, mock_request_post):
         mock_request_post.return_value = self.mock_response()
         self.assertEqual(self.ss.create_subproject('tnx01', 'spx01', 'user@email.com', 'gcsclass', 'gcsloc', 'ltag', 'uniform', None, None),
@@ -57,7 +69,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_post.return_value = self.mock_response(status=404)
             self.ss.create_subproject('tnx01', 'spx01', 'user@email.com', 'gcsclass', 'gcsloc', 'ltag', 'uniform', None, None)
 
-    @patch('requests.get')
+    @patch('sdlib.shared.http_session.HttpSession.get')
     def test_get_subproject(self, mock_request_get):
         res_get = {'message': 'mex'}
         mock_request_get.return_value = self.mock_response(json_data=res_get)
@@ -67,7 +79,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_get.return_value = self.mock_response(status=404)
             self.ss.get_subproject('tnx01', 'spx01')
 
-    @patch('requests.get')
+    @patch('sdlib.shared.http_session.HttpSession.get')
     def test_ls(self, mock_request_get):
         res_ls = {'message': 'mex'}
         mock_request_get.return_value = self.mock_response(json_data=res_ls)
@@ -77,7 +89,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_get.return_value = self.mock_response(status=404)
             self.ss.ls('sd://tnx01/spx01/a/b/c/')
 
-    @patch('requests.post')
+    @patch('sdlib.shared.http_session.HttpSession.post')
     def test_dataset_register(self, mock_request_post):
         res_dataset_register = {'message': 'mex'}
         mock_request_post.return_value = self.mock_response(json_data=res_dataset_register)
@@ -87,7 +99,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_post.return_value = self.mock_response(status=404)
             self.ss.dataset_register('sd://tnx01/spx01/a/b/c/', 'zgy')
 
-    @patch('requests.get')
+    @patch('sdlib.shared.http_session.HttpSession.get')
     def test_dataset_get(self, mock_request_get):
         res_dataset_get = {'message': 'mex'}
         mock_request_get.return_value = self.mock_response(json_data=res_dataset_get)
@@ -95,9 +107,77 @@ class TestApiSeismicStore(SdUtilTestCase):
 
         with self.assertRaises(Exception):
             mock_request_get.return_value = self.mock_response(status=404)
-            self.ss.dataset_get('sd://tnx01/spx01/a/b/c/')
-
-    @patch('requests.patch')
+            self.ss.dataset_get('sd://tnx01/spx01/a/b/d/')
+
+    @patch('sdlib.shared.http_session.HttpSession.patch')
+    @patch('sdlib.shared.http_session.HttpSession.get')
+    def test_dataset_get_cached(self, mock_request_get, mock_request_patch):
+        path = 'sd://tnx01/spx01/a/dsx01'
+        mock_request_get.return_value = self.mock_response(
+            json_data={'name': 'dsx01', 'ltag': 'ltag-a', 'sbit': 'W1', 'sbit_count': 1})
+        self.assertEqual(self.ss.dataset_get(path)['sbit'], 'W1')
+        # served from the cache, also by other service instances, without the lock state
+        dataset = SeismicStoreService(self.mock_auth).dataset_get(path, lock_state=False)
+        self.assertEqual(dataset, {'name': 'dsx01', 'ltag': 'ltag-a'})
+        self.assertEqual(mock_request_get.call_count, 1)
+        # the lock state is always read from the service
+        self.assertEqual(self.ss.dataset_get(path)['sbit_count'], 1)
+        self.assertEqual(mock_request_get.call_count, 2)
+        # the seismicmeta variant is a different record
+        self.ss.dataset_get(path, 'true', lock_state=False)
+        self.assertEqual(mock_request_get.call_count, 3)
+        # and so are the records fetched with another credential
+        other_auth = Mock()
+        other_auth.get_id_token = lambda: '!-other-id-token'
+        SeismicStoreService(other_auth).dataset_get(path, lock_state=False)
+        self.assertEqual(mock_request_get.call_count, 4)
+
+        # a patch drops the records of the dataset
+        mock_request_patch.return_value = self.mock_response(json_data={})
+        self.ss.dataset_patch(path, {'ltag': 'ltag-b'})
+        mock_request_get.return_value = self.mock_response(json_data={'name': 'dsx01', 'ltag': 'ltag-b'})
+        self.assertEqual(self.ss.dataset_get(path, lock_state=False)['ltag'], 'ltag-b')
+        self.assertEqual(mock_request_get.call_count, 5)
+
+        # --no-cache
+        with patch.object(DatasetCache, 'bypass', True):
+            self.ss.dataset_get(path, lock_state=False)
+        self.assertEqual(mock_request_get.call_count, 6)
+
+    @patch('sdlib.shared.http_session.HttpSession.patch')
+    @patch('sdlib.shared.http_session.HttpSession.put')
+    @patch('sdlib.shared.http_session.HttpSession.get')
+    def test_dataset_cache_lock_state(self, mock_request_get, mock_request_put, mock_request_patch):
+        path = 'sd://tnx01/spx01/a/dsx01'
+        mock_request_get.return_value = self.mock_response(json_data={'name': 'dsx01', 'sbit': 'R1'})
+        mock_request_put.return_value = self.mock_response(json_data={'name': 'dsx01', 'sbit': 'R1'})
+        mock_request_patch.return_value = self.mock_response(json_data={})
+        self.ss.dataset_get(path, 'true', lock_state=False)
+
+        # the read locks, their release and the unlocks keep the cached record
+        self.ss.dataset_lock(path, 'read')
+        self.ss.dataset_patch(path, None, 'R1')
+        self.ss.dataset_unlock(path)
+        self.assertEqual(self.ss.dataset_get(path, 'true', lock_state=False), {'name': 'dsx01'})
+        self.assertEqual(mock_request_get.call_count, 1)
+
+        # the lock state is read with the light record
+        self.assertEqual(self.ss.dataset_lock_state(path), {'sbit': 'R1', 'sbit_count': None, 'transfer_status': None})
+        self.assertEqual(mock_request_get.call_args[1]['params']['seismicmeta'], 'false')
+
+        # a write lock drops it
+        self.ss.dataset_lock(path, 'write')
+        self.ss.dataset_get(path, 'true', lock_state=False)
+        self.assertEqual(mock_request_get.call_count, 3)
+
+        # the record of a copy in progress is not cached
+        self.ss.dataset_patch(path, {'ltag': 'ltag-b'})
+        mock_request_get.return_value = self.mock_response(json_data={'name': 'dsx01', 'transfer_status': 'copying'})
+        self.ss.dataset_get(path, 'true', lock_state=False)
+        self.assertEqual(self.ss.dataset_get(path, 'true', lock_state=False)['transfer_status'], 'copying')
+        self.assertEqual(mock_request_get.call_count, 5)
+
+    @patch('sdlib.shared.http_session.HttpSession.patch')
     def test_dataset_patch(self, mock_request_patch):
         dataset_patch = {'message': 'mex'}
         mock_request_patch.return_value = self.mock_response(json_data=dataset_patch)
@@ -107,7 +187,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_patch.return_value = self.mock_response(status=404)
             self.ss.dataset_patch('sd://tnx01/spx01/a/b/c/', 'patch')
 
-    @patch('requests.delete')
+    @patch('sdlib.shared.http_session.HttpSession.delete')
     def test_dataset_delete(self, mock_request_delete):
         mock_request_delete.return_value = self.mock_response()
         self.assertEqual(self.ss.dataset_delete('sd://tnx01/spx01/a/b/c/'), None)
@@ -116,7 +196,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_delete.return_value = self.mock_response(status=404)
             self.ss.dataset_delete('sd://tnx01/spx01/a/b/c/')
 
-    @patch('requests.post')
+    @patch('sdlib.shared.http_session.HttpSession.post')
     def test_user_register(self, mock_request_post):
         mock_request_post.return_value = self.mock_response(status=200)
         self.assertEqual(self.ss.user_register('user@email.com'), 200)
@@ -125,7 +205,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_post.return_value = self.mock_response(status=404)
             self.ss.user_register('user@email.com')
 
-    @patch('requests.put')
+    @patch('sdlib.shared.http_session.HttpSession.put')
     def test_user_add(self, mock_request_put):
         mock_request_put.return_value = self.mock_response(status=200)
         self.assertEqual(self.ss.user_add('sd://tnx01/spx01', 'user@email.com', 'role'), None)
@@ -134,7 +214,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_put.return_value = self.mock_response(status=404)
             self.ss.user_add('sd://tnx01', 'user@email.com')
 
-    @patch('requests.get')
+    @patch('sdlib.shared.http_session.HttpSession.get')
     def test_user_list(self, mock_request_get):
         mock_request_get.return_value = self.mock_response(status=200)
         self.assertEqual(self.ss.user_list('sd://tnx01/spx01'), None)
@@ -143,7 +223,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_get.return_value = self.mock_response(status=404)
             self.ss.user_list('sd://tnx01/spx01')
 
-    @patch('requests.delete')
+    @patch('sdlib.shared.http_session.HttpSession.delete')
     def test_user_remove(self, mock_request_delete):
         mock_request_delete.return_value = self.mock_response(status=200)
         self.assertEqual(self.ss.user_remove('sd://tnx01/spx01', 'user@email.com'), None)
@@ -152,7 +232,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_delete.return_value = self.mock_response(status=404)
             self.ss.user_remove('sd://tnx01/spx01', 'user@email.com')
 
-    @patch('requests.put')
+    @patch('sdlib.shared.http_session.HttpSession.put')
     def test_user_system_admin_add(self, mock_request_put):
         mock_request_put.return_value = self.mock_response(status=200)
         self.assertEqual(self.ss.user_system_admin_add('user@email.com'), None)
@@ -161,7 +241,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_put.return_value = self.mock_response(status=404)
             self.ss.user_system_admin_add('user@email.com')
 
-    @patch('requests.get')
+    @patch('sdlib.shared.http_session.HttpSession.get')
     def test_set_legaltag(self, mock_request_get):
         mock_request_get.return_value = self.mock_response(status=200)
         self.assertEqual(self.ss.set_legatag('ltag'), None)
@@ -170,7 +250,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_get.return_value = self.mock_response(status=404)
             self.ss.set_legatag('ltag')
 
-    @patch('requests.get')
+    @patch('sdlib.shared.http_session.HttpSession.get')
     def test_user_roles(self, mock_request_get):
         res_user_roles = {'message': 'mex'}
         mock_request_get.return_value = self.mock_response(json_data=res_user_roles)
@@ -180,7 +260,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_get.return_value = self.mock_response(status=404)
             self.ss.user_roles('sd://tnx01')
 
-    @patch('requests.get')
+    @patch('sdlib.shared.http_session.HttpSession.get')
     def test_app_list(self, mock_request_get):
         res_app_list = {'message': 'mex'}
         mock_request_get.return_value = self.mock_response(json_data=res_app_list)
@@ -190,7 +270,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_get.return_value = self.mock_response(status=404)
             self.ss.app_list('sd://tnx01')
 
-    @patch('requests.get')
+    @patch('sdlib.shared.http_session.HttpSession.get')
     def test_apptrusted_list(self, mock_request_get):
         res_apptrusted_list = {'message': 'mex'}
         mock_request_get.return_value = self.mock_response(json_data=res_apptrusted_list)
@@ -200,7 +280,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_get.return_value = self.mock_response(status=404)
             self.ss.apptrusted_list('sd://tnx01')
 
-    @patch('requests.post')
+    @patch('sdlib.shared.http_session.HttpSession.post')
     def test_app_register(self, mock_request_post):
         mock_request_post.return_value = self.mock_response(status=200)
         self.assertEqual(self.ss.app_register('service@email.com', 'sd://tnx01'), 200)
@@ -209,7 +289,7 @@ class TestApiSeismicStore(SdUtilTestCase):
             mock_request_post.return_value = self.mock_response(status=404)
             self.ss.app_register('service@email.com', 'sd://tnx01')
 
-    @patch('requests.post')
+    @patch('sdlib.shared.http_session.HttpSession.post')
     def test_apptrusted_register(self, mock_request_post):
         mock_request_post.return_value = self.mock_response(status=200)
         self.assertEqual(self.ss.apptrusted_register('service@email.com', 'sd://tnx01'), 200)
@@ -217,3 +297,61 @@ class TestApiSeismicStore(SdUtilTestCase):
         with self.assertRaises(Exception):
             mock_request_post.return_value = self.mock_response(status=404)
             self.ss.apptrusted_register('service@email.com', 'sd://tnx01')
+
+    @patch('sdlib.shared.http_session.HttpSession.get')
+    def test_get_storage_access_token(self, mock_request_get):
+        mock_request_get.return_value = self.mock_response(text='{"access_token": "token-a"}')
+        self.assertEqual(self.ss.get_storage_access_token('tnx01', 'spx01', True), 'token-a')
+        # same scope: served from the cache, also by other service instances
+        self.assertEqual(SeismicStoreService(self.mock_auth).get_storage_access_token('tnx01', 'spx01', True), 'token-a')
+        self.assertEqual(mock_request_get.call_count, 1)
+
+        # different scope: a new token is requested
+        mock_request_get.return_value = self.mock_response(text='{"access_token": "token-b"}')
+        self.assertEqual(self.ss.get_storage_access_token('tnx01', 'spx01', False, 'a/', 'b'), 'token-b')
+        self.assertEqual(self.ss.get_storage_access_token('tnx01', 'spx01', True), 'token-a')
+        self.assertEqual(mock_request_get.call_count, 2)
+
+        # different caller: the token of the first one is never handed over
+        other_auth = Mock()
+        other_auth.get_id_token = lambda: '!-other-id-token'
+        mock_request_get.return_value = self.mock_response(text='{"access_token": "token-c"}')
+        self.assertEqual(SeismicStoreService(other_auth).get_storage_access_token('tnx01', 'spx01', True), 'token-c')
+        self.assertEqual(mock_request_get.call_count, 3)
+
+        with self.assertRaises(Exception):
+            mock_request_get.return_value = self.mock_response(status=404)
+            self.ss.get_storage_access_token('tnx01', 'spx02', True)
+
+    @patch('sdlib.shared.http_session.HttpSession.get')
+    def test_get_service_provider(self, mock_request_get):
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                patch('sdlib.api.seismic_store_service.UserCache', side_effect=lambda name: UserCache(name, tmpdir)):
+            # cold cache: the configured provider is returned, the cache is refreshed in the background
+            mock_request_get.return_value = self.mock_response(headers={'Service-Provider': 'azure'})
+            self.assertEqual(self.ss.get_service_provider(), 'provider')
+            self.assertTrue(SeismicStoreService._service_provider_refresh.daemon)
+            SeismicStoreService._service_provider_refresh.join()
+            self.assertEqual(self.ss.get_service_provider(), 'azure')
+            self.assertEqual(mock_request_get.call_count, 1)
+
+            # refreshed
+            mock_request_get.return_value = self.mock_response(headers={'Service-Provider': 'google'})
+            self.assertEqual(self.ss.get_service_provider(refresh=True), 'google')
+            self.assertEqual(self.ss.get_service_provider(), 'google')
+            self.assertEqual(mock_request_get.call_count, 2)
+
+            # service status not available: the configured provider is used and not cached
+            mock_request_get.return_value = self.mock_response(status=500)
+            self.assertEqual(self.ss.get_service_provider(refresh=True), 'provider')
+            self.assertEqual(self.ss.get_service_provider(), 'google')
+
+    @patch('sdlib.shared.http_session.HttpSession.get', side_effect=requests.ConnectionError())
+    def test_get_service_provider_unreachable(self, mock_request_get):
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                patch('sdlib.api.seismic_store_service.UserCache', side_effect=lambda name: UserCache(name, tmpdir)):
+            self.assertEqual(self.ss.get_service_provider(), 'provider')
+            SeismicStoreService._service_provider_refresh.join()
+            self.assertIsNone(UserCache(SeismicStoreService.SERVICE_PROVIDER_CACHE, tmpdir).get('any'))
+            with self.assertRaises(requests.ConnectionError):
+                self.ss.get_service_provider(refresh=True)
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from mock import MagicMock, patch
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.api.transfer import (BandwidthLimiter, BufferPool, BufferStream, MappedFileReader,
+                                ParallelChunkUploader, ParallelRangeDownloader, ResumableMultipartUploader,
+                                body_stream, open_upload_reader, parse_bandwidth)
+from sdlib.shared.transfer_journal import TransferJournal
+
+
+class TestApiTransfer(unittest.TestCase):
+
+    def test_upload_chunks_in_order(self):
+        data = os.urandom(1000)
+        staged = {}
+        read_order = []
+        lock = threading.Lock()
+
+        def stage(index, chunk):
+            with lock:
+                staged[index] = bytes(chunk)
+            return index
+
+        results = ParallelChunkUploader(4, 64).run(
+            io.BytesIO(data), stage, on_chunk=lambda index, chunk: read_order.append(index))
+
+        self.assertEqual(results, list(range(16)))
+        self.assertEqual(read_order, list(range(16)))
+        self.assertEqual(b''.join(staged[ii] for ii in range(16)), data)
+
+    def test_upload_progress(self):
+        progress = []
+        ParallelChunkUploader(2, 10).run(
+            io.BytesIO(b'x' * 25), lambda index, chunk: None, on_progress=progress.append)
+        self.assertEqual(sorted(progress), [5, 10, 10])
+
+    def test_upload_failure(self):
+        def stage(index, chunk):
+            if index == 2:
+                raise Exception('stage failed')
+
+        with self.assertRaises(Exception):
+            ParallelChunkUploader(2, 10).run(io.BytesIO(b'x' * 100), stage)
+
+    def test_upload_invalid_arguments(self):
+        with self.assertRaises(Exception):
+            ParallelChunkUploader(0, 10)
+        with self.assertRaises(Exception):
+            ParallelChunkUploader(1, 0)
+
+    def test_mapped_file_reader(self):
+        data = os.urandom(1000)
+        staged = {}
+
+        def stage(index, chunk):
+            # chunks are read-only views of the mapped file
+            self.assertIsInstance(chunk, memoryview)
+            self.assertTrue(chunk.readonly)
+            staged[index] = bytes(chunk)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_filename = os.path.join(tmpdir, 'dataset')
+            with open(local_filename, 'wb') as local_file:
+                local_file.write(data)
+            with open_upload_reader(local_filename, 'mmap') as reader:
+                ParallelChunkUploader(4, 64).run(reader, stage)
+                self.assertEqual(reader.tell(), 1000)
+                self.assertEqual(reader.seek(10), 10)
+                self.assertEqual(bytes(reader.read(5)), data[10:15])
+                reader.release(0, 1000)
+                self.assertEqual(bytes(reader.read()), data[15:])
+            with open_upload_reader(local_filename, 'read') as reader:
+                self.assertEqual(reader.read(), data)
+            with self.assertRaises(Exception):
+                open_upload_reader(local_filename, 'stream')
+
+            open(local_filename, 'wb').close()
+            with MappedFileReader(local_filename) as reader:
+                self.assertEqual(bytes(reader.read(64)), b'')
+
+        self.assertEqual(b''.join(staged[ii] for ii in range(16)), data)
+
+    def test_buffer_stream(self):
+        data = os.urandom(100)
+        self.assertIs(body_stream(data), data)
+        stream = body_stream(memoryview(data)[10:90])
+        self.assertIsInstance(stream, BufferStream)
+        self.assertEqual(len(stream), 80)
+        self.assertEqual(stream.read(30), data[10:40])
+        self.assertEqual(stream.read(), data[40:90])
+        self.assertEqual(stream.read(), b'')
+        stream.seek(0)
+        self.assertEqual(stream.read(), data[10:90])
+
+    def test_buffer_pool(self):
+        pool = BufferPool(2, 16)
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertEqual(len(first), 16)
+        self.assertIsNone(pool.acquire(block=False))
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        with self.assertRaises(Exception):
+            BufferPool(0, 16)
+
+    def test_download_into_shared_pool(self):
+        objects = [os.urandom(100), os.urandom(35)]
+        pool = BufferPool(2, 16)
+        in_use = []
+        lock = threading.Lock()
+
+        def fetch_into(index, offset, length, buffer):
+            with lock:
+                in_use.append(pool._allocated - len(pool._free))
+            buffer[:length] = objects[index][offset:offset + length]
+            return length
+
+        def download(local_filename):
+            ParallelRangeDownloader(4, 16).run(
+                local_filename, 135, [len(obj) for obj in objects], None, fetch_into=fetch_into)
+
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                patch('sdlib.api.transfer.BufferPool.shared', return_value=pool):
+            # concurrent downloads share the pool without blocking each other
+            threads = [threading.Thread(target=download, args=(os.path.join(tmpdir, str(ii)),)) for ii in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+            for ii in range(3):
+                with open(os.path.join(tmpdir, str(ii)), 'rb') as local_file:
+                    self.assertEqual(local_file.read(), b''.join(objects))
+
+        self.assertLessEqual(max(in_use), 2)
+        self.assertEqual(pool._allocated, 2)
+
+    def test_parse_bandwidth(self):
+        self.assertEqual(parse_bandwidth('200MB/s'), 200e6)
+        self.assertEqual(parse_bandwidth('1.5GiB/s'), 1.5 * 1024 ** 3)
+        self.assertEqual(parse_bandwidth('500k'), 500e3)
+        self.assertEqual(parse_bandwidth('1048576'), 1048576)
+        for value in ['', 'fast', '0MB/s', '10XB/s', '-1MB/s']:
+            with self.assertRaises(ValueError):
+                parse_bandwidth(value)
+
+    def test_bandwidth_limiter_rate(self):
+        limiter = BandwidthLimiter(100000, burst=1)
+        started = time.monotonic()
+        for _ in range(4):
+            limiter.consume(5000)
+        # the first request takes the burst, the next ones wait for the debt to be paid
+        self.assertGreaterEqual(time.monotonic() - started, 0.14)
+
+    def test_bandwidth_limiter_fair_between_flows(self):
+        limiter = BandwidthLimiter(100000, burst=1)
+        granted = []
+        lock = threading.Lock()
+
+        def consume(flow):
+            limiter.consume(5000, flow)
+            with lock:
+                granted.append(flow)
+
+        # the bucket is in debt: the requests queue up, 3 of file "a" before the one of file "b"
+        limiter.consume(10000)
+        threads = []
+        for flow in ['a', 'a', 'a', 'b']:
+            threads.append(threading.Thread(target=consume, args=(flow,)))
+            threads[-1].start()
+            time.sleep(0.01)
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(granted, ['a', 'b', 'a', 'a'])
+
+    def test_bandwidth_limits_shared(self):
+        # two commands of a batch: the lowest rate applies, the limit stays until both completed
+        BandwidthLimiter.add_limit(200000)
+        limiter = BandwidthLimiter.shared()
+        BandwidthLimiter.add_limit(100000)
+        self.assertIs(BandwidthLimiter.shared(), limiter)
+        self.assertEqual(limiter.rate, 100000)
+        BandwidthLimiter.remove_limit(100000)
+        self.assertIs(BandwidthLimiter.shared(), limiter)
+        self.assertEqual(limiter.rate, 200000)
+        BandwidthLimiter.remove_limit(200000)
+        self.assertIsNone(BandwidthLimiter.shared())
+
+    def test_transfers_throttled(self):
+        objects = [os.urandom(100), os.urandom(35)]
+
+        def fetch(index, offset, length):
+            return objects[index][offset:offset + length]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_filename = os.path.join(tmpdir, 'dataset')
+            with open(local_filename, 'wb') as local_file:
+                local_file.write(b''.join(objects))
+            limiter = BandwidthLimiter(1000000)
+            with patch.object(BandwidthLimiter, '_shared', limiter), \
+                    patch.object(limiter, 'consume', wraps=limiter.consume) as consume:
+                ParallelRangeDownloader(3, 16).run(local_filename, 135, [len(obj) for obj in objects], fetch)
+                self.assertEqual(sum(call[0][0] for call in consume.call_args_list), 135)
+                consume.reset_mock()
+
+                client = MagicMock()
+                client.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+                client.upload_part.return_value = {'ETag': '"etag"'}
+                ResumableMultipartUploader(2, 16).run(client, 'bucket', 'key', local_filename)
+                self.assertEqual(sum(call[0][0] for call in consume.call_args_list), 135)
+                # all the ranges (or parts) of a file are accounted to the same flow
+                self.assertEqual(len(set(call[0][1] for call in consume.call_args_list)), 1)
+
+    def test_download_ranges(self):
+        objects = [os.urandom(100), b'', os.urandom(35), os.urandom(64)]
+        fed = {}
+        completed = []
+
+        def fetch(index, offset, length):
+            return objects[index][offset:offset + length]
+
+        def on_data(index, data):
+            fed[index] = fed.get(index, b'') + bytes(data)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_filename = os.path.join(tmpdir, 'dataset')
+            ParallelRangeDownloader(3, 16).run(
+                local_filename, 199, [len(obj) for obj in objects], fetch,
+                on_data=on_data, on_object=completed.append)
+            with open(local_filename, 'rb') as local_file:
+                self.assertEqual(local_file.read(), b''.join(objects))
+
+        self.assertEqual(completed, [0, 1, 2, 3])
+        self.assertEqual([fed.get(ii, b'') for ii in range(4)], objects)
+
+    def test_download_retries_failed_range(self):
+        data = os.urandom(64)
+        attempts = {}
+
+        def fetch(index, offset, length):
+            attempts[offset] = attempts.get(offset, 0) + 1
+            if offset == 32 and attempts[offset] == 1:
+                raise Exception('connection reset')
+            return data[offset:offset + length]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_filename = os.path.join(tmpdir, 'dataset')
+            messages = []
+            ParallelRangeDownloader(2, 16, backoff=lambda retries: 0, log=messages.append).run(
+                local_filename, 64, [64], fetch)
+            with open(local_filename, 'rb') as local_file:
+                self.assertEqual(local_file.read(), data)
+
+        # only the failed range has been downloaded twice, the retry is reported through the transfer log
+        self.assertEqual(attempts, {0: 1, 16: 1, 32: 2, 48: 1})
+        self.assertEqual(len(messages), 1)
+        self.assertIn('object #0 [32-47], retrying', messages[0])
+
+    def test_download_failure(self):
+        def fetch(index, offset, length):
+            raise Exception('not found')
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with self.assertRaises(Exception):
+                ParallelRangeDownloader(2, 16, max_retries=1, backoff=lambda retries: 0).run(
+                    os.path.join(tmpdir, 'dataset'), 64, [64], fetch)
+            with self.assertRaises(Exception):
+                # objects size does not match the dataset size
+                ParallelRangeDownloader(2, 16).run(os.path.join(tmpdir, 'dataset'), 65, [64], fetch)
+
+    def test_multipart_upload_resume(self):
+        data = os.urandom(100)
+
+        class FakeS3(object):
+            def __init__(self):
+                self.parts = {}
+                self.sent = []
+                self.completed = None
+                self.fail_on = None
+
+            def create_multipart_upload(self, **kwargs):
+                return {'UploadId': 'upload-1'}
+
+            def upload_part(self, PartNumber, Body, ContentMD5, **kwargs):
+                if PartNumber == self.fail_on:
+                    raise Exception('connection reset')
+                self.sent.append(PartNumber)
+                self.parts[PartNumber] = Body.read()
+                return {'ETag': '"etag-' + str(PartNumber) + '"'}
+
+            def list_parts(self, PartNumberMarker, **kwargs):
+                numbers = sorted(number for number in self.parts if number > PartNumberMarker)
+                return {'Parts': [{'PartNumber': number, 'Size': len(self.parts[number])} for number in numbers[:2]],
+                        'IsTruncated': len(numbers) > 2, 'NextPartNumberMarker': numbers[min(1, len(numbers) - 1)]}
+
+            def complete_multipart_upload(self, MultipartUpload, **kwargs):
+                self.completed = MultipartUpload['Parts']
+
+            def abort_multipart_upload(self, **kwargs):
+                self.parts = {}
+
+        client = FakeS3()
+        with tempfile.TemporaryDirectory() as tmpdir, patch.object(ResumableMultipartUploader, 'MIN_PART_SIZE', 1):
+            local_filename = os.path.join(tmpdir, 'dataset')
+            with open(local_filename, 'wb') as local_file:
+                local_file.write(data)
+            journal = TransferJournal('upload', 'sd://tnx01/spx01/data', local_filename, tmpdir)
+            journal.start()
+
+            client.fail_on = 6
+            with self.assertRaises(Exception):
+                ResumableMultipartUploader(1, 16).run(client, 'bucket', 'key', local_filename, journal=journal)
+            self.assertEqual(client.sent, [1, 2, 3, 4, 5])
+            self.assertIsNone(client.completed)
+
+            client.fail_on = None
+            client.sent = []
+            journal = TransferJournal('upload', 'sd://tnx01/spx01/data', local_filename, tmpdir)
+            journal.load()
+            progress = []
+            ResumableMultipartUploader(2, 16).run(client, 'bucket', 'key', local_filename, journal=journal,
+                                                  on_progress=progress.append)
+
+        # only the missing parts are sent again
+        self.assertEqual(client.sent, [6, 7])
+        self.assertEqual(sum(progress), 100)
+        self.assertEqual(b''.join(client.parts[number] for number in range(1, 8)), data)
+        self.assertEqual(client.completed, [{'ETag': '"etag-' + str(number) + '"', 'PartNumber': number}
+                                            for number in range(1, 8)])
+
+    def test_download_resume(self):
+        objects = [os.urandom(40), os.urandom(50)]
+        data = b''.join(objects)
+        fetched = []
+        failing = [True]
+
+        def fetch(index, offset, length):
+            fetched.append((index, offset))
+            if failing[0] and (index, offset) == (1, 32):
+                raise Exception('connection reset')
+            return objects[index][offset:offset + length]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_filename = os.path.join(tmpdir, 'dataset')
+            progress_file = local_filename + ParallelRangeDownloader.PROGRESS_SUFFIX
+            engine = ParallelRangeDownloader(1, 16, max_retries=0)
+            # the progress of a download not resumed is recorded as well
+            with self.assertRaises(Exception):
+                engine.run(local_filename, 90, [40, 50], fetch, progress_file=progress_file, source='ds')
+            self.assertTrue(os.path.exists(progress_file))
+
+            # the verified ranges are kept and handed back, only the others are fetched
+            failing[0] = False
+            del fetched[:]
+            fed = {}
+            completed = []
+            ParallelRangeDownloader(2, 16).run(
+                local_filename, 90, [40, 50], fetch, progress_file=progress_file, source='ds', resume=True,
+                on_data=lambda index, chunk: fed.update({index: fed.get(index, b'') + chunk}),
+                on_object=completed.append)
+            self.assertEqual(fetched, [(1, 32), (1, 48)])
+            self.assertEqual([fed[0], fed[1]], objects)
+            self.assertEqual(completed, [0, 1])
+            self.assertFalse(os.path.exists(progress_file))
+            with open(local_filename, 'rb') as local_file:
+                self.assertEqual(local_file.read(), data)
+
+            # a corrupted range and the ones after it are fetched again
+            with self.assertRaises(Exception):
+                failing[0] = True
+                engine.run(local_filename, 90, [40, 50], fetch, progress_file=progress_file, source='ds')
+            with open(local_filename, 'r+b') as local_file:
+                local_file.seek(20)
+                local_file.write(b'x' if data[20:21] != b'x' else b'y')
+            failing[0] = False
+            del fetched[:]
+            ParallelRangeDownloader(2, 16).run(local_filename, 90, [40, 50], fetch,
+                                               progress_file=progress_file, source='ds', resume=True)
+            self.assertEqual(fetched, [(0, 16), (0, 32), (1, 0), (1, 16), (1, 32), (1, 48)])
+            with open(local_filename, 'rb') as local_file:
+                self.assertEqual(local_file.read(), data)
+
+            # the progress of another content is ignored
+            with self.assertRaises(Exception):
+                failing[0] = True
+                engine.run(local_filename, 90, [40, 50], fetch, progress_file=progress_file, source='ds')
+            failing[0] = False
+            del fetched[:]
+            ParallelRangeDownloader(2, 16).run(local_filename, 90, [40, 50], fetch,
+                                               progress_file=progress_file, source='other', resume=True)
+            self.assertEqual(len(fetched), 7)
+
+            # the progress is not used by a download not resumed
+            with self.assertRaises(Exception):
+                failing[0] = True
+                engine.run(local_filename, 90, [40, 50], fetch, progress_file=progress_file, source='ds')
+            failing[0] = False
+            del fetched[:]
+            ParallelRangeDownloader(2, 16).run(local_filename, 90, [40, 50], fetch,
+                                               progress_file=progress_file, source='ds')
+            self.assertEqual(len(fetched), 7)
+
+            # without progress, a resumed download is reported as started again
+            messages = []
+            del fetched[:]
+            ParallelRangeDownloader(2, 16, log=messages.append).run(
+                local_filename, 90, [40, 50], fetch, progress_file=progress_file, source='ds', resume=True)
+            self.assertEqual(len(fetched), 7)
+            self.assertEqual(len(messages), 1)
+            self.assertIn('No download progress recorded', messages[0])
+            with open(local_filename, 'rb') as local_file:
+                self.assertEqual(local_file.read(), data)
+
+    def test_download_rejected_object_progress(self):
+        objects = [os.urandom(40), os.urandom(50)]
+
+        def fetch(index, offset, length):
+            return objects[index][offset:offset + length]
+
+        def on_object(index):
+            if index == 1:
+                raise Exception('checksum mismatch')
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_filename = os.path.join(tmpdir, 'dataset')
+            progress_file = local_filename + ParallelRangeDownloader.PROGRESS_SUFFIX
+            # the ranges of an object failing its verification are not kept to be resumed
+            with self.assertRaises(Exception):
+                ParallelRangeDownloader(2, 16).run(local_filename, 90, [40, 50], fetch, on_object=on_object,
+                                                   progress_file=progress_file, source='ds')
+            self.assertFalse(os.path.exists(progress_file))
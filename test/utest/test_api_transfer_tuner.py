@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from mock import patch
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.api.transfer import ConcurrencyLimit, ParallelChunkUploader
+from sdlib.api.transfer_tuner import TransferTuner
+from sdlib.shared.user_cache import UserCache
+
+MiB = 1048576
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestApiTransferTuner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.clock = FakeClock()
+        self.patcher = patch('sdlib.api.transfer_tuner.time.time', self.clock)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmpdir.cleanup()
+
+    def tuner(self, direction='upload', **kwargs):
+        return TransferTuner('azure', 'https://host/api/v3', direction, cache_dir=self.tmpdir.name, **kwargs)
+
+    def transfer(self, tuner, chunks, bandwidth):
+        """ Simulate a transfer whose throughput is bandwidth(workers) bytes per second """
+        for _ in range(chunks):
+            seconds = 16 * MiB / float(bandwidth(tuner.workers)) * tuner.workers
+            self.clock.now += 16 * MiB / float(bandwidth(tuner.workers))
+            tuner.record(16 * MiB, seconds)
+
+    def test_start_settings(self):
+        self.assertEqual(self.tuner().start(4, 32 * MiB), (4, 32 * MiB))
+        self.assertEqual(self.tuner().start(4), (4, None))
+        self.assertEqual(self.tuner().start(chunk_size=20 * MiB), (None, 20 * MiB))
+        # bounded settings
+        self.assertEqual(self.tuner().start(100, MiB), (TransferTuner.MAX_WORKERS, TransferTuner.MIN_CHUNK_SIZE))
+        # the command line settings take precedence over the recorded ones
+        UserCache(TransferTuner.CACHE_NAME, self.tmpdir.name).put(
+            'azure https://host/api/v3', {'upload': {'workers': 8, 'chunk_size': 64 * MiB}})
+        self.assertEqual(self.tuner().start(4, 32 * MiB), (8, 64 * MiB))
+        self.assertEqual(self.tuner(workers=2, chunk_size=16 * MiB).start(4, 32 * MiB), (2, 16 * MiB))
+        self.assertEqual(self.tuner('download').start(4), (4, None))
+
+    def test_tune_workers_up(self):
+        tuner = self.tuner()
+        tuner.start(2, 32 * MiB)
+        # the throughput grows up to 8 workers
+        self.transfer(tuner, 100, lambda workers: min(workers, 8) * 10 * MiB)
+        self.assertEqual(tuner.workers, 8)
+        tuner.finish()
+
+        # the next transfer starts from the tuned settings
+        self.assertEqual(self.tuner().start(2, 32 * MiB), (8, 64 * MiB))
+
+    def test_tune_workers_down(self):
+        tuner = self.tuner()
+        tuner.start(8, 32 * MiB)
+        # more workers slow down the transfer (e.g. a congested link)
+        self.transfer(tuner, 100, lambda workers: 80 * MiB / workers)
+        self.assertEqual(tuner.workers, 1)
+
+    def test_tune_workers_stable(self):
+        tuner = self.tuner()
+        tuner.start(4, 32 * MiB)
+        self.transfer(tuner, 100, lambda workers: 40 * MiB)
+        self.assertEqual(tuner.workers, 4)
+
+    def test_tune_chunk_size(self):
+        tuner = self.tuner()
+        tuner.start(4, 32 * MiB)
+        # chunks too slow to keep the workers balanced
+        tuner.record(32 * MiB, 60)
+        tuner.finish()
+        self.assertEqual(self.tuner().start(4, 32 * MiB), (4, 16 * MiB))
+
+        # the settings given on the command line are not tuned nor recorded
+        tuner = self.tuner(workers=2, chunk_size=64 * MiB)
+        tuner.start(4, 32 * MiB)
+        self.transfer(tuner, 100, lambda workers: workers * 10 * MiB)
+        self.assertEqual(tuner.workers, 2)
+        tuner.finish()
+        self.assertEqual(self.tuner().start(4, 32 * MiB), (4, 16 * MiB))
+
+    def test_min_chunk_size(self):
+        # s3 multipart parts: never started nor halved below the provider minimum
+        tuner = self.tuner()
+        self.assertEqual(tuner.start(4, 4 * MiB, min_chunk_size=5 * MiB), (4, 5 * MiB))
+        tuner.record(5 * MiB, 60)
+        tuner.finish()
+        self.assertEqual(self.tuner().start(4, 32 * MiB, min_chunk_size=5 * MiB), (4, 5 * MiB))
+
+    def test_concurrency_limit(self):
+        limit = ConcurrencyLimit(1)
+        limit.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limit.acquire(), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limit.set(2)
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    def test_upload_with_tuner(self):
+        data = os.urandom(1000)
+        staged = {}
+        tuner = self.tuner()
+        tuner.start(2, 4 * MiB)
+
+        def stage(index, chunk):
+            staged[index] = bytes(chunk)
+
+        ParallelChunkUploader(tuner.workers, 10, tuner).run(io.BytesIO(data), stage)
+        self.assertEqual(b''.join(staged[ii] for ii in range(100)), data)
+        # the chunks staged are measured: quick chunks, larger ones next time
+        tuner.finish()
+        self.assertEqual(self.tuner().start(2, 4 * MiB)[1], 8 * MiB)
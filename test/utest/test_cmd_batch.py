@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import io
+import json
+import os
+import sys
+import tempfile
+from mock import patch
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.cmd.batch.cmd import Batch
+from sdlib.cmd.keyword_args import KeywordArguments
+
+from test.utest import SdUtilTestCase
+
+
+class TestCmdBatch(SdUtilTestCase):
+
+    def run_batch(self, lines, jobs=None):
+        keyword_args = KeywordArguments()
+        keyword_args.jobs = jobs
+        stdout = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'commands.txt')
+            with open(filename, 'w') as fh:
+                fh.write('\n'.join(lines) + '\n')
+            with patch.object(sys, 'stdout', stdout):
+                try:
+                    Batch('auth').execute([filename], keyword_args)
+                    error = None
+                except Exception as ex:
+                    error = str(ex)
+        return [json.loads(line) for line in stdout.getvalue().splitlines()], error
+
+    def test_parse_line(self):
+        self.assertEqual(Batch.parse_line('stat "sd://tnx01/spx01/a b" -d'),
+                         (None, ['stat', 'sd://tnx01/spx01/a b', '-d']))
+        self.assertEqual(Batch.parse_line('["rm", "sd://tnx01/spx01/a"]'), (None, ['rm', 'sd://tnx01/spx01/a']))
+        self.assertEqual(Batch.parse_line('{"id": 7, "args": ["ls", "sd://tnx01"]}'), (7, ['ls', 'sd://tnx01']))
+        with self.assertRaises(Exception):
+            Batch.parse_line('{"args": []}')
+        with self.assertRaises(Exception):
+            Batch.parse_line('[broken')
+
+    def test_get_jobs(self):
+        self.assertEqual(Batch.get_jobs(KeywordArguments()), 1)
+        keyword_args = KeywordArguments()
+        keyword_args.jobs = '8'
+        self.assertEqual(Batch.get_jobs(keyword_args), 8)
+        keyword_args.jobs = True
+        with self.assertRaises(Exception):
+            Batch.get_jobs(keyword_args)
+
+    def test_execute(self):
+        calls = []
+
+        def dataset_unlock(svc, sdpath):
+            calls.append((svc._auth, sdpath))
+            print('unlocked ' + sdpath)
+
+        with patch('sdlib.api.seismic_store_service.SeismicStoreService.dataset_unlock', dataset_unlock):
+            results, error = self.run_batch([
+                '# comment', '',
+                'unlock sd://tnx01/spx01/a/dsx01',
+                '{"id": "j2", "args": ["unlock", "sd://tnx01/spx01/a/dsx02"]}',
+            ], jobs='2')
+
+        self.assertIsNone(error)
+        self.assertEqual([result['line'] for result in results], [3, 4])
+        self.assertEqual([result['status'] for result in results], ['ok', 'ok'])
+        self.assertEqual(results[1]['id'], 'j2')
+        self.assertIn('unlocked sd://tnx01/spx01/a/dsx01', results[0]['output'])
+        self.assertIn('unlocked sd://tnx01/spx01/a/dsx02', results[1]['output'])
+        # a single auth provider shared by all the commands
+        self.assertEqual(sorted(calls), [('auth', 'sd://tnx01/spx01/a/dsx01'), ('auth', 'sd://tnx01/spx01/a/dsx02')])
+
+    def test_execute_errors(self):
+        with patch('sdlib.cmd.helper.CMDHelper.cmd_help', side_effect=SystemExit(0)):
+            results, error = self.run_batch([
+                'unknown sd://tnx01',
+                'config show',
+                'unlock sd://tnx01/spx01/dsx01 --idtoken=xyz',
+                'unlock sd://tnx01',
+                'unlock',
+            ])
+        self.assertEqual(error, '5 of 5 commands failed')
+        self.assertEqual([result['status'] for result in results], ['error'] * 5)
+        self.assertIn('Unknown command', results[0]['error'])
+        self.assertIn('cannot be run in a batch', results[1]['error'])
+        self.assertIn('--idtoken', results[2]['error'])
+        self.assertIn('not a valid seismic store dataset path', results[3]['error'])
+        self.assertIn('help menu', results[4]['error'])
+
+    def test_execute_interactive(self):
+        # a command prompting for input fails rather than reading the next command lines
+        stdin = sys.stdin
+        with patch('sdlib.api.seismic_store_service.SeismicStoreService.dataset_unlock',
+                   lambda svc, sdpath: input('Enter (y/n): ')):
+            results, error = self.run_batch(['unlock sd://tnx01/spx01/a/dsx01'])
+        self.assertEqual(error, '1 of 1 commands failed')
+        self.assertIn('interactive commands cannot be run in a batch', results[0]['error'])
+        self.assertIs(sys.stdin, stdin)
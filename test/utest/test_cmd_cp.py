@@ -14,9 +14,12 @@
 # limitations under the License.
 
 
+import io
 import sys
 import os
-from mock import patch, Mock, mock_open, ANY
+import stat
+import tempfile
+from mock import patch, Mock, MagicMock, mock_open, ANY
 
 sys.path.append(
     os.path.dirname(
@@ -24,10 +27,14 @@ sys.path.append(
             os.path.dirname(
                 os.path.abspath(__file__)))))
 
+from sdlib.api.transfer import BandwidthLimiter
 from sdlib.cmd.cp.cmd import Cp
+from sdlib.cmd.helper import CMDHelper
 from sdlib.cmd.keyword_args import KeywordArguments
+from sdlib.shared.transfer_journal import TransferJournal
 
 from test.utest import SdUtilTestCase
+from test.utest.test_api_ls_walker import FakeSeismicStore
 
 
 if sys.version[0] == "3":
@@ -41,9 +48,8 @@ class TestCmdCp(SdUtilTestCase):
     @patch("sdlib.cmd.cp.cmd.SeismicStoreService")
     @patch("sdlib.cmd.cp.cmd.StorageFactory")
     @patch("sdlib.cmd.cp.cmd.Dataset")
-    @patch("os.path.isfile", return_value=True)
-    @patch("os.path.getsize", return_value=1)
-    def test_passes_seismicmeta_to_dataset_when_passed(self, getsize, isfile,
+    @patch("os.stat", return_value=os.stat_result((stat.S_IFREG | 0o644, 0, 0, 1, 0, 0, 1, 0, 0, 0)))
+    def test_passes_seismicmeta_to_dataset_when_passed(self, local_stat,
                                                        Dataset,
                                                        StorageFactory,
                                                        SeismicStoreService):
@@ -85,4 +91,248 @@ class TestCmdCp(SdUtilTestCase):
 
             args = ['sdx//', 'sdx//']
             with self.assertRaises(Exception):
-                cmd.execute(args, KeywordArguments())
\ No newline at end of file
+                cmd.execute(args, KeywordArguments())
+
+    @patch("sdlib.cmd.cp.cmd.SeismicStoreService")
+    @patch("sdlib.cmd.cp.cmd.StorageFactory")
+    def test_recursive_upload(self, StorageFactory, SeismicStoreService):
+        sd = SeismicStoreService.return_value
+        sd.dataset_register.side_effect = lambda sdpath, *args: {
+            'tenant': 'tnx01', 'subproject': 'spx01', 'path': '/', 'name': sdpath, 'created_date': None,
+            'last_modified_date': None, 'gcsurl': 'bucket/folder', 'access_policy': 'uniform', 'sbit': 'sbit-' + sdpath}
+        storage_service = StorageFactory.build.return_value
+
+        def upload(local_file, ds, **kwargs):
+            self.assertTrue(kwargs['quiet'])
+            # the size collected with the directory listing is passed through
+            self.assertEqual(kwargs['size'], 4)
+            if local_file.endswith('bad.segy'):
+                raise Exception('upload failed')
+            return {'num_of_objects': 1}
+
+        storage_service.upload.side_effect = upload
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ['a.segy', os.path.join('sub', 'b.segy'), os.path.join('sub', 'b.segy.json')]:
+                os.makedirs(os.path.dirname(os.path.join(tmpdir, name)), exist_ok=True)
+                with open(os.path.join(tmpdir, name), 'wb') as fh:
+                    fh.write(b'data')
+
+            args, keyword_args = CMDHelper.getPosAndKeyWordArguments(
+                ['cp', tmpdir, 'sd://tnx01/spx01/drop/', '-r', '--jobs=2'])
+            # every local file is stat'ed once, by the directory listing
+            with patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                    patch('os.path.getsize', side_effect=AssertionError('the file is stat\'ed again')):
+                Cp(MagicMock()).execute(args, keyword_args)
+
+            self.assertEqual(sorted(call[0][0] for call in sd.dataset_register.call_args_list),
+                             ['sd://tnx01/spx01/drop/a.segy', 'sd://tnx01/spx01/drop/sub/b.segy',
+                              'sd://tnx01/spx01/drop/sub/b.segy.json'])
+            self.assertEqual(sd.dataset_patch.call_count, 3)
+            sd.dataset_patch.assert_any_call('sd://tnx01/spx01/drop/sub/b.segy', ANY, 'sbit-sd://tnx01/spx01/drop/sub/b.segy')
+            self.assertEqual([call[0][1]['filemetadata']['size'] for call in sd.dataset_patch.call_args_list], [4] * 3)
+            self.assertIn('3 files uploaded, 12.0 B', stdout.getvalue())
+            self.assertIn('0 failures', stdout.getvalue())
+
+            # failed uploads are reported at the end and their datasets removed
+            with open(os.path.join(tmpdir, 'bad.segy'), 'wb') as fh:
+                fh.write(b'data')
+            with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                with self.assertRaises(Exception) as ctx:
+                    Cp(MagicMock()).execute(args, keyword_args)
+            self.assertIn('1 of 4 transfers failed', str(ctx.exception))
+            self.assertIn('3 files uploaded', stdout.getvalue())
+            sd.dataset_delete.assert_called_once_with('sd://tnx01/spx01/drop/bad.segy')
+
+            with self.assertRaises(Exception):
+                args, keyword_args = CMDHelper.getPosAndKeyWordArguments(
+                    ['cp', tmpdir, 'sd://tnx01/spx01/drop/', '-r', '--jobs=0'])
+                Cp(MagicMock()).execute(args, keyword_args)
+            with self.assertRaises(Exception):
+                args, keyword_args = CMDHelper.getPosAndKeyWordArguments(
+                    ['cp', os.path.join(tmpdir, 'missing'), 'sd://tnx01/spx01/drop/', '-r'])
+                Cp(MagicMock()).execute(args, keyword_args)
+
+    @patch("sdlib.cmd.cp.cmd.SeismicStoreService")
+    @patch("sdlib.cmd.cp.cmd.StorageFactory")
+    def test_recursive_download(self, StorageFactory, SeismicStoreService):
+        sd = SeismicStoreService.return_value
+        sd.ls.side_effect = FakeSeismicStore().ls
+        sd.get_service_provider.return_value = 'azure'
+        sd.dataset_lock.side_effect = lambda sdpath, mode: {
+            'tenant': 'tnx01', 'subproject': 'spx01', 'path': '/', 'name': sdpath, 'created_date': None,
+            'last_modified_date': None, 'gcsurl': 'bucket/folder', 'access_policy': 'uniform', 'sbit': 'sbit-' + sdpath,
+            'filemetadata': {'type': 'GENERIC', 'nobjects': 1, 'size': 4}}
+        sd.dataset_get.return_value = {
+            'tenant': 'tnx01', 'subproject': 'spx01', 'path': '/', 'name': 'ds', 'created_date': None,
+            'last_modified_date': None, 'gcsurl': 'bucket/folder', 'access_policy': 'uniform'}
+        storage_service = StorageFactory.build.return_value
+
+        def download(local_file, ds, **kwargs):
+            self.assertTrue(kwargs['quiet'])
+            if ds.name.endswith('/x'):
+                raise Exception('download failed')
+            with open(local_file, 'wb') as fh:
+                fh.write(b'data')
+
+        storage_service.download.side_effect = download
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_dir = os.path.join(tmpdir, 'out')
+            args, keyword_args = CMDHelper.getPosAndKeyWordArguments(
+                ['cp', 'sd://tnx01/spx01/', local_dir, '-r', '--jobs=2'])
+            with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                with self.assertRaises(Exception) as ctx:
+                    Cp(MagicMock()).execute(args, keyword_args)
+
+            self.assertIn('1 of 7 transfers failed', str(ctx.exception))
+            self.assertIn('6 files downloaded, 24.0 B', stdout.getvalue())
+            for name in ['ds1', 'ds2', 'ds3', os.path.join('a', 'd1'), os.path.join('b', 'y', 'z')]:
+                self.assertTrue(os.path.isfile(os.path.join(local_dir, name)))
+            self.assertFalse(os.path.exists(os.path.join(local_dir, 'b', 'x')))
+
+            # every read lock is released, including the failed one
+            self.assertEqual(sd.dataset_lock.call_count, 7)
+            self.assertEqual(sd.dataset_patch.call_count, 7)
+            sd.dataset_patch.assert_any_call('sd://tnx01/spx01/b/x', None, 'sbit-sd://tnx01/spx01/b/x')
+
+            # existing files are not overwritten without --force, and no confirmation is asked
+            sd.dataset_lock.reset_mock()
+            args, keyword_args = CMDHelper.getPosAndKeyWordArguments(
+                ['cp', 'sd://tnx01/spx01/a', os.path.join(local_dir, 'a'), '-r'])
+            with patch('sys.stdout', new_callable=io.StringIO), patch('sys.stdin') as stdin:
+                with self.assertRaises(Exception) as ctx:
+                    Cp(MagicMock()).execute(args, keyword_args)
+                stdin.readline.assert_not_called()
+            self.assertIn('2 of 2 transfers failed', str(ctx.exception))
+            sd.dataset_lock.assert_not_called()
+
+            args, keyword_args = CMDHelper.getPosAndKeyWordArguments(
+                ['cp', 'sd://tnx01/spx01/a', os.path.join(local_dir, 'a'), '-r', '--force'])
+            with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                Cp(MagicMock()).execute(args, keyword_args)
+            self.assertIn('2 files downloaded', stdout.getvalue())
+
+    @patch("sdlib.cmd.cp.cmd.SeismicStoreService")
+    @patch("sdlib.cmd.cp.cmd.StorageFactory")
+    def test_resume_upload(self, StorageFactory, SeismicStoreService):
+        sd = SeismicStoreService.return_value
+        sd.dataset_register.return_value = {
+            'tenant': 'tnx01', 'subproject': 'spx01', 'path': '/', 'name': 'data.segy', 'created_date': None,
+            'last_modified_date': None, 'gcsurl': 'bucket/folder', 'access_policy': 'uniform', 'sbit': 'sbit-1'}
+        storage_service = StorageFactory.build.return_value
+        storage_service.upload.side_effect = Exception('connection reset')
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_file = os.path.join(tmpdir, 'data.segy')
+            with open(local_file, 'wb') as fh:
+                fh.write(b'data')
+            args, keyword_args = CMDHelper.getPosAndKeyWordArguments(
+                ['cp', local_file, 'sd://tnx01/spx01/data.segy', '--resume'])
+
+            with patch('sdlib.cmd.cp.cmd.TransferJournal',
+                       side_effect=lambda *args, **kwargs: TransferJournal(*args, journal_dir=tmpdir, **kwargs)), \
+                    patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                with self.assertRaises(Exception):
+                    Cp(MagicMock()).execute(args, keyword_args)
+                # the dataset is kept to be resumed
+                sd.dataset_delete.assert_not_called()
+                self.assertIn('--resume', stdout.getvalue())
+                self.assertIsNotNone(storage_service.upload.call_args[1]['journal'])
+
+                storage_service.upload.side_effect = None
+                storage_service.upload.return_value = {'num_of_objects': 2}
+                Cp(MagicMock()).execute(args, keyword_args)
+                self.assertIn('Resuming the interrupted upload', stdout.getvalue())
+
+            # the dataset is registered once and finalized with the journaled sbit
+            sd.dataset_register.assert_called_once()
+            sd.dataset_patch.assert_called_once_with('sd://tnx01/spx01/data.segy', ANY, 'sbit-1')
+            # the journal is removed once the upload is completed
+            self.assertEqual([name for name in os.listdir(tmpdir) if name.endswith('.json')], [])
+
+    @patch("sdlib.cmd.cp.cmd.SeismicStoreService")
+    @patch("sdlib.cmd.cp.cmd.StorageFactory")
+    def test_resume_download(self, StorageFactory, SeismicStoreService):
+        sd = SeismicStoreService.return_value
+        sd.dataset_lock.return_value = {
+            'tenant': 'tnx01', 'subproject': 'spx01', 'path': '/', 'name': 'data.segy', 'created_date': None,
+            'last_modified_date': None, 'gcsurl': 'bucket/folder', 'access_policy': 'uniform', 'sbit': 'sbit-1',
+            'filemetadata': {'type': 'GENERIC', 'nobjects': 1, 'size': 4}}
+        sd.dataset_get.return_value = sd.dataset_lock.return_value
+        storage_service = StorageFactory.build.return_value
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_file = os.path.join(tmpdir, 'data.segy')
+            with open(local_file, 'wb') as fh:
+                fh.write(b'da')
+
+            # an existing (partial) local file is not overwritten without --force or --resume
+            args, keyword_args = CMDHelper.getPosAndKeyWordArguments(['cp', 'sd://tnx01/spx01/data.segy', local_file])
+            with self.assertRaises(Exception):
+                Cp(MagicMock()).execute(args, keyword_args)
+            storage_service.download.assert_not_called()
+
+            args, keyword_args = CMDHelper.getPosAndKeyWordArguments(
+                ['cp', 'sd://tnx01/spx01/data.segy', local_file, '--resume'])
+            Cp(MagicMock()).execute(args, keyword_args)
+            storage_service.download.assert_called_once_with(local_file, ANY, workers=None, quiet=False, resume=True,
+                                                             tuner=None)
+            sd.dataset_patch.assert_called_once_with('sd://tnx01/spx01/data.segy', None, 'sbit-1')
+
+    @patch("sdlib.cmd.cp.cmd.Config.get_svc_url", return_value='https://host/api/v3')
+    @patch("sdlib.cmd.cp.cmd.TransferTuner")
+    @patch("sdlib.cmd.cp.cmd.SeismicStoreService")
+    @patch("sdlib.cmd.cp.cmd.StorageFactory")
+    def test_auto_tune_download(self, StorageFactory, SeismicStoreService, TransferTuner, get_svc_url):
+        sd = SeismicStoreService.return_value
+        sd.get_cloud_provider.return_value = 'azure'
+        sd.dataset_lock.return_value = {
+            'tenant': 'tnx01', 'subproject': 'spx01', 'path': '/', 'name': 'data.segy', 'created_date': None,
+            'last_modified_date': None, 'gcsurl': 'bucket/folder', 'access_policy': 'uniform', 'sbit': 'sbit-1',
+            'filemetadata': {'type': 'GENERIC', 'nobjects': 1, 'size': 4}}
+        sd.dataset_get.return_value = sd.dataset_lock.return_value
+        storage_service = StorageFactory.build.return_value
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_file = os.path.join(tmpdir, 'data.segy')
+            args, keyword_args = CMDHelper.getPosAndKeyWordArguments(
+                ['cp', 'sd://tnx01/spx01/data.segy', local_file, '--auto-tune', '--workers=2'])
+            Cp(MagicMock()).execute(args, keyword_args)
+
+        # the tuner starts from the command line settings and records the tuned ones once completed
+        TransferTuner.assert_called_once_with('azure', 'https://host/api/v3', 'download', chunk_size=None, workers=2)
+        storage_service.download.assert_called_once_with(local_file, ANY, workers=2, quiet=False, resume=False,
+                                                         tuner=TransferTuner.return_value)
+        TransferTuner.return_value.finish.assert_called_once_with()
+
+    @patch("sdlib.cmd.cp.cmd.SeismicStoreService")
+    @patch("sdlib.cmd.cp.cmd.StorageFactory")
+    def test_max_bandwidth(self, StorageFactory, SeismicStoreService):
+        sd = SeismicStoreService.return_value
+        sd.get_cloud_provider.return_value = 'azure'
+        sd.dataset_lock.return_value = {
+            'tenant': 'tnx01', 'subproject': 'spx01', 'path': '/', 'name': 'data.segy', 'created_date': None,
+            'last_modified_date': None, 'gcsurl': 'bucket/folder', 'access_policy': 'uniform', 'sbit': 'sbit-1',
+            'filemetadata': {'type': 'GENERIC', 'nobjects': 1, 'size': 4}}
+        sd.dataset_get.return_value = sd.dataset_lock.return_value
+        rates = []
+        StorageFactory.build.return_value.download.side_effect = \
+            lambda *args, **kwargs: rates.append(BandwidthLimiter.shared().rate)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_file = os.path.join(tmpdir, 'data.segy')
+            args, keyword_args = CMDHelper.getPosAndKeyWordArguments(
+                ['cp', 'sd://tnx01/spx01/data.segy', local_file, '--max-bandwidth=200MB/s'])
+            Cp(MagicMock()).execute(args, keyword_args)
+
+            # the limit applies to the transfers of the command only
+            self.assertEqual(rates, [200e6])
+            self.assertIsNone(BandwidthLimiter.shared())
+
+            for value in ['--max-bandwidth', '--max-bandwidth=fast']:
+                args, keyword_args = CMDHelper.getPosAndKeyWordArguments(
+                    ['cp', 'sd://tnx01/spx01/data.segy', local_file, value])
+                with self.assertRaises(Exception) as ctx:
+                    Cp(MagicMock()).execute(args, keyword_args)
+                self.assertIn('max-bandwidth', str(ctx.exception))
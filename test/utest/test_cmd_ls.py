@@ -14,6 +14,7 @@
 # limitations under the License.
 
 
+import io
 import sys
 import os
 from mock import patch
@@ -25,9 +26,11 @@ sys.path.append(
                     os.path.abspath(__file__)))))
 
 from sdlib.cmd.ls.cmd import Ls
+from sdlib.cmd.helper import CMDHelper
 from sdlib.cmd.keyword_args import KeywordArguments
 
 from test.utest import SdUtilTestCase
+from test.utest.test_api_ls_walker import FakeSeismicStore
 
 
 class TestCmdLs(SdUtilTestCase):
@@ -42,7 +45,41 @@ class TestCmdLs(SdUtilTestCase):
             with self.assertRaises(Exception):
                 cmd.execute(args, KeywordArguments())
 
-            with patch('sdlib.api.seismic_store_service.SeismicStoreService.status', return_value=[None, {'Service-Provider': 'any'}]):
+            with patch('sdlib.api.seismic_store_service.SeismicStoreService.get_service_provider', return_value='any'):
                 with patch('sdlib.api.seismic_store_service.SeismicStoreService.ls', return_value=['item']):
                     args = ['sd://tnx01/spx01/a/b/c/dsx01']
                     cmd.execute(args, KeywordArguments())
+
+    def _ls(self, provider, *flags):
+        svc = FakeSeismicStore()
+        with patch('sdlib.api.seismic_store_service.SeismicStoreService.get_service_provider', return_value=provider), \
+                patch('sdlib.api.seismic_store_service.SeismicStoreService.ls', side_effect=svc.ls), \
+                patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            args, keyword_args = CMDHelper.getPosAndKeyWordArguments(['ls', 'sd://tnx01/spx01'] + list(flags))
+            Ls(None).execute(args, keyword_args)
+        return stdout.getvalue().split('\n')
+
+    def test_execute_recursive(self):
+        expected = ['', 'sd://tnx01/spx01/a/', 'd1', 'd2', 'sd://tnx01/spx01/b/', 'sd://tnx01/spx01/b/y/', 'z',
+                    'x', 'ds1', 'ds2', 'ds3', '']
+        self.assertEqual(self._ls('azure', '-r', '--sorted'), expected)
+
+        # streamed output: the folders interleave, every item is printed with its folder, in arrival order
+        self.assertEqual(sorted(self._ls('azure', '-r', '--workers=4')),
+                         sorted(['', 'sd://tnx01/spx01/a/', 'sd://tnx01/spx01/a/d1', 'sd://tnx01/spx01/a/d2',
+                                 'sd://tnx01/spx01/b/', 'sd://tnx01/spx01/b/y/', 'sd://tnx01/spx01/b/y/z',
+                                 'sd://tnx01/spx01/b/x', 'sd://tnx01/spx01/ds1', 'sd://tnx01/spx01/ds2',
+                                 'sd://tnx01/spx01/ds3', '']))
+
+        self.assertEqual(self._ls('azure', '-lr', '--sorted'),
+                         ['', 'sd://tnx01/spx01/a/d1', 'sd://tnx01/spx01/a/d2', 'sd://tnx01/spx01/b/y/z',
+                          'sd://tnx01/spx01/b/x', 'sd://tnx01/spx01/ds1', 'sd://tnx01/spx01/ds2',
+                          'sd://tnx01/spx01/ds3', ''])
+
+        # non azure providers separate the sub-folders trees
+        self.assertEqual(self._ls('google', '-r', '--sorted'),
+                         ['', 'sd://tnx01/spx01/a/', 'd1', 'd2', '', 'sd://tnx01/spx01/b/', 'sd://tnx01/spx01/b/y/',
+                          'z', '', 'x', '', 'ds1', 'ds2', 'ds3', ''])
+
+        with self.assertRaises(Exception):
+            self._ls('azure', '-r', '--workers=0')
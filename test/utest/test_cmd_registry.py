@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from mock import patch
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.cmd.registry import CommandRegistry
+
+
+class TestCmdRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index_file = os.path.join(self.tmpdir.name, CommandRegistry.INDEX_FILE)
+        for name in ('aa', 'bb'):
+            self.register(name, name + ' description')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        CommandRegistry.clear()
+
+    def register(self, name, description):
+        os.makedirs(os.path.join(self.tmpdir.name, name), exist_ok=True)
+        with open(os.path.join(self.tmpdir.name, name, 'reg.json'), 'w') as fh:
+            json.dump({'name': name, 'description': description, 'help': []}, fh)
+
+    def test_index(self):
+        with patch.object(CommandRegistry, 'cmd_dir', return_value=self.tmpdir.name):
+            commands = CommandRegistry.load(self.index_file)
+            self.assertEqual(sorted(commands), ['aa', 'bb'])
+            self.assertTrue(os.path.isfile(self.index_file))
+
+            # served from the index while the registrations are unchanged
+            with patch.object(CommandRegistry, 'build') as build:
+                self.assertEqual(CommandRegistry.load(self.index_file), commands)
+                build.assert_not_called()
+
+            # rebuilt when a registration changes or a command is added
+            self.register('aa', 'aa changed description')
+            self.assertEqual(CommandRegistry.load(self.index_file)['aa']['description'], 'aa changed description')
+            self.register('cc', 'cc description')
+            self.assertEqual(sorted(CommandRegistry.load(self.index_file)), ['aa', 'bb', 'cc'])
+
+    def test_corrupted_index(self):
+        with open(self.index_file, 'wb') as fh:
+            fh.write(b'not a pickle')
+        with patch.object(CommandRegistry, 'cmd_dir', return_value=self.tmpdir.name):
+            self.assertEqual(sorted(CommandRegistry.load(self.index_file)), ['aa', 'bb'])
+
+    def test_commands(self):
+        commands = CommandRegistry.commands()
+        self.assertIn('cp', commands)
+        self.assertIs(CommandRegistry.commands(), commands)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from mock import patch
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.cmd.keyword_args import KeywordArguments
+from sdlib.cmd.serve.client import DaemonClient
+from sdlib.cmd.serve.cmd import Serve
+
+from test.utest import SdUtilTestCase
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'requires Unix domain sockets')
+class TestCmdServe(SdUtilTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, DaemonClient.SOCKET)
+        self.keyword_args = KeywordArguments()
+        self.keyword_args.socket = self.socket_path
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def start_daemon(self):
+        daemon = threading.Thread(target=Serve('auth').execute, args=([], self.keyword_args))
+        daemon.start()
+        client = DaemonClient(self.socket_path)
+        for _ in range(100):
+            if client.request({'op': 'ping'}) is not None:
+                break
+            time.sleep(0.05)
+        return daemon, client
+
+    def test_forwardable(self):
+        self.assertTrue(DaemonClient.forwardable('stat', KeywordArguments()))
+        self.assertFalse(DaemonClient.forwardable('cp', KeywordArguments()))
+        # prompts for the storage class and the access policy: run locally
+        self.assertFalse(DaemonClient.forwardable('mk', KeywordArguments()))
+        keyword_args = KeywordArguments()
+        keyword_args.idtoken = 'token'
+        self.assertFalse(DaemonClient.forwardable('ls', keyword_args))
+        # the options read but never given do not count
+        keyword_args = KeywordArguments()
+        self.assertIsNone(keyword_args.no_cache)
+        self.assertTrue(DaemonClient.forwardable('stat', keyword_args))
+        # the recursive listings are printed as they go: run locally
+        for option in ('r', 'recursive', 'lr', 'rl'):
+            keyword_args = KeywordArguments()
+            setattr(keyword_args, option, True)
+            self.assertFalse(DaemonClient.forwardable('ls', keyword_args))
+        keyword_args = KeywordArguments()
+        keyword_args.l = True
+        self.assertTrue(DaemonClient.forwardable('ls', keyword_args))
+
+    def test_credentials_reloaded(self):
+        credentials_file = os.path.join(self.tmpdir.name, Serve.CREDENTIALS_FILE)
+        with open(credentials_file, 'w') as fh:
+            fh.write('token-1')
+        serve = Serve('auth')
+        serve.watch_credentials(credentials_file)
+        with patch('sdlib.cmd.serve.cmd.AuthFactory') as AuthFactory, \
+                patch('sdlib.cmd.serve.cmd.Config.get_auth_provider', return_value='default'):
+            AuthFactory.build.side_effect = ['auth-2', 'auth-3']
+            serve.check_credentials()
+            AuthFactory.build.assert_not_called()
+
+            # logged in again
+            with open(credentials_file, 'w') as fh:
+                fh.write('token-22')
+            serve.check_credentials()
+            serve.check_credentials()
+            AuthFactory.build.assert_called_once_with('default', None)
+            self.assertEqual(serve._batch._auth, 'auth-2')
+
+            # logged out
+            os.remove(credentials_file)
+            serve.check_credentials()
+            self.assertEqual(serve._batch._auth, 'auth-3')
+
+    def test_no_daemon(self):
+        client = DaemonClient(self.socket_path)
+        self.assertIsNone(client.forward(['stat', 'sd://tnx01']))
+        # stale socket file
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.socket_path)
+        stale.close()
+        self.assertIsNone(client.forward(['stat', 'sd://tnx01']))
+
+    def test_serve(self):
+        calls = []
+
+        def dataset_unlock(svc, sdpath):
+            calls.append((svc._auth, sdpath))
+
+        with patch('sdlib.api.seismic_store_service.SeismicStoreService.dataset_unlock', dataset_unlock):
+            daemon, client = self.start_daemon()
+            try:
+                output, error = client.forward(['unlock', 'sd://tnx01/spx01/a/dsx01'])
+                self.assertIsNone(error)
+                self.assertIn('OK', output)
+
+                output, error = client.forward(['unlock', 'sd://tnx01'])
+                self.assertIn('not a valid seismic store dataset path', error)
+
+                output, error = client.forward(['cp', 'a', 'sd://tnx01/spx01/a'])
+                self.assertIn('only runs', error)
+
+                self.assertEqual(client.request({'op': 'ping'})['served'], 2)
+            finally:
+                Serve(None).execute(['stop'], self.keyword_args)
+                daemon.join(10)
+
+        self.assertFalse(daemon.is_alive())
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.assertEqual(calls, [('auth', 'sd://tnx01/spx01/a/dsx01')])
+        with self.assertRaises(Exception):
+            Serve(None).execute(['status'], self.keyword_args)
@@ -14,12 +14,16 @@
 # limitations under the License.
 
 from sdlib.api.dataset import Dataset
+from sdlib.api.seismic_store_service import SeismicStoreService
 from sdlib.cmd.stat.cmd import Stat
 from sdlib.cmd.keyword_args import KeywordArguments
+from sdlib.shared.dataset_cache import DatasetCache
+import io
 import sys
 import os
+import tempfile
 
-from mock import patch
+from mock import patch, Mock
 
 sys.path.append(
     os.path.dirname(
@@ -94,3 +98,39 @@ class TestCmdStat(SdUtilTestCase):
                     ds.dstype = None
                     args = ['sd://tnx01/spx01/a/b/c/dsx01']
                     cmd.execute(args, KeywordArguments())
+
+    @patch('sdlib.shared.http_session.HttpSession.get')
+    def test_dataset_cached(self, mock_request_get):
+        record = {'tenant': 'tnx01', 'subproject': 'spx01', 'path': '/a/', 'name': 'dsx01', 'gcsurl': 'location',
+                  'created_by': 'me@domain.com', 'created_date': '01 Jan 2018', 'last_modified_date': '01 Jan 2018',
+                  'access_policy': 'uniform', 'filemetadata': {'size': 1024},
+                  'sbit': 'R1', 'sbit_count': 2}
+        response = Mock(status_code=200)
+        response.json = lambda: dict(record)
+        mock_request_get.return_value = response
+        auth = Mock()
+        auth.get_id_token = lambda: 'id-token'
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            SeismicStoreService._dataset_cache = DatasetCache(cache_file=os.path.join(tmpdir, DatasetCache.CACHE_FILE))
+            try:
+                with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                    Stat(auth).execute(['sd://tnx01/spx01/a/dsx01'], KeywordArguments())
+                    Stat(auth).execute(['sd://tnx01/spx01/a/dsx01'], KeywordArguments())
+                # the second stat is served from the cache
+                self.assertEqual(mock_request_get.call_count, 1)
+                self.assertEqual(stdout.getvalue().count('Size: 1.0 KB'), 2)
+
+                keyword_args = KeywordArguments()
+                keyword_args.d = True
+                with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                    Stat(auth).execute(['sd://tnx01/spx01/a/dsx01'], keyword_args)
+                    record['sbit_count'] = 3
+                    Stat(auth).execute(['sd://tnx01/spx01/a/dsx01'], keyword_args)
+                # the lock state displayed is always read, with the light record
+                self.assertEqual([call[1]['params']['seismicmeta'] for call in mock_request_get.call_args_list],
+                                 ['false', 'true', 'false'])
+                self.assertIn('Lock Counter: 2', stdout.getvalue())
+                self.assertIn('Lock Counter: 3', stdout.getvalue())
+            finally:
+                SeismicStoreService._dataset_cache = None
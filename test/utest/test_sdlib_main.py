@@ -41,3 +41,15 @@ class TestSdlibMain(SdUtilTestCase):
             with patch.object(sys, 'argv', ['sdutil', 'statusx']):
                 sdlib.__main__.main()
 
+
+    def test_forward_to_daemon(self):
+        with patch('sdlib.cmd.serve.client.DaemonClient.forward', return_value=('listed\n', None)) as forward, \
+                patch('sdlib.shared.config.Config.load') as load:
+            with patch.object(sys, 'argv', ['sdutil', 'ls', 'sd://tnx01']):
+                self.assertEqual(sdlib.__main__.main(), 0)
+            forward.assert_called_once_with(['ls', 'sd://tnx01'])
+            load.assert_not_called()
+
+        with patch('sdlib.cmd.serve.client.DaemonClient.forward', return_value=('', 'failed')):
+            with patch.object(sys, 'argv', ['sdutil', 'ls', 'sd://tnx01']):
+                self.assertEqual(sdlib.__main__.main(), 1)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import stat
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.shared.atomic_file import atomic_write
+
+
+class TestSharedAtomicFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'sdcfg', 'state.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_write(self):
+        atomic_write(self.filename, lambda fh: json.dump({'a': 1}, fh))
+        with open(self.filename) as fh:
+            self.assertEqual(json.load(fh), {'a': 1})
+        self.assertEqual(stat.S_IMODE(os.stat(self.filename).st_mode), 0o600)
+
+        atomic_write(self.filename, lambda fh: fh.write(b'index'), binary=True, mode=0o644)
+        with open(self.filename, 'rb') as fh:
+            self.assertEqual(fh.read(), b'index')
+        self.assertEqual(stat.S_IMODE(os.stat(self.filename).st_mode), 0o644)
+
+    def test_failed_write(self):
+        atomic_write(self.filename, lambda fh: fh.write('kept'))
+
+        def dump(fh):
+            fh.write('partial')
+            raise ValueError('not serializable')
+        with self.assertRaises(ValueError):
+            atomic_write(self.filename, dump)
+        with open(self.filename) as fh:
+            self.assertEqual(fh.read(), 'kept')
+        self.assertEqual(os.listdir(os.path.dirname(self.filename)), ['state.json'])
+
+    def test_concurrent_writers(self):
+        errors = []
+
+        def write(index):
+            try:
+                for _ in range(50):
+                    atomic_write(self.filename, lambda fh: json.dump({'writer': index}, fh))
+            except Exception as ex:  # pylint: disable=W0703
+                errors.append(ex)
+        threads = [threading.Thread(target=write, args=(index,)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(os.path.dirname(self.filename)), ['state.json'])
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import sys
+import tempfile
+from mock import patch
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.shared.config import Config
+
+from test.utest import SdUtilTestCase
+
+CONFIG_YAML = '''
+seistore:
+    service: '{"provider": {"env": {"url": "%s", "appkey": ""}, "env2": {"url": "https://env2", "appkey": ""}}}'
+auth_provider:
+    oauth2: '{}'
+'''
+
+
+class TestSharedConfig(SdUtilTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config_file = os.path.join(self.tmpdir.name, 'config.yaml')
+        self.write_config('https://env')
+        self.write_user_config('env')
+        self.patches = [patch.dict(os.environ, {'HOME': self.tmpdir.name}),
+                        patch.object(Config, '_configuration_file', return_value=self.config_file)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.tmpdir.cleanup()
+        # back to the configuration of the other tests
+        SdUtilTestCase.setUpClass()
+
+    def write_config(self, url):
+        with open(self.config_file, 'w') as fh:
+            fh.write(CONFIG_YAML % url)
+
+    def write_user_config(self, env):
+        os.makedirs(os.path.join(self.tmpdir.name, Config.HOME), exist_ok=True)
+        with open(os.path.join(self.tmpdir.name, Config.HOME, Config.CONFIG_FILE), 'w') as fh:
+            json.dump({'env': env, 'appkey': 'key', 'cloudprovider': 'provider'}, fh)
+
+    def test_snapshot(self):
+        Config.load()
+        Config.load_user_config()
+        self.assertEqual(Config.get_svc_url(), 'https://env')
+        self.assertTrue(os.path.isfile(os.path.join(self.tmpdir.name, Config.HOME, Config.SNAPSHOT_FILE)))
+
+        # served from the snapshot: yaml is not even imported
+        with patch.dict(sys.modules, {'yaml': None}):
+            Config.load()
+            Config.load_user_config()
+        self.assertEqual(Config.get_svc_url(), 'https://env')
+        self.assertEqual(Config.get_svc_appkey(), 'key')
+        self.assertEqual(Config.get_auth_provider(), 'oauth2')
+
+        # the user configuration changed: validated again
+        self.write_user_config('env2')
+        with patch.dict(sys.modules, {'yaml': None}):
+            Config.load()
+            Config.load_user_config()
+        self.assertEqual(Config.get_svc_url(), 'https://env2')
+
+        # the main configuration changed: parsed again
+        self.write_config('https://env-updated-url')
+        self.write_user_config('env')
+        Config.load()
+        Config.load_user_config()
+        self.assertEqual(Config.get_svc_url(), 'https://env-updated-url')
+
+    def test_invalid_user_configuration(self):
+        Config.load()
+        Config.load_user_config()
+        self.write_user_config('unknown')
+        Config.load()
+        with self.assertRaises(Exception):
+            Config.load_user_config()
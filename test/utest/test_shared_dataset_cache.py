@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import stat
+import sys
+import tempfile
+import time
+from mock import patch
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.shared.dataset_cache import DatasetCache
+from sdlib.shared.sdpath import SDPath
+
+from test.utest import SdUtilTestCase
+
+
+class TestSharedDatasetCache(SdUtilTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmpdir.name, 'sdcfg', DatasetCache.CACHE_FILE)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_persisted(self):
+        scope = DatasetCache.scope(SDPath('sd://tnx01/spx01/a/dsx01'))
+        cache = DatasetCache(cache_file=self.cache_file)
+        self.assertIsNone(cache.get(scope, None))
+        cache.put(scope, None, '{"name": "dsx01"}')
+        self.assertEqual(cache.get(scope, None), '{"name": "dsx01"}')
+        self.assertIsNone(cache.get(scope, 'true'))
+        self.assertEqual(stat.S_IMODE(os.stat(self.cache_file).st_mode), 0o600)
+
+        # shared across invocations
+        self.assertEqual(DatasetCache(cache_file=self.cache_file).get(scope, None), '{"name": "dsx01"}')
+
+    def test_expiry(self):
+        scope = DatasetCache.scope(SDPath('sd://tnx01/spx01/a/dsx01'))
+        cache = DatasetCache(ttl=10, cache_file=self.cache_file)
+        cache.put(scope, None, '{}')
+        with patch('time.time', return_value=time.time() + 20):
+            self.assertIsNone(cache.get(scope, None))
+            self.assertIsNone(DatasetCache(ttl=10, cache_file=self.cache_file).get(scope, None))
+        # disabled
+        cache = DatasetCache(ttl=0, cache_file=self.cache_file)
+        cache.put(scope, None, '{}')
+        self.assertIsNone(cache.get(scope, None))
+
+    def test_lru(self):
+        cache = DatasetCache(cache_file=self.cache_file, memory_entries=2)
+        for name in ('dsx01', 'dsx02', 'dsx03'):
+            cache.put(DatasetCache.scope(SDPath('sd://tnx01/spx01/a/' + name)), None, name)
+        self.assertEqual(len(cache._memory), 2)
+        # evicted from the memory, still in the database
+        self.assertEqual(cache.get(DatasetCache.scope(SDPath('sd://tnx01/spx01/a/dsx01')), None), 'dsx01')
+
+    def test_invalidate(self):
+        cache = DatasetCache(cache_file=self.cache_file)
+        scopes = [DatasetCache.scope(SDPath(sdpath)) for sdpath in
+                  ('sd://tnx01/spx01/a/dsx01', 'sd://tnx01/spx01/b/dsx02', 'sd://tnx01/spx02/a/dsx01')]
+        for scope in scopes:
+            cache.put(scope, None, 'record')
+            cache.put(scope, 'true', 'record')
+
+        cache.invalidate(scopes[0])
+        self.assertIsNone(cache.get(scopes[0], None))
+        self.assertIsNone(cache.get(scopes[0], 'true'))
+        self.assertEqual(cache.get(scopes[1], None), 'record')
+
+        cache.invalidate(DatasetCache.subproject_scope('tnx01', 'spx01'))
+        other = DatasetCache(cache_file=self.cache_file)
+        self.assertIsNone(other.get(scopes[1], None))
+        self.assertEqual(other.get(scopes[2], None), 'record')
+
+        cache.clear()
+        self.assertFalse(os.path.exists(self.cache_file))
+        self.assertIsNone(cache.get(scopes[2], None))
+
+    def test_unusable_database(self):
+        with open(os.path.join(self.tmpdir.name, 'corrupted.db'), 'w') as fh:
+            fh.write('not a database')
+        cache = DatasetCache(cache_file=os.path.join(self.tmpdir.name, 'corrupted.db'))
+        scope = DatasetCache.scope(SDPath('sd://tnx01/spx01/a/dsx01'))
+        cache.put(scope, None, 'record')
+        # served from the memory
+        self.assertEqual(cache.get(scope, None), 'record')
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import sys
+import threading
+from mock import patch, Mock
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.shared.http_session import HttpSession
+from sdlib.shared.tracer import Tracer
+
+from test.utest import SdUtilTestCase
+
+
+class TestSharedHttpSession(SdUtilTestCase):
+
+    def setUp(self):
+        HttpSession.close()
+
+    def tearDown(self):
+        HttpSession.close()
+        Tracer.stop()
+
+    def test_shared_session(self):
+        sessions = []
+        threads = [threading.Thread(target=lambda: sessions.append(HttpSession.session())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(id(session) for session in sessions)), 1)
+
+        adapter = sessions[0].get_adapter('https://www.googleapis.com')
+        self.assertEqual(adapter._pool_maxsize, 16)
+        self.assertIs(adapter, sessions[0].get_adapter('http://localhost'))
+
+    @patch('requests.Session.request')
+    def test_request_defaults(self, mock_request):
+        HttpSession.get('https://host/api', headers={'k': 'v'})
+        mock_request.assert_called_once_with('GET', 'https://host/api', headers={'k': 'v'}, verify=True, timeout=300)
+
+        mock_request.reset_mock()
+        HttpSession.put('https://host/api', data=b'x', timeout=10)
+        mock_request.assert_called_once_with('PUT', 'https://host/api', data=b'x', verify=True, timeout=10)
+
+    @patch('sdlib.shared.config.Config.get_ssl_verify', return_value=False)
+    @patch('sdlib.shared.config.Config.get_svc_url', return_value='https://svc/api/v3')
+    def test_ssl_verify(self, mock_svc_url, mock_ssl_verify):
+        # disabled for a self-signed seismic store endpoint only, never for the storage endpoints
+        self.assertFalse(HttpSession.ssl_verify('https://svc/api/v3/dataset/tenant/t1'))
+        self.assertTrue(HttpSession.ssl_verify('https://www.googleapis.com/storage/v1/b/bucket/o/a'))
+
+    @patch('requests.Session.request')
+    def test_traced_request(self, mock_request):
+        resp = Mock(status_code=200, content=b'{"name": "a"}', headers={})
+        resp.request.body = b'{}'
+        resp.elapsed.total_seconds.return_value = 0.25
+        mock_request.return_value = resp
+        Tracer.start()
+        self.assertIs(HttpSession.get('https://host/api/v3/dataset/tenant/t1/subproject/s1/dataset/a?path=%2F'),
+                      resp)
+
+        mock_request.side_effect = ValueError()
+        with self.assertRaises(ValueError):
+            HttpSession.delete('https://host/api/v3/dataset/tenant/t1/subproject/s1/dataset/a')
+
+        events = Tracer.events()
+        endpoint = 'host/api/v3/dataset/tenant/{tenant}/subproject/{subproject}/dataset/{dataset}'
+        self.assertEqual(events[0]['name'], 'GET ' + endpoint)
+        self.assertEqual(events[0]['cat'], 'http')
+        self.assertEqual(events[0]['args'], {'method': 'GET', 'endpoint': endpoint, 'status': 200, 'bytes_sent': 2,
+                                             'bytes_received': 13, 'ttfb_ms': 250.0})
+        self.assertEqual(events[1]['args'], {'method': 'DELETE', 'endpoint': endpoint, 'error': 'ValueError'})
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import io
+import os
+import pstats
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.shared.profiler import Profiler
+
+
+def _worker_function():
+    return sum(range(1000))
+
+
+class TestSharedProfiler(unittest.TestCase):
+
+    def test_threads_profiled(self):
+        profiler = Profiler()
+        with profiler:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                list(executor.map(lambda _: _worker_function(), range(4)))
+        functions = [function for _, _, function in profiler.stats().stats]
+        self.assertIn('_worker_function', functions)
+
+    def test_report(self):
+        profiler = Profiler()
+        with profiler:
+            _worker_function()
+        stream = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'sdutil.prof')
+            profiler.report(filename, 5, stream)
+            functions = [function for _, _, function in pstats.Stats(filename).stats]
+        self.assertIn('_worker_function', functions)
+        output = stream.getvalue()
+        self.assertIn('wall time', output)
+        self.assertIn('cpu time', output)
+        self.assertIn('peak memory', output)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import calendar
+import json
+import os
+import stat
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.shared.token_cache import StorageTokenCache
+
+
+class TestSharedTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmpdir.name, 'sdcfg', StorageTokenCache.CACHE_FILE)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_sas_expiry(self):
+        sas = 'https://account.blob.core.windows.net/container?sv=2020-08-04&se=2030-01-02T03%3A04%3A05Z&sig=xx'
+        self.assertEqual(StorageTokenCache.token_expiry(sas),
+                         calendar.timegm((2030, 1, 2, 3, 4, 5, 0, 0, 0)))
+        self.assertEqual(StorageTokenCache.token_expiry('se=2030-01-02&sp=r'),
+                         calendar.timegm((2030, 1, 2, 0, 0, 0, 0, 0, 0)))
+        self.assertIsNone(StorageTokenCache.token_expiry('ya29.opaque-token'))
+        self.assertIsNone(StorageTokenCache.token_expiry('key:secret:session'))
+
+    def test_keyed_entries(self):
+        cache = StorageTokenCache(cache_file=self.cache_file)
+        key_ro = StorageTokenCache.key('tnx01', 'spx01', True, None, None)
+        key_rw = StorageTokenCache.key('tnx01', 'spx01', False, None, None)
+        cache.put(key_ro, 'token-ro')
+        cache.put(key_rw, 'token-rw')
+        self.assertEqual(cache.get(key_ro), 'token-ro')
+        self.assertEqual(cache.get(key_rw), 'token-rw')
+        self.assertIsNone(cache.get(StorageTokenCache.key('tnx01', 'spx02', True, None, None)))
+        # not persisted unless required
+        self.assertFalse(os.path.exists(self.cache_file))
+
+    def test_expiry(self):
+        cache = StorageTokenCache(ttl=30, cache_file=self.cache_file)
+        # ttl shorter than the safety margin: never served
+        cache.put('k1', 'opaque-token')
+        self.assertIsNone(cache.get('k1'))
+        # expiry from the service response
+        cache.put('k2', 'opaque-token', expires_in=3600)
+        self.assertEqual(cache.get('k2'), 'opaque-token')
+        # expiry from the token itself prevails
+        cache.put('k3', 'sv=1&se=2000-01-01T00%3A00%3A00Z&sig=x', expires_in=3600)
+        self.assertIsNone(cache.get('k3'))
+
+    def test_persistence(self):
+        cache = StorageTokenCache(persist=True, cache_file=self.cache_file)
+        cache.put('key', 'token')
+        self.assertEqual(stat.S_IMODE(os.stat(self.cache_file).st_mode), 0o600)
+
+        other = StorageTokenCache(persist=True, cache_file=self.cache_file)
+        self.assertEqual(other.get('key'), 'token')
+
+        other.clear()
+        self.assertFalse(os.path.exists(self.cache_file))
+        self.assertIsNone(StorageTokenCache(persist=True, cache_file=self.cache_file).get('key'))
+
+    def test_expired_entries_not_loaded(self):
+        cache = StorageTokenCache(persist=True, cache_file=self.cache_file)
+        cache.put('key', 'sv=1&se=' + time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() + 3600)))
+        cache.put('old', 'sv=1&se=2000-01-01&sig=x')
+        other = StorageTokenCache(persist=True, cache_file=self.cache_file)
+        other.get('key')
+        self.assertEqual(list(other._tokens.keys()), ['key'])
+
+
+    def test_corrupted_file(self):
+        os.makedirs(os.path.dirname(self.cache_file))
+        future = time.time() + 3600
+        for content in ['{not json', '["token"]',
+                        json.dumps({'bad': 'token', 'no-expiry': {'token': 't'}, 'key': {'token': 't', 'expires': future}})]:
+            with open(self.cache_file, 'w') as fh:
+                fh.write(content)
+            cache = StorageTokenCache(persist=True, cache_file=self.cache_file)
+            self.assertIsNone(cache.get('bad'))
+            self.assertIsNone(cache.get('no-expiry'))
+        # the valid entries of a partially corrupted file are kept
+        self.assertEqual(cache.get('key'), 't')
+        cache.put('other', 'token')
+        self.assertEqual(StorageTokenCache(persist=True, cache_file=self.cache_file).get('other'), 'token')
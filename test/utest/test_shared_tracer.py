@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.shared.tracer import Tracer, TracedCalls
+
+
+class _Auth(object):
+    name = 'auth'
+
+    def refresh(self):
+        return 'token'
+
+    def fail(self):
+        raise ValueError('expired')
+
+
+class TestSharedTracer(unittest.TestCase):
+
+    def tearDown(self):
+        Tracer.stop()
+
+    def test_disabled(self):
+        self.assertFalse(Tracer.enabled())
+        with Tracer.span('op', 'test') as span:
+            span.set(status=200)
+        Tracer.add('op', 'test', 0.0, 1.0)
+        self.assertEqual(Tracer.events(), [])
+        auth = _Auth()
+        self.assertIs(TracedCalls.wrap(auth, 'auth'), auth)
+
+    def test_span(self):
+        Tracer.start()
+        with Tracer.span('op', 'test', index=1) as span:
+            span.set(status=200)
+        with self.assertRaises(ValueError):
+            with Tracer.span('failed', 'test'):
+                raise ValueError()
+        events = Tracer.events()
+        self.assertEqual([event['name'] for event in events], ['op', 'failed'])
+        self.assertEqual(events[0]['ph'], 'X')
+        self.assertEqual(events[0]['cat'], 'test')
+        self.assertEqual(events[0]['args'], {'index': 1, 'status': 200})
+        self.assertGreaterEqual(events[0]['dur'], 0)
+        self.assertEqual(events[1]['args'], {'error': 'ValueError'})
+
+    def test_traced_calls(self):
+        Tracer.start()
+        auth = TracedCalls.wrap(_Auth(), 'auth')
+        self.assertEqual(auth.name, 'auth')
+        self.assertEqual(auth.refresh(), 'token')
+        with self.assertRaises(ValueError):
+            auth.fail()
+        events = Tracer.events()
+        self.assertEqual([event['name'] for event in events], ['_Auth.refresh', '_Auth.fail'])
+        self.assertEqual(events[1]['args'], {'error': 'ValueError'})
+
+    def test_save(self):
+        Tracer.start()
+        thread = threading.Thread(target=lambda: Tracer.add('op', 'test', 0.0, 0.5), name='worker-1')
+        thread.start()
+        thread.join()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'trace.json')
+            Tracer.save(filename)
+            with open(filename) as fh:
+                trace = json.load(fh)
+        events = trace['traceEvents']
+        self.assertEqual(events[0]['ph'], 'M')
+        self.assertEqual(events[0]['args'], {'name': 'worker-1'})
+        self.assertEqual(events[1]['name'], 'op')
+        self.assertEqual(events[1]['tid'], events[0]['tid'])
+
+    def test_endpoint(self):
+        self.assertEqual(
+            Tracer.endpoint('https://svc/api/v3/dataset/tenant/t1/subproject/s1/dataset/a.segy?path=%2Fa%2F'),
+            'svc/api/v3/dataset/tenant/{tenant}/subproject/{subproject}/dataset/{dataset}')
+        self.assertEqual(Tracer.endpoint('https://svc/api/v3/utility/gcs-access-token?sdpath=sd://t1/s1'),
+                         'svc/api/v3/utility/gcs-access-token')
+        self.assertEqual(Tracer.endpoint('https://www.googleapis.com/storage/v1/b/bucket/o/a%2F0?alt=media'),
+                         'www.googleapis.com/storage/v1/b/{bucket}/o/{object}')
+        self.assertEqual(Tracer.endpoint('https://bucket.storage.googleapis.com/a/0'),
+                         '{bucket}.storage.googleapis.com/{object}')
+        self.assertEqual(Tracer.endpoint('https://svc/api/v3/operation/bulk-delete/0123456789abcdef0123'),
+                         'svc/api/v3/operation/bulk-delete/{id}')
+
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.shared.transfer_journal import TransferJournal
+
+
+class TestSharedTransferJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.journal_dir = os.path.join(self.tmpdir.name, 'transfers')
+        self.local_file = os.path.join(self.tmpdir.name, 'data.segy')
+        with open(self.local_file, 'wb') as fh:
+            fh.write(b'data')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def journal(self, sdpath='sd://tnx01/spx01/data.segy'):
+        return TransferJournal('upload', sdpath, self.local_file, self.journal_dir)
+
+    def test_record_and_load(self):
+        self.assertIsNone(self.journal().load())
+
+        journal = self.journal()
+        journal.start(dataset={'name': 'data.segy'}, sbit='sbit')
+        journal.update(chunk_size=32)
+        journal.record('objects', 0, 'md5-0')
+        journal.record('objects', 1, 'md5-1')
+
+        state = self.journal().load()
+        self.assertEqual(state['sbit'], 'sbit')
+        self.assertEqual(state['chunk_size'], 32)
+        self.assertEqual(state['objects'], {'0': 'md5-0', '1': 'md5-1'})
+        self.assertEqual(state['source'], journal.fingerprint())
+        self.assertIsNone(self.journal('sd://tnx01/spx01/other.segy').load())
+        self.assertEqual(len(os.listdir(self.journal_dir)), 1)
+        journal_file = os.path.join(self.journal_dir, os.listdir(self.journal_dir)[0])
+        self.assertEqual(stat.S_IMODE(os.stat(journal_file).st_mode), 0o600)
+
+        resumed = self.journal()
+        resumed.load()
+        self.assertEqual(resumed.get('objects', 1), 'md5-1')
+        self.assertIsNone(resumed.get('objects', 2))
+
+        resumed.remove()
+        self.assertIsNone(self.journal().load())
+
+    def test_fingerprint_changes_with_content(self):
+        journal = self.journal()
+        journal.start()
+        with open(self.local_file, 'ab') as fh:
+            fh.write(b'more data')
+        self.assertNotEqual(self.journal().load()['source'], journal.fingerprint())
+
+    def test_corrupted(self):
+        self.journal().start()
+        journal_file = os.path.join(self.journal_dir, os.listdir(self.journal_dir)[0])
+        with open(journal_file, 'w') as fh:
+            fh.write('{not json')
+        self.assertIsNone(self.journal().load())
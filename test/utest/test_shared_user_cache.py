@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017-2024, Schlumberger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import stat
+import sys
+import tempfile
+import threading
+import unittest
+from mock import patch
+
+sys.path.append(
+    os.path.dirname(
+        os.path.dirname(
+            os.path.dirname(
+                os.path.abspath(__file__)))))
+
+from sdlib.shared.user_cache import UserCache
+
+
+class TestSharedUserCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmpdir.name, 'sdcfg')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_put_get(self):
+        cache = UserCache('test', self.cache_dir)
+        self.assertIsNone(cache.get('key'))
+        cache.put('key', {'a': 1}, ttl=60)
+        cache.put('forever', 'value')
+        self.assertEqual(UserCache('test', self.cache_dir).get('key'), {'a': 1})
+        self.assertEqual(UserCache('test', self.cache_dir).get('forever'), 'value')
+        self.assertIsNone(UserCache('other', self.cache_dir).get('key'))
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.join(self.cache_dir, 'test.json')).st_mode), 0o600)
+
+        cache.remove('key')
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.get('forever'), 'value')
+
+    def test_expiry(self):
+        cache = UserCache('test', self.cache_dir)
+        cache.put('key', 'value', ttl=60)
+        with patch('sdlib.shared.user_cache.time.time', return_value=10 ** 10):
+            self.assertIsNone(cache.get('key'))
+
+    def test_corrupted(self):
+        os.makedirs(self.cache_dir)
+        with open(os.path.join(self.cache_dir, 'test.json'), 'w') as fh:
+            fh.write('{not json')
+        cache = UserCache('test', self.cache_dir)
+        self.assertIsNone(cache.get('key'))
+        cache.put('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+
+    def test_concurrent_put(self):
+        def put(thread):
+            cache = UserCache('test', self.cache_dir)
+            for index in range(50):
+                cache.put(str(thread) + '-' + str(index), index)
+        threads = [threading.Thread(target=put, args=(thread,)) for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cache = UserCache('test', self.cache_dir)
+        self.assertEqual(cache.get('3-49'), 49)
+        self.assertEqual(len(cache._load()), 200)
+        self.assertEqual(os.listdir(self.cache_dir), ['test.json'])